@@ -11,24 +11,80 @@ Includes session management, rate limiting, and result caching.
 from __future__ import annotations
 import os
 import sys
-import csv
 import time
 import traceback
 import json
+import queue
+import contextvars
+import sqlite3
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Tuple, Optional, List, Set, Dict
+from typing import Tuple, Optional, List, Set, Dict, Generator
 
 from flask import (
     Flask, request, Response, render_template_string,
-    send_from_directory, stream_with_context
+    send_file, send_from_directory
 )
 from instaloader import Instaloader, Profile, exceptions
 
+import idsets
+from avatar_cache import open_avatar_cache
+from checkpoint import CHECKPOINT_INTERVAL, FetchCheckpoint
+from external_merge import (
+    EXTERNAL_SORT_MB, LARGE_ACCOUNT_THRESHOLD, RECENT_KEYS, external_classify, is_large_account
+)
+from ig_export import ExportFormatError, import_export
+from jobs import Job, JobManager, current_job
+from planner import (
+    GATE_INCREMENTAL, GATE_REUSE, STRATEGY_AUTO, STRATEGY_INCREMENTAL, STRATEGY_PER_USER,
+    change_gate, parse_strategy, plan_fetch, snapshot_baseline
+)
+from rate_control import AdaptiveRateController, is_rate_limited, rate_state_path
+from rate_ledger import open_ledger
+from records import UserRecord
+from snapshot_store import EXPORT_FILES, LIST_KINDS, LIST_SORTS, open_store
+from run_writer import RunWriter
+from snapshots import INCREMENTAL_KNOWN_STREAK
+from spill import UserSpill, clean_spill_dir, open_spill, spill_dir
+from watchlist import (
+    WATCHLIST_MAX, WATCHLIST_TTL_HOURS, open_relationship_cache, parse_watchlist,
+    resolve_watchlist, summarize, write_report
+)
+
 APP = Flask(__name__)
 
 DATA_DIR = os.path.abspath(os.environ.get("DATA_DIR", "./data"))
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# 歷史結果存放在 DATA_DIR/snapshots.db；啟動時匯入尚未匯入的舊結果資料夾
+STORE = open_store(DATA_DIR)
+try:
+    _imported = STORE.import_folders(DATA_DIR)
+    if _imported:
+        print(f"[INFO] 已匯入 {_imported} 個既有結果資料夾到快照資料庫", flush=True)
+except (OSError, sqlite3.Error) as _e:
+    print(f"[WARN] 匯入既有結果資料夾時發生錯誤：{_e}", flush=True)
+
+# 清除異常中斷時留下的暫存 spill 檔
+clean_spill_dir(DATA_DIR)
+
+# 所有執行（含其他 gunicorn worker 與 CLI）共用的請求紀錄，sliding window 合計計算
+LEDGER = open_ledger(DATA_DIR)
+
+# 頭像快取（DATA_DIR/avatars/）：抓取時於背景下載，由 /avatar/<username> 提供
+AVATARS = open_avatar_cache(DATA_DIR)
+
+# watchlist 模式的關係查詢快取（DATA_DIR/watchlist.db）
+WATCHLIST_CACHE = open_relationship_cache(DATA_DIR)
+# 頭像網址帶有內容 hash，瀏覽器可長期快取
+AVATAR_MAX_AGE = 365 * 24 * 3600
+
+# 名單分頁 API 每頁筆數上限
+LIST_PAGE_MAX = 500
+
 
 def generate_plotly_charts(following_count, followers_count, following_only_count, fans_only_count):
     """使用 Plotly 生成互動式圓餅圖並返回 JSON 數據"""
@@ -148,6 +204,16 @@ HTML = """
     .grid{ display:grid; gap:12px; grid-template-columns: repeat(auto-fill, minmax(180px,1fr)); }
     .user{ background:#0f1730; border:1px solid #1f2a44; border-radius:12px; padding:12px; display:flex; gap:10px; align-items:center;}
     .avatar{ width:44px; height:44px; border-radius:999px; border:1px solid #2f3f6b; background:#0b1020; object-fit:cover;}
+    .list-tools{ display:flex; gap:8px; flex-wrap:wrap; margin-bottom:12px; }
+    .list-tools input{ flex:1; min-width:180px; }
+    .vlist{ position:relative; height:65vh; overflow-y:auto; }
+    .vlist-sizer{ width:1px; }
+    .vlist-window{ position:absolute; top:0; left:0; right:0; }
+    .vlist .user{ height:70px; box-sizing:border-box; overflow:hidden; }
+    .vlist .user-box{ min-width:0; }
+    .vlist .uname, .vlist .id{ white-space:nowrap; overflow:hidden; text-overflow:ellipsis; }
+    .user-placeholder{ opacity:.4; }
+    .vlist-empty{ display:none; color:var(--muted); padding:12px 0; }
     .uname{ font-weight:700; }
     .id{ color:#9db9ff; font-family: ui-monospace, SFMono-Regular, Menlo, Monaco, "Cascadia Mono", Consolas, "Liberation Mono", "Courier New", monospace; }
     .cols{ display:grid; gap:18px; grid-template-columns: 1fr; }
@@ -238,6 +304,10 @@ HTML = """
             <input id="session_fetch_avatar" name="session_fetch_avatar" type="checkbox">
             <label for="session_fetch_avatar" style="margin:0;">下載頭像（小尺寸版本，可能增加耗時與 API 次數）</label>
           </div>
+          <div class="row" style="display:flex;align-items:center;gap:8px;margin:12px 0;">
+            <input id="session_incremental" name="session_incremental" type="checkbox">
+            <label for="session_incremental" style="margin:0;">增量更新（只抓上次分析後新增的使用者）</label>
+          </div>
           <div style="display:flex;gap:8px;flex-wrap:wrap;">
             <button onclick="useExistingSession()">使用此帳號重新抓取</button>
             <button onclick="hideSessionPrompt()" style="background:#2b3b63">使用其他帳號</button>
@@ -250,6 +320,10 @@ HTML = """
             <input id="multi_session_fetch_avatar" name="multi_session_fetch_avatar" type="checkbox">
             <label for="multi_session_fetch_avatar" style="margin:0;">下載頭像（小尺寸版本，可能增加耗時與 API 次數）</label>
           </div>
+          <div class="row" style="display:flex;align-items:center;gap:8px;margin:12px 0;">
+            <input id="multi_session_incremental" name="multi_session_incremental" type="checkbox">
+            <label for="multi_session_incremental" style="margin:0;">增量更新（只抓上次分析後新增的使用者）</label>
+          </div>
           <div style="max-height: 250px; overflow-y: auto; margin: 12px 0;">
             <div id="session-list" style="display: flex; flex-direction: column; gap: 8px;">
               <!-- session 清單將在這裡動態生成 -->
@@ -260,6 +334,20 @@ HTML = """
           </div>
         </div>
       </div>
+      <div id="strategy-box" class="row" style="display:flex;align-items:center;gap:8px;">
+        <label for="strategy" style="margin:0;">抓取策略</label>
+        <select id="strategy" name="strategy">
+          <option value="auto" selected>自動（依人數選請求數最少的方式）</option>
+          <option value="full">完整抓取</option>
+          <option value="incremental">增量更新</option>
+          <option value="per_user">逐一查詢追蹤中的帳號（只找出沒回追的人）</option>
+        </select>
+      </div>
+      <details id="watchlist-box" class="row" style="margin-bottom:16px;">
+        <summary>只檢查特定帳號（watchlist）</summary>
+        <p class="muted">填入帳號（每行一個，可含 @ 或個人檔案網址）時，不抓完整名單，只逐一查詢這些帳號與你的追蹤關係；近期查過的帳號直接使用快取。留空則進行完整分析。</p>
+        <textarea id="watchlist" rows="5" placeholder="username1&#10;username2" style="width:100%;"></textarea>
+      </details>
       <div id="login-form">
         <p class="muted">輸入 Instagram 帳密（只用於本機登入；完成後會把 session 存到 <code>data/</code>）。</p>
         <form id="form" onsubmit="start(); return false;">
@@ -275,6 +363,10 @@ HTML = """
           <input id="fetch_avatar" name="fetch_avatar" type="checkbox">
           <label for="fetch_avatar" style="margin:0;">下載頭像（小尺寸版本，可能增加耗時與 API 次數）</label>
         </div>
+        <div class="row" style="display:flex;align-items:center;gap:8px;">
+          <input id="incremental" name="incremental" type="checkbox">
+          <label for="incremental" style="margin:0;">增量更新（只抓上次分析後新增的使用者）</label>
+        </div>
         <div class="row">
           <small class="muted">若帳號需要 2FA，畫面會提示輸入 <b>備用驗證碼</b>。頭像使用小尺寸版本以減少 API 負擔。</small>
         </div>
@@ -282,6 +374,14 @@ HTML = """
           <button id="btn" type="submit">開始分析</button>
         </div>
       </form>
+      <div id="import-export" class="row">
+        <p class="muted">或上傳 Instagram「下載你的資訊」匯出的 ZIP 檔（JSON 格式，只需勾選「粉絲和追蹤中」）：不需登入、不呼叫 API。</p>
+        <div style="display:flex;align-items:center;gap:8px;flex-wrap:wrap;">
+          <input id="export_zip" type="file" accept=".zip,application/zip">
+          <input id="export_igid" type="text" placeholder="帳號名稱（匯出檔中找不到時才需要）" style="max-width:260px;">
+          <button id="import-btn" type="button" onclick="importExport()">分析匯出檔</button>
+        </div>
+      </div>
       <h3>即時進度</h3>
       <pre id="log">(等待開始)</pre>
 
@@ -294,6 +394,13 @@ HTML = """
           <li><a id="fy" href="#" download>沒追蹤回的使用者清單</a></li>
         </ul>
       </div>
+
+      <div id="watch-downloads" style="display:none; margin-top:10px;">
+        <h3>Watchlist 報告</h3>
+        <ul>
+          <li><a id="watch-report" href="#" download>帳號關係報告（CSV）</a></li>
+        </ul>
+      </div>
     </div>
 
     <div id="results" style="display:none; margin-top:16px;">
@@ -354,19 +461,71 @@ HTML = """
         <div class="tab-content">
           <div id="tab-following" class="tab-pane active">
             <h3>追蹤中（你追蹤的人）</h3>
-            <div id="list_following" class="grid"></div>
+            <div class="list-tools">
+              <input type="search" placeholder="搜尋帳號或名稱" oninput="onListSearch('following', this.value)">
+              <select onchange="onListSort('following', this.value)">
+                <option value="position">原始順序</option>
+                <option value="username">帳號 A→Z</option>
+                <option value="-username">帳號 Z→A</option>
+                <option value="full_name">名稱 A→Z</option>
+              </select>
+            </div>
+            <div id="list_following" class="vlist">
+              <div class="vlist-sizer"></div>
+              <div class="grid vlist-window"></div>
+              <div class="vlist-empty">沒有符合的使用者</div>
+            </div>
           </div>
           <div id="tab-followers" class="tab-pane">
             <h3>追蹤者（追蹤你的人）</h3>
-            <div id="list_followers" class="grid"></div>
+            <div class="list-tools">
+              <input type="search" placeholder="搜尋帳號或名稱" oninput="onListSearch('followers', this.value)">
+              <select onchange="onListSort('followers', this.value)">
+                <option value="position">原始順序</option>
+                <option value="username">帳號 A→Z</option>
+                <option value="-username">帳號 Z→A</option>
+                <option value="full_name">名稱 A→Z</option>
+              </select>
+            </div>
+            <div id="list_followers" class="vlist">
+              <div class="vlist-sizer"></div>
+              <div class="grid vlist-window"></div>
+              <div class="vlist-empty">沒有符合的使用者</div>
+            </div>
           </div>
           <div id="tab-following-only" class="tab-pane">
             <h3>沒回追你（你追他、他沒追你）</h3>
-            <div id="list_following_only" class="grid"></div>
+            <div class="list-tools">
+              <input type="search" placeholder="搜尋帳號或名稱" oninput="onListSearch('following_only', this.value)">
+              <select onchange="onListSort('following_only', this.value)">
+                <option value="position">原始順序</option>
+                <option value="username">帳號 A→Z</option>
+                <option value="-username">帳號 Z→A</option>
+                <option value="full_name">名稱 A→Z</option>
+              </select>
+            </div>
+            <div id="list_following_only" class="vlist">
+              <div class="vlist-sizer"></div>
+              <div class="grid vlist-window"></div>
+              <div class="vlist-empty">沒有符合的使用者</div>
+            </div>
           </div>
           <div id="tab-fans-only" class="tab-pane">
             <h3>你沒回追（他追你、你沒追他）</h3>
-            <div id="list_fans_only" class="grid"></div>
+            <div class="list-tools">
+              <input type="search" placeholder="搜尋帳號或名稱" oninput="onListSearch('fans_only', this.value)">
+              <select onchange="onListSort('fans_only', this.value)">
+                <option value="position">原始順序</option>
+                <option value="username">帳號 A→Z</option>
+                <option value="-username">帳號 Z→A</option>
+                <option value="full_name">名稱 A→Z</option>
+              </select>
+            </div>
+            <div id="list_fans_only" class="vlist">
+              <div class="vlist-sizer"></div>
+              <div class="grid vlist-window"></div>
+              <div class="vlist-empty">沒有符合的使用者</div>
+            </div>
           </div>
         </div>
       </div>
@@ -375,6 +534,7 @@ HTML = """
 
 <script>
 let es = null;
+let esReconnecting = false;  // EventSource 斷線後正在自動重連（伺服器依 Last-Event-ID 補送）
 
 // 全局錯誤處理
 window.onerror = function(msg, url, lineNo, columnNo, error) {
@@ -422,37 +582,210 @@ function lockForm(locked){
   const p = document.getElementById('password');
   const b = document.getElementById('btn');
   const avatarOpt = document.getElementById('fetch_avatar');
+  const incrementalOpt = document.getElementById('incremental');
   u.disabled = locked; p.disabled = locked; b.disabled = locked;
   if (avatarOpt) avatarOpt.disabled = locked;
+  if (incrementalOpt) incrementalOpt.disabled = locked;
+  const strategyOpt = document.getElementById('strategy');
+  const watchlistBox = document.getElementById('watchlist');
+  if (strategyOpt) strategyOpt.disabled = locked;
+  if (watchlistBox) watchlistBox.disabled = locked;
+}
+
+function buildUserCard(it){
+  const card = document.createElement('div');
+  card.className = 'user';
+  const img = document.createElement('img');
+  img.className = 'avatar';
+  img.alt = it.username;
+  // 只有捲到可視範圍的卡片才會建立，頭像也交給瀏覽器延遲載入
+  img.loading = 'lazy';
+  img.decoding = 'async';
+  if(it.avatar_url) img.src = it.avatar_url;
+  const box = document.createElement('div');
+  box.className = 'user-box';
+  const name = document.createElement('div');
+  name.className = 'uname';
+  name.textContent = it.full_name || '(無名稱)';
+  const id = document.createElement('div');
+  id.className = 'id';
+  const a = document.createElement('a');
+  a.href = 'https://instagram.com/' + it.username;
+  a.target = '_blank';
+  a.textContent = '@' + it.username;
+  id.appendChild(a);
+  box.appendChild(name); box.appendChild(id);
+  card.appendChild(img); card.appendChild(box);
+  return card;
+}
+
+function buildPlaceholderCard(){
+  const card = document.createElement('div');
+  card.className = 'user user-placeholder';
+  card.dataset.placeholder = '1';
+  return card;
 }
 
-function renderUsers(containerId, items){
-  const el = document.getElementById(containerId);
-  el.innerHTML = '';
-  for(const it of items){
-    const card = document.createElement('div');
-    card.className = 'user';
-    const img = document.createElement('img');
-    img.className = 'avatar';
-    img.src = it.avatar_url || '';
-    img.alt = it.username;
-    const box = document.createElement('div');
-    const name = document.createElement('div');
-    name.className = 'uname';
-    name.textContent = it.full_name || '(無名稱)';
-    const id = document.createElement('div');
-    id.className = 'id';
-    const a = document.createElement('a');
-    a.href = 'https://instagram.com/' + it.username;
-    a.target = '_blank';
-    a.textContent = '@' + it.username;
-    id.appendChild(a);
-    box.appendChild(name); box.appendChild(id);
-    card.appendChild(img); card.appendChild(box);
-    el.appendChild(card);
+// 名單以虛擬捲動呈現：DOM 中只保留可視範圍（加上少量緩衝）的卡片，
+// 資料由 /runs/<run>/lists/<kind> 依捲動位置分頁載入，搜尋與排序在伺服器端完成；
+// 每個標籤頁第一次打開時才開始載入。
+const LIST_KINDS = ['following', 'followers', 'following_only', 'fans_only'];
+const LIST_PAGE_SIZE = 100;
+const ROW_HEIGHT = 82;      // .vlist .user 高度 70px + gap 12px
+const CARD_MIN_WIDTH = 180;
+const GRID_GAP = 12;
+const OVERSCAN_ROWS = 4;
+let currentRun = null;
+const listState = {};
+const listSearchTimers = {};
+const listViewsBound = new Set();
+
+function newListState(){
+  return {total: null, items: [], pages: {}, q: '', sort: 'position', seq: 0,
+          opened: false, cards: new Map(), range: null, frame: 0};
+}
+
+function resetLists(runId){
+  currentRun = runId;
+  for(const kind of LIST_KINDS){
+    listState[kind] = newListState();
+    const view = document.getElementById('list_' + kind);
+    const pane = view.parentElement;
+    pane.querySelector('.list-tools input').value = '';
+    pane.querySelector('.list-tools select').value = 'position';
+    view.scrollTop = 0;
+    view.querySelector('.vlist-window').replaceChildren();
+    view.querySelector('.vlist-sizer').style.height = '0px';
+    view.querySelector('.vlist-empty').style.display = 'none';
+  }
+  const active = document.querySelector('.tab-pane.active .vlist');
+  if(active) openList(active.id.slice('list_'.length));
+}
+
+function openList(kind){
+  const st = listState[kind];
+  if(!currentRun || !st) return;
+  if(!listViewsBound.has(kind)){
+    listViewsBound.add(kind);
+    document.getElementById('list_' + kind).addEventListener('scroll', () => scheduleListRender(kind));
+  }
+  st.opened = true;
+  if(st.total === null) fetchListPage(kind, 0);
+  else renderListWindow(kind, true);
+}
+
+function scheduleListRender(kind){
+  const st = listState[kind];
+  if(!st || st.frame) return;
+  st.frame = requestAnimationFrame(() => {
+    st.frame = 0;
+    renderListWindow(kind);
+  });
+}
+
+function fetchListPage(kind, page){
+  const st = listState[kind];
+  if(!currentRun || !st || st.pages[page]) return;
+  st.pages[page] = 'loading';
+  const seq = st.seq;
+  const params = new URLSearchParams({offset: page * LIST_PAGE_SIZE, limit: LIST_PAGE_SIZE, q: st.q, sort: st.sort});
+  fetch('/runs/' + encodeURIComponent(currentRun) + '/lists/' + kind + '?' + params.toString())
+    .then(r => r.json())
+    .then(resp => {
+      if(seq !== st.seq || listState[kind] !== st) return;  // 已有較新的搜尋 / 排序
+      if(!resp.ok){
+        delete st.pages[page];
+        appendLog('[錯誤] ' + (resp.error || '無法載入名單'));
+        return;
+      }
+      resp.items.forEach((it, i) => { st.items[page * LIST_PAGE_SIZE + i] = it; });
+      st.total = resp.total;
+      st.pages[page] = 'done';
+      renderListWindow(kind, true);
+    })
+    .catch(err => {
+      if(seq !== st.seq || listState[kind] !== st) return;
+      delete st.pages[page];
+      console.error('載入名單時發生錯誤:', err);
+      appendLog('[錯誤] 載入名單時發生錯誤');
+    });
+}
+
+function renderListWindow(kind, force = false){
+  const st = listState[kind];
+  const view = document.getElementById('list_' + kind);
+  if(!st || st.total === null || !view.clientWidth) return;  // 尚未載入或標籤頁未顯示
+  const win = view.querySelector('.vlist-window');
+  view.querySelector('.vlist-empty').style.display = st.total === 0 ? 'block' : 'none';
+
+  const cols = Math.max(1, Math.floor((view.clientWidth + GRID_GAP) / (CARD_MIN_WIDTH + GRID_GAP)));
+  const rows = Math.ceil(st.total / cols);
+  view.querySelector('.vlist-sizer').style.height = (rows * ROW_HEIGHT) + 'px';
+  const firstRow = Math.max(0, Math.floor(view.scrollTop / ROW_HEIGHT) - OVERSCAN_ROWS);
+  const lastRow = Math.min(rows, Math.ceil((view.scrollTop + view.clientHeight) / ROW_HEIGHT) + OVERSCAN_ROWS);
+  const start = firstRow * cols;
+  const end = Math.min(st.total, lastRow * cols);
+  const range = start + ':' + end + ':' + cols;
+  if(!force && range === st.range) return;
+  st.range = range;
+
+  // 沿用仍在範圍內的卡片（避免重新載入頭像），其餘才新建
+  const cards = new Map();
+  const nodes = [];
+  for(let i = start; i < end; i++){
+    let card = st.cards.get(i);
+    const item = st.items[i];
+    if(!card || (item && card.dataset.placeholder)){
+      card = item ? buildUserCard(item) : buildPlaceholderCard();
+    }
+    cards.set(i, card);
+    nodes.push(card);
+  }
+  st.cards = cards;
+  win.style.transform = 'translateY(' + (firstRow * ROW_HEIGHT) + 'px)';
+  win.style.gridTemplateColumns = 'repeat(' + cols + ', minmax(0, 1fr))';
+  win.replaceChildren(...nodes);
+
+  // 載入可視範圍內尚未取得的分頁
+  for(let page = Math.floor(start / LIST_PAGE_SIZE); page * LIST_PAGE_SIZE < end; page++){
+    fetchListPage(kind, page);
   }
 }
 
+function restartList(kind){
+  const st = listState[kind];
+  if(!st) return;
+  st.seq++;
+  st.total = null;
+  st.items = [];
+  st.pages = {};
+  st.cards = new Map();
+  st.range = null;
+  document.getElementById('list_' + kind).scrollTop = 0;
+  fetchListPage(kind, 0);
+}
+
+function onListSearch(kind, value){
+  clearTimeout(listSearchTimers[kind]);
+  listSearchTimers[kind] = setTimeout(() => {
+    if(!listState[kind]) return;
+    listState[kind].q = value.trim();
+    restartList(kind);
+  }, 250);
+}
+
+function onListSort(kind, value){
+  if(!listState[kind]) return;
+  listState[kind].sort = value;
+  restartList(kind);
+}
+
+window.addEventListener('resize', () => {
+  for(const kind of LIST_KINDS){
+    if(listState[kind] && listState[kind].opened) scheduleListRender(kind);
+  }
+});
+
 // 標籤頁切換功能
 function showTab(tabName) {
   // 移除所有 active 類
@@ -462,6 +795,9 @@ function showTab(tabName) {
   // 添加 active 類到對應的標籤
   event.target.classList.add('active');
   document.getElementById('tab-' + tabName).classList.add('active');
+
+  // 第一次打開時才載入該名單
+  openList(tabName.replace('-', '_'));
 }
 
 // 繪製高清晰度圓餅圖
@@ -512,28 +848,21 @@ let plotFirstLoad = true;
 
 
 // 更新統計數據和圖表
-function updateStats(data) {
+function updateStats(counts) {
   // 更新數字統計
-  document.getElementById('stat-following').textContent = data.following.length;
-  document.getElementById('stat-followers').textContent = data.followers.length;
-  document.getElementById('stat-following-only').textContent = data.following_only.length;
-  document.getElementById('stat-fans-only').textContent = data.fans_only.length;
+  document.getElementById('stat-following').textContent = counts.following;
+  document.getElementById('stat-followers').textContent = counts.followers;
+  document.getElementById('stat-following-only').textContent = counts.following_only;
+  document.getElementById('stat-fans-only').textContent = counts.fans_only;
 
   // 更新標籤頁計數
-  document.getElementById('count-following').textContent = data.following.length;
-  document.getElementById('count-followers').textContent = data.followers.length;
-  document.getElementById('count-following-only').textContent = data.following_only.length;
-  document.getElementById('count-fans-only').textContent = data.fans_only.length;
+  document.getElementById('count-following').textContent = counts.following;
+  document.getElementById('count-followers').textContent = counts.followers;
+  document.getElementById('count-following-only').textContent = counts.following_only;
+  document.getElementById('count-fans-only').textContent = counts.fans_only;
 
   // 顯示 Plotly 圖表
-  const chartData = {
-    following: data.following.length,
-    followers: data.followers.length,
-    following_only: data.following_only.length,
-    fans_only: data.fans_only.length
-  };
-
-  drawPlotlyCharts(chartData);
+  drawPlotlyCharts(counts);
 }
 
 function displayFolderOptions(latestFolder, allFolders, hasSession = false) {
@@ -741,11 +1070,17 @@ function useExistingSession() {
   } else if (multiSessionOpt && multiSessionOpt.style.display !== 'none') {
     fetchAvatar = multiSessionOpt.checked;
   }
+
+  // 增量更新選項（依目前顯示的 session 模式）
+  const singleMode = document.getElementById('single-session').style.display !== 'none';
+  const incrementalOpt = document.getElementById(singleMode ? 'session_incremental' : 'multi_session_incremental');
+  const incremental = incrementalOpt ? incrementalOpt.checked : false;
   const status = document.getElementById('status');
   const loginForm = document.getElementById('login-form');
 
   // 先清理舊的顯示狀態
   document.getElementById('downloads').style.display = 'none';
+  document.getElementById('watch-downloads').style.display = 'none';
   document.getElementById('results').style.display = 'none';
   document.getElementById('status').textContent = '執行中…';
 
@@ -776,7 +1111,10 @@ function useExistingSession() {
 
   // 建立新的連接
   const fetchParam = fetchAvatar ? '1' : '0';
-  const streamUrl = '/stream?username='+encodeURIComponent(username)+'&use_existing=true&fetch_avatar='+fetchParam;
+  let streamUrl = '/stream?username='+encodeURIComponent(username)+'&use_existing=true&fetch_avatar='+fetchParam+'&incremental='+(incremental ? '1' : '0');
+  streamUrl += '&strategy='+encodeURIComponent(strategyValue());
+  const watchlist = watchlistText();
+  if (watchlist) streamUrl += '&watchlist='+encodeURIComponent(watchlist);
   console.log('Creating EventSource for existing session with URL:', streamUrl);
   es = new EventSource(streamUrl);
   es.onmessage = handleEvent;
@@ -784,14 +1122,21 @@ function useExistingSession() {
   // 監聽連接狀態
   es.onopen = function(event) {
     console.log('EventSource 連接成功 (existing session):', event);
-    appendLog('[INFO] 已建立連接，開始處理...');
+    appendLog(esReconnecting ? '[INFO] 已重新連線，繼續接收進度...' : '[INFO] 已建立連接，開始處理...');
+    esReconnecting = false;
   };
 
   // 監聽連接錯誤
   es.onerror = function(err) {
     console.error('EventSource 錯誤 (existing session):', err);
     console.error('ReadyState:', es.readyState);
-    appendLog('[錯誤] 連接中斷，請重新整理頁面重試');
+    if(es.readyState === EventSource.CONNECTING){
+      // 暫時性斷線：瀏覽器會自動重連，不視為失敗
+      if(!esReconnecting) appendLog('[INFO] 連線中斷，正在重新連線...');
+      esReconnecting = true;
+      return;
+    }
+    appendLog('[錯誤] 連接中斷；分析仍在背景執行，重新整理頁面後選擇同一帳號即可重新連上');
     status.textContent = '失敗 ✖';
     document.getElementById('session-prompt').style.display = 'none';
     document.getElementById('login-form').style.display = 'block';
@@ -853,6 +1198,77 @@ function checkSession() {
 }
 
 // 載入現有的數據
+// 顯示一次結果：下載連結、統計與分頁名單（/load-existing 與 /import-export 共用）
+function showRunData(data) {
+  const setLink = (id, url) => {
+    const el = document.getElementById(id);
+    if (!el) return;
+    if (url) {
+      el.href = url;
+    } else {
+      el.removeAttribute('href');
+    }
+  };
+
+  setLink('following', data.following_url);
+  setLink('followers', data.followers_url);
+  setLink('nf', data.non_followers_url);
+  setLink('fy', data.fans_you_dont_follow_url);
+  document.getElementById('downloads').style.display = 'block';
+
+  // 顯示用戶列表（分頁載入）
+  resetLists(data.run);
+
+  // 更新統計和圖表
+  updateStats(data.counts);
+
+  document.getElementById('results').style.display = 'block';
+}
+
+// 上傳 Instagram 匯出檔，由伺服器串流解析後直接顯示結果
+function importExport() {
+  const fileInput = document.getElementById('export_zip');
+  const status = document.getElementById('status');
+  if (!fileInput.files || !fileInput.files.length) {
+    alert('請先選擇匯出的 ZIP 檔');
+    return;
+  }
+  const body = new FormData();
+  body.append('archive', fileInput.files[0]);
+  const igid = document.getElementById('export_igid').value.trim();
+  if (igid) body.append('igid', igid);
+
+  const btn = document.getElementById('import-btn');
+  btn.disabled = true;
+  document.getElementById('downloads').style.display = 'none';
+  document.getElementById('results').style.display = 'none';
+  appendLog('---');
+  appendLog('[INFO] 上傳並解析匯出檔…');
+  status.textContent = '匯入中…';
+
+  fetch('/import-export', { method: 'POST', body: body })
+    .then(r => r.json())
+    .then(resp => {
+      if (resp.ok) {
+        const data = resp.data;
+        showRunData(data);
+        appendLog(data.imported
+          ? `[OK] 已由匯出檔建立結果 ${data.run}`
+          : `[INFO] 此匯出檔已匯入過，載入 ${data.run}`);
+        status.textContent = '完成 ✔';
+      } else {
+        status.textContent = '失敗 ✖';
+        appendLog('[錯誤] ' + (resp.error || '無法匯入匯出檔'));
+      }
+    })
+    .catch(err => {
+      console.error('匯入匯出檔時發生錯誤:', err);
+      status.textContent = '失敗 ✖';
+      appendLog('[錯誤] 匯入匯出檔時發生錯誤');
+    })
+    .finally(() => { btn.disabled = false; });
+}
+
 function loadExistingData() {
   const status = document.getElementById('status');
   status.textContent = '載入中...';
@@ -885,33 +1301,7 @@ function loadExistingData() {
     .then(r => r.json())
       .then(resp => {
       if (resp.ok) {
-        const data = resp.data;
-        const setLink = (id, url) => {
-          const el = document.getElementById(id);
-          if (!el) return;
-          if (url) {
-            el.href = url;
-          } else {
-            el.removeAttribute('href');
-          }
-        };
-
-        setLink('following', data.following_url);
-        setLink('followers', data.followers_url);
-        setLink('nf', data.non_followers_url);
-        setLink('fy', data.fans_you_dont_follow_url);
-        document.getElementById('downloads').style.display = 'block';
-
-        // 顯示用戶列表
-        renderUsers('list_following', data.following);
-        renderUsers('list_followers', data.followers);
-        renderUsers('list_fans_only', data.fans_only);
-        renderUsers('list_following_only', data.following_only);
-
-        // 更新統計和圖表
-        updateStats(data);
-
-        document.getElementById('results').style.display = 'block';
+        showRunData(resp.data);
 
         // 更新狀態
         status.textContent = '已載入 ✔';
@@ -931,6 +1321,18 @@ function loadExistingData() {
 // 頁面載入時檢查 session
 checkSession();
 
+// 抓取策略（auto 由伺服器依人數估算後選擇）
+function strategyValue() {
+  const sel = document.getElementById('strategy');
+  return sel ? sel.value : 'auto';
+}
+
+// watchlist 帳號（留空表示完整分析）
+function watchlistText() {
+  const box = document.getElementById('watchlist');
+  return box ? box.value.trim() : '';
+}
+
 function handleEvent(e) {
   const d = e.data;
   if(d.startsWith('LOG:')){
@@ -963,16 +1365,28 @@ function handleEvent(e) {
     document.getElementById('fy').href = payload.fans_you_dont_follow_url;
     document.getElementById('downloads').style.display = 'block';
 
-    // render lists
-    renderUsers('list_following', payload.following);
-    renderUsers('list_followers', payload.followers);
-    renderUsers('list_fans_only', payload.fans_only);
-    renderUsers('list_following_only', payload.following_only);
+    // render lists（分頁載入）
+    resetLists(payload.run);
 
     // 更新統計和圖表
-    updateStats(payload);
+    updateStats(payload.counts);
 
     document.getElementById('results').style.display = 'block';
+    document.getElementById('status').textContent = payload.reused ? '人數未變，沿用上次結果 ✔' : '完成 ✔';
+    es.close();
+    return;
+  }
+  if(d.startsWith('WATCH_DONE:')){
+    const payload = JSON.parse(d.slice(11));
+    const c = payload.counts;
+    appendLog('=== Watchlist 完成 ===');
+    appendLog('檢查 '+c.total+' 個帳號：有追蹤你 '+c.follows_you+'，你追但沒回追 '+c.not_following_back+
+              '，他人追你但你沒回追 '+c.fans_only+'，查無帳號 '+c.not_found);
+    if (payload.not_following_back.length) {
+      appendLog('沒回追：' + payload.not_following_back.map(u => '@'+u).join(' '));
+    }
+    document.getElementById('watch-report').href = payload.report_url;
+    document.getElementById('watch-downloads').style.display = 'block';
     document.getElementById('status').textContent = '完成 ✔';
     es.close();
     return;
@@ -992,8 +1406,11 @@ function start(){
   const p = document.getElementById('password').value;
   const avatarOpt = document.getElementById('fetch_avatar');
   const fetchAvatar = avatarOpt ? avatarOpt.checked : true;
+  const incrementalOpt = document.getElementById('incremental');
+  const incremental = incrementalOpt ? incrementalOpt.checked : false;
   const status = document.getElementById('status');
   document.getElementById('downloads').style.display = 'none';
+  document.getElementById('watch-downloads').style.display = 'none';
   document.getElementById('results').style.display = 'none';
   appendLog('---');
   status.textContent = '執行中…';
@@ -1002,7 +1419,8 @@ function start(){
   fetch('/start', {
     method:'POST',
     headers:{'Content-Type':'application/json'},
-    body: JSON.stringify({username:u, password:p, fetch_avatar: fetchAvatar})
+    body: JSON.stringify({username:u, password:p, fetch_avatar: fetchAvatar, incremental: incremental,
+                          watchlist: watchlistText(), strategy: strategyValue()})
   }).then(r=>{
     console.log('Start response status:', r.status);
     if(!r.ok){
@@ -1013,6 +1431,9 @@ function start(){
     return r.json();
   }).then(data => {
     console.log('Start response data:', data);
+    if(data.attached){
+      appendLog('[INFO] 此帳號的分析已在執行中，改為觀看進行中的進度');
+    }
 
     // 確保之前的連接已關閉
     if(es){
@@ -1032,14 +1453,21 @@ function start(){
     // 監聽連接狀態
     es.onopen = function(event) {
       console.log('EventSource 連接成功:', event);
-      appendLog('[INFO] 已建立連接，開始處理...');
+      appendLog(esReconnecting ? '[INFO] 已重新連線，繼續接收進度...' : '[INFO] 已建立連接，開始處理...');
+      esReconnecting = false;
     };
 
     // 監聽連接錯誤
     es.onerror = function(err) {
       console.error('EventSource 錯誤:', err);
       console.error('ReadyState:', es.readyState);
-      appendLog('[錯誤] 連接中斷，請重新整理頁面重試');
+      if(es.readyState === EventSource.CONNECTING){
+        // 暫時性斷線：瀏覽器會自動重連，不視為失敗
+        if(!esReconnecting) appendLog('[INFO] 連線中斷，正在重新連線...');
+        esReconnecting = true;
+        return;
+      }
+      appendLog('[錯誤] 連接中斷；分析仍在背景執行，重新整理頁面後選擇同一帳號即可重新連上');
       document.getElementById('status').textContent = '失敗 ✖';
       lockForm(false);
 
@@ -1077,8 +1505,12 @@ def sse(data: str):
     return f"data: {data}\n\n"
 
 
-# 用於追蹤 log_emit 的狀態
-_log_state = {"last_same_line": False}
+def sse_response(body) -> Response:
+    """SSE 回應；關閉快取與反向代理（nginx）的緩衝，讓訊息即時送達。"""
+    return Response(body, mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
 
 
 def log_emit(msg: str, same_line: bool = False):
@@ -1095,63 +1527,32 @@ def log_emit(msg: str, same_line: bool = False):
     Returns:
       The result of sse("LOG:" + msg), which sends the log message to the frontend.
     Note:
-      - Uses a global _log_state dictionary to track whether the last log was
-        on the same line to ensure proper line breaks.
+      - Whether the last log was on the same line is tracked per run (on the
+        current job), so concurrent runs do not break each other's lines.
       - When same_line=True, pads the message to 80 characters to clear previous
         content and prevent residual text.
     """
     # 同步打到伺服器終端機（便於你在 Docker/主機端看進度）
+    job = current_job()
     if same_line:
         # 使用 \r 來覆蓋同一行，並且清除該行（避免舊內容殘留）
         print(f"\r{msg:<80}", end="", flush=True)  # 使用格式化確保清除舊內容
     else:
         # 如果前一行是同行更新，先換行
-        if _log_state["last_same_line"]:
+        if job and job.last_same_line:
             print()  # 換行
         print(msg, flush=True)
 
-    _log_state["last_same_line"] = same_line
+    if job:
+        job.last_same_line = same_line
 
     # 同步推給前端
     return sse("LOG:" + msg)
 
 
-def write_csv(path: str, rows: List[Dict[str, str]], ig_username: str) -> str:
-    """寫入 CSV 檔案到 IGID_YYYYMMDDHHMMSS 資料夾中，並返回實際寫入的檔案名稱"""
-    # 生成精確到秒的日期標籤
-    date_tag = datetime.now().strftime("%Y%m%d%H%M%S")
-
-    # 建立以 IGID_YYYYMMDDHHMMSS 命名的資料夾
-    folder_name = f"{ig_username}_{date_tag}"
-    result_dir = os.path.join(DATA_DIR, folder_name)
-    os.makedirs(result_dir, exist_ok=True)
-
-    # 取得檔案名稱部分
-    base_name = os.path.basename(path)
-    name_without_ext = os.path.splitext(base_name)[0]
-    ext = os.path.splitext(base_name)[1]
-
-    # 建立新檔案名稱：原檔名_YYYYMMDDHHMMSS.csv
-    new_filename = f"{name_without_ext}_{date_tag}{ext}"
-    new_path = os.path.join(result_dir, new_filename)
-
-    # Excel 用 utf-8-sig 避免中文亂碼
-    with open(new_path, "w", newline="", encoding="utf-8-sig", errors="replace") as f:
-        w = csv.writer(f)
-        w.writerow(["username", "full_name", "profile_url"])
-        for user in rows:
-            w.writerow([
-                user["username"],
-                user["full_name"],
-                f"https://instagram.com/{user['username']}"
-            ])
-
-    return os.path.join(folder_name, new_filename)  # 返回相對於 DATA_DIR 的路徑
-
-
-def to_user_obj(user, include_avatar: bool = True) -> Dict[str, str]:
+def to_user_obj(user, include_avatar: bool = True) -> UserRecord:
     """
-    Convert an Instagram user object to a dictionary containing user information.
+    Convert an Instagram user object to a compact UserRecord.
 
     This function extracts user data from an instaloader user node to avoid making
     individual Profile requests, which saves time and bandwidth.
@@ -1162,7 +1563,7 @@ def to_user_obj(user, include_avatar: bool = True) -> Dict[str, str]:
         Defaults to True.
 
     Returns:
-      Dict[str, str]: A dictionary containing:
+      UserRecord: A record containing:
         - username (str): The user's username
         - full_name (str): The user's full name (empty string if not available)
         - avatar_url (str): The user's profile picture URL (empty string if not
@@ -1190,11 +1591,17 @@ def to_user_obj(user, include_avatar: bool = True) -> Dict[str, str]:
             avatar_s = ""
     else:
         avatar_s = ""
-    return {"username": username, "full_name": full_name, "avatar_url": avatar_s}
+    # 數字 user id 在 node 中已有（不需額外請求）；改名後仍可用來比對同一個人
+    user_id = getattr(user, "userid", 0) or 0
+    return UserRecord(username, full_name, avatar_s, user_id)
 
 
 def fetch_users_with_progress(iterable, total: Optional[int], label: str,
-                              include_avatar: bool = True):
+                              include_avatar: bool = True,
+                              checkpoint: Optional[FetchCheckpoint] = None,
+                              known: Optional[Set[str]] = None,
+                              known_streak: int = INCREMENTAL_KNOWN_STREAK,
+                              rate_controller: Optional[AdaptiveRateController] = None):
     """Fetch users with progress tracking and error handling.
 
     Args:
@@ -1202,10 +1609,24 @@ def fetch_users_with_progress(iterable, total: Optional[int], label: str,
         total: Total number of users expected (or None if unknown)
         label: Label for progress messages
         include_avatar: Whether to include avatar URLs
+        checkpoint: Optional checkpoint; users restored from it are kept and the
+            pagination cursor is saved periodically, on rate limits and on abort
+        known: Incremental mode; usernames from the previous snapshot. Only users
+            not in this set are returned, and fetching stops after
+            ``known_streak`` consecutive known users (lists are newest-first)
+        known_streak: Length of the run of known users that ends an incremental fetch
+        rate_controller: Adaptive controller of the loader; decides the cool-down
+            after a rate limit, and its decisions are relayed to the log
+
+    Returns:
+        UserSpill holding the fetched users: the checkpoint's file, or a
+        temporary file under DATA_DIR/spill (the caller removes it)
     """
-    users_pairs: List[Tuple[str, str]] = []
-    users_objs: List[Dict[str, str]] = []
-    count = 0
+    # 使用者直接附加到磁碟上的 spill 檔，記憶體中只保留 username 集合
+    users = checkpoint.spill() if checkpoint else open_spill(DATA_DIR, label)
+    count = len(users)
+    completed = False
+    streak = 0
 
     # 確保 total 是整數或 None
     try:
@@ -1223,6 +1644,8 @@ def fetch_users_with_progress(iterable, total: Optional[int], label: str,
 
     # 起始訊息（只透過 SSE；不再直接 print，避免重複）
     yield log_emit(f"{label} 準備抓取中...{f'（總數：{total}）' if total else ''}")
+    if count:
+        yield log_emit(f"[RESUME] {label} 從 checkpoint 接續，已有 {count} 筆")
 
     def create_progress_bar(current, total, width=30):
         if total is None or total <= 0:
@@ -1238,63 +1661,97 @@ def fetch_users_with_progress(iterable, total: Optional[int], label: str,
     iterator = iter(iterable)
     retry = 0
     backoff_cap = 60
-    rate_sleep = 180  # 秒（增加到 3 分鐘）
-    while True:
-        try:
-            user = next(iterator)
-            users_pairs.append(
-                (user.username, (getattr(user, "full_name", "") or "")))
-            users_objs.append(to_user_obj(user, include_avatar))
-            count += 1
-
-            if count % 10 == 0:
-                progress = create_progress_bar(count, total)
-                status = f"{label}: {count}/{total}" if total else f"{label}: {count} 筆"
-                if progress:
-                    status = f"{status} {progress}"
-                yield log_emit(status, same_line=True)
-            retry = 0  # 成功則重置重試計數
-
-        except StopIteration:
-            break
-        except exceptions.TooManyRequestsException as e:
-            # 記錄詳細錯誤到伺服器端
-            print(f"[RATE-LIMIT] Instagram API 限制：{e}", file=sys.stderr)
-            # 動態調整等待時間,如果持續收到 429,增加等待時間
-            if retry > 3:
-                rate_sleep = min(300, rate_sleep * 1.5)  # 最多等待 5 分鐘
-            yield log_emit(
-                f"[RATE-LIMIT] Instagram API 請求限制；"
-                f"將等待 {int(rate_sleep)}s 後重試…（第 {retry + 1} 次）"
-            )
-            time.sleep(rate_sleep)
-            retry += 1
-            continue
-        except exceptions.ConnectionException as e:
-            # 記錄詳細錯誤到伺服器端
-            print(f"[WARN] 連線錯誤：{e}", file=sys.stderr)
-            # 指數退避，最多 backoff_cap 秒
-            wait = min(backoff_cap, (2 ** retry) * 3 if retry > 0 else 3)
-            yield log_emit(f"[WARN] 連線錯誤；{wait}s 後重試（第 {retry + 1} 次）…")
-            time.sleep(wait)
-            retry += 1
-            continue
-        except Exception as e:  # pylint: disable=broad-except
-            # 檢查是否為可跳過的錯誤（如私人帳號、已刪除帳號等）
-            error_msg = str(e).lower()
-            if any(keyword in error_msg for keyword in [
-                'private', 'not found', 'does not exist', 'unavailable',
-                'deleted', 'suspended', 'blocked', 'invalid'
-            ]):
-                # 可跳過的錯誤，記錄並繼續
-                yield log_emit("[SKIP] 跳過無法存取的帳號")
+    try:
+        while True:
+            try:
+                user = next(iterator)
+                if rate_controller:
+                    for msg in rate_controller.pop_events():
+                        yield log_emit(msg)
+                if user.username in users:
+                    continue  # checkpoint 接續時會重播最後一筆
+                if known is not None:
+                    if user.username in known:
+                        streak += 1
+                        if streak >= known_streak:
+                            yield log_emit(
+                                f"[INCREMENTAL] {label} 連續 {streak} 位已在上次結果中，停止抓取")
+                            break
+                        continue
+                    streak = 0
+                obj = to_user_obj(user, include_avatar)
+                users.append(obj)
+                if obj.avatar_url:
+                    # 背景下載到頭像快取（有並行上限，不佔用 Instagram API 請求）
+                    AVATARS.submit(obj.username, obj.avatar_url)
+                count += 1
+                if checkpoint and count % CHECKPOINT_INTERVAL == 0:
+                    checkpoint.save(iterator)
+
+                if count % 10 == 0:
+                    progress = create_progress_bar(count, total)
+                    status = f"{label}: {count}/{total}" if total else f"{label}: {count} 筆"
+                    if progress:
+                        status = f"{status} {progress}"
+                    yield log_emit(status, same_line=True)
+                retry = 0  # 成功則重置重試計數
+
+            except StopIteration:
+                break
+            except exceptions.ConnectionException as e:
+                if is_rate_limited(e):
+                    # 記錄詳細錯誤到伺服器端
+                    print(f"[RATE-LIMIT] Instagram API 限制：{e}", file=sys.stderr)
+                    # 冷卻時間由速率控制器依目前間隔與連續 429 次數決定
+                    rate_sleep = rate_controller.cooldown() if rate_controller else 180
+                    if rate_controller:
+                        for msg in rate_controller.pop_events():
+                            yield log_emit(msg)
+                    yield log_emit(
+                        f"[RATE-LIMIT] Instagram API 請求限制；"
+                        f"將等待 {int(rate_sleep)}s 後重試…（第 {retry + 1} 次）"
+                    )
+                    if checkpoint:
+                        checkpoint.save(iterator)
+                    time.sleep(rate_sleep)
+                    retry += 1
+                    continue
+                # 記錄詳細錯誤到伺服器端
+                print(f"[WARN] 連線錯誤：{e}", file=sys.stderr)
+                # 指數退避，最多 backoff_cap 秒
+                wait = min(backoff_cap, (2 ** retry) * 3 if retry > 0 else 3)
+                yield log_emit(f"[WARN] 連線錯誤；{wait}s 後重試（第 {retry + 1} 次）…")
+                time.sleep(wait)
+                retry += 1
                 continue
+            except Exception as e:  # pylint: disable=broad-except
+                # 檢查是否為可跳過的錯誤（如私人帳號、已刪除帳號等）
+                error_msg = str(e).lower()
+                if any(keyword in error_msg for keyword in [
+                    'private', 'not found', 'does not exist', 'unavailable',
+                    'deleted', 'suspended', 'blocked', 'invalid'
+                ]):
+                    # 可跳過的錯誤，記錄並繼續
+                    yield log_emit("[SKIP] 跳過無法存取的帳號")
+                    continue
+                else:
+                    # 嚴重錯誤 → 記錄到伺服器端，傳回通用訊息給前端
+                    print(f"[ERROR] 獲取用戶資料時發生錯誤：{e}", file=sys.stderr)
+                    traceback.print_exc()
+                    yield sse("ERROR:獲取用戶資料時發生錯誤，請稍後再試")
+                    return users
+        completed = True
+    except BaseException:
+        # 例外或連線被關閉（GeneratorExit）時呼叫端拿不到 spill，由這裡關閉或刪除
+        users.release()
+        raise
+    finally:
+        # 中斷（429 放棄、連線被關閉、容器重啟前）時保留游標，完成時標記 complete
+        if checkpoint:
+            if completed:
+                checkpoint.finish()
             else:
-                # 嚴重錯誤 → 記錄到伺服器端，傳回通用訊息給前端
-                print(f"[ERROR] 獲取用戶資料時發生錯誤：{e}", file=sys.stderr)
-                traceback.print_exc()
-                yield sse("ERROR:獲取用戶資料時發生錯誤，請稍後再試")
-                return users_pairs, users_objs
+                checkpoint.save(iterator)
 
     # 完成時先顯示100%進度，再顯示完成訊息
     if total and count < total:
@@ -1313,11 +1770,142 @@ def fetch_users_with_progress(iterable, total: Optional[int], label: str,
     else:
         completion_msg = f"{label} 完成：共 {count} 筆"
     yield log_emit(completion_msg, same_line=False)  # 完成訊息另起新行
-    return users_pairs, users_objs
+    return users
+
+
+class ConcurrentFetchError(Exception):
+    """A worker generator in run_concurrently() raised; the original error is __cause__."""
+
+    def __init__(self, label: str):
+        super().__init__(label)
+        self.label = label
+
+
+def run_concurrently(generators: Dict[str, Generator]):
+    """
+    在小型執行緒池中同時驅動多個 SSE 產生器（例如 following 與 followers 的抓取），
+    依產生順序轉送它們 yield 的訊息，最後回傳 {名稱: 產生器的 return 值}。
+
+    若呼叫端中途被關閉（例如瀏覽器斷線），會通知所有 worker 停止並關閉其產生器，
+    讓它們的 finally（保存 checkpoint）得以執行。
+
+    Raises:
+        ConcurrentFetchError: If a worker raised; other workers are stopped first.
+    """
+    events: "queue.Queue[Tuple[str, str, object]]" = queue.Queue()
+    stop = threading.Event()
+
+    def drive(name: str, gen: Generator) -> None:
+        try:
+            while not stop.is_set():
+                events.put(("item", name, next(gen)))
+            gen.close()
+            events.put(("done", name, None))
+        except StopIteration as e:
+            events.put(("done", name, e.value))
+        except BaseException as e:  # pylint: disable=broad-except
+            events.put(("error", name, e))
+
+    results: Dict[str, object] = {}
+    pending = set(generators)
+    pool = ThreadPoolExecutor(max_workers=len(generators), thread_name_prefix="fetch")
+    try:
+        for name, gen in generators.items():
+            # 複製 context，讓 worker 中的 log_emit 仍能取得所屬的工作
+            pool.submit(contextvars.copy_context().run, drive, name, gen)
+        while pending:
+            kind, name, value = events.get()
+            if kind == "item":
+                yield value
+                continue
+            pending.discard(name)
+            if kind == "error":
+                raise ConcurrentFetchError(name) from value  # type: ignore[misc]
+            results[name] = value
+    finally:
+        # 不等待 worker：它們可能正在 rate-limit 睡眠中，醒來後會自行停止
+        stop.set()
+        pool.shutdown(wait=False)
+    return results
+
+
+def stream_watchlist(context, viewer: str, names: List[str],
+                     rate_controller: AdaptiveRateController):
+    """
+    watchlist 模式：逐一查詢帳號與登入者的關係（分批寫入快取並回報進度），
+    輸出報告 CSV 後送出 WATCH_DONE 事件。
+
+    Args:
+        context: Logged-in InstaloaderContext
+        viewer: Logged-in account
+        names: Accounts to check
+        rate_controller: Shared rate controller (cooldown after a rate limit)
+    """
+    yield log_emit(f"[INFO] Watchlist 模式：檢查 {len(names)} 個帳號（不抓完整名單）")
+    rows = []
+    try:
+        for batch, cached in resolve_watchlist(context, viewer, names, WATCHLIST_CACHE,
+                                               cooldown=rate_controller.cooldown):
+            rows.extend(batch)
+            for msg in rate_controller.pop_events():
+                yield log_emit(msg)
+            if cached:
+                yield log_emit(f"[INFO] {len(batch)} 個帳號使用 "
+                               f"{WATCHLIST_TTL_HOURS:g} 小時內的查詢結果")
+            else:
+                yield log_emit(f"[INFO] watchlist 進度：{len(rows)}/{len(names)}")
+    except exceptions.ConnectionException as e:
+        print(f"[RATE-LIMIT][DEBUG] watchlist 查詢中斷：{e}", flush=True)
+        yield log_emit(f"[RATE-LIMIT] 已查詢 {len(rows)}/{len(names)} 個帳號（結果已快取），"
+                       f"請稍後再試，重跑時會從未查詢的帳號繼續")
+        yield sse("ERROR:Instagram API 請求限制，請稍後再試")
+        return
+
+    # 報告依輸入順序排列
+    order = {name: i for i, name in enumerate(names)}
+    rows.sort(key=lambda r: order[r["username"]])
+    report = write_report(DATA_DIR, viewer, rows)
+    counts = summarize(rows)
+    payload = {
+        "counts": counts,
+        "not_following_back": [r["username"] for r in rows
+                               if r["followed_by_viewer"] and r["follows_viewer"] is False],
+        "report_url": f"/download/{report}",
+    }
+    yield sse("WATCH_DONE:" + json.dumps(payload, ensure_ascii=False))
+
+
+def stream_followee_lookups(profile, context, viewer: str, include_avatar: bool,
+                            rate_controller: AdaptiveRateController):
+    """
+    per_user 策略：只抓 following 名單，再以 watchlist 逐一查詢每位追蹤中的帳號是否回追
+    （不抓 followers 名單，不寫入快照）。
+
+    Args:
+        profile: Profile of the logged-in account
+        context: Logged-in InstaloaderContext
+        viewer: Logged-in account
+        include_avatar: Whether to keep avatar URLs while fetching the following list
+        rate_controller: Shared rate controller
+    """
+    following = yield from fetch_users_with_progress(
+        profile.get_followees(), getattr(profile, "followees", None), "following",
+        include_avatar=include_avatar, rate_controller=rate_controller)
+    try:
+        names = [u.username for u in following]
+    finally:
+        following.remove()
+    yield from stream_watchlist(context, viewer, names, rate_controller)
 
 
 RUNS = {}  # username -> {"password":..., "twofa_code":...}
 
+# 分析以背景工作執行，/stream 只負責訂閱；瀏覽器斷線不會中止抓取
+JOBS = JobManager(DATA_DIR)
+
+# 等待使用者輸入 2FA 驗證碼的上限（秒），逾時則結束工作以釋出執行緒
+TWOFA_TIMEOUT = 600
+
 
 @APP.get("/")
 def index():
@@ -1340,17 +1928,32 @@ def start():
         fetch_avatar = fetch_avatar_raw.lower() in ("1", "true", "yes", "on")
     else:
         fetch_avatar = bool(fetch_avatar_raw)
+    incremental_raw = data.get("incremental", False)
+    if isinstance(incremental_raw, str):
+        incremental = incremental_raw.lower() in ("1", "true", "yes", "on")
+    else:
+        incremental = bool(incremental_raw)
+    watchlist, rejected = parse_watchlist(data.get("watchlist") or "")
+    strategy = parse_strategy(data.get("strategy"), incremental)
 
     print(
         f"[DEBUG] Start request - username: {username}, has_password: {bool(password)}", flush=True)
 
     if not username or not password:
         return {"error": "缺少帳號或密碼"}, 400
-    if username in RUNS and RUNS[username].get("running"):
-        return {"error": "此帳號已經在執行中"}, 400
+    if rejected:
+        return {"error": f"不合法的帳號：{', '.join(rejected[:5])}"}, 400
+    if len(watchlist) > WATCHLIST_MAX:
+        return {"error": f"watchlist 一次最多 {WATCHLIST_MAX} 個帳號"}, 400
+    if strategy is None:
+        return {"error": "未知的抓取策略"}, 400
+    if JOBS.active_job(username):
+        # 已在執行中：不重複抓取，改為觀看進行中的分析
+        return {"ok": True, "attached": True}
 
     RUNS[username] = {"password": password, "twofa_code": None,
-                      "running": False, "fetch_avatar": fetch_avatar}
+                      "fetch_avatar": fetch_avatar, "incremental": incremental,
+                      "watchlist": watchlist, "strategy": strategy}
     print(
         f"[DEBUG] Added {username} to RUNS. Current RUNS: {list(RUNS.keys())}", flush=True)
     return {"ok": True}
@@ -1373,159 +1976,38 @@ def twofactor():
 
 
 def find_all_result_folders() -> List[Dict[str, str]]:
-    """尋找所有有效的結果資料夾（格式：IGID_YYYYMMDDHHMMSS）並驗證包含完整的 CSV 檔案"""
+    """列出快照資料庫中所有的結果（IGID_YYYYMMDDHHMMSS），最新在前"""
     try:
-        valid_folders = []
-
-        for item in os.listdir(DATA_DIR):
-            item_path = os.path.join(DATA_DIR, item)
-            if os.path.isdir(item_path) and '_' in item:
-                # 檢查是否符合 IGID_YYYYMMDDHHMMSS 格式
-                parts = item.split('_')
-                if len(parts) >= 2:
-                    # 最後一個部分應該是日期時間
-                    datetime_str = parts[-1]  # YYYYMMDDHHMMSS
-                    # 其餘部分組成 IGID
-                    igid = '_'.join(parts[:-1])
-
-                    # 驗證日期時間格式（14位數字）
-                    if len(datetime_str) == 14 and datetime_str.isdigit():
-                        try:
-                            # 驗證完整的日期時間格式
-                            date_obj = datetime.strptime(
-                                datetime_str, '%Y%m%d%H%M%S')
-
-                            # 檢查資料夾內是否包含四份必要的 CSV 檔案
-                            required_files = [
-                                f"following_users_{datetime_str}.csv",
-                                f"followers_users_{datetime_str}.csv",
-                                f"non_followers_{datetime_str}.csv",
-                                f"fans_you_dont_follow_{datetime_str}.csv"
-                            ]
-
-                            all_files_exist = True
-                            for filename in required_files:
-                                file_path = os.path.join(item_path, filename)
-                                if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
-                                    all_files_exist = False
-                                    break
-
-                            if all_files_exist:
-                                valid_folders.append({
-                                    "folder": item,
-                                    "igid": igid,
-                                    "date": datetime_str,
-                                    "date_formatted": date_obj.strftime('%Y年%m月%d日 %H:%M:%S'),
-                                    "sort_date": datetime_str
-                                })
-                                print(
-                                    f"[DEBUG] 找到有效的結果資料夾: {item} "
-                                    f"(IGID: {igid}, 日期時間: {datetime_str})", flush=True)
-                            else:
-                                print(
-                                    f"[DEBUG] 資料夾 {item} 缺少必要的 CSV 檔案",
-                                    flush=True)
-
-                        except ValueError:
-                            continue
-
-        # 按日期時間排序，最新的在前面
-        valid_folders.sort(key=lambda x: x['sort_date'], reverse=True)
-        return valid_folders
-
-    except (OSError, ValueError) as e:  # More specific exceptions
+        return STORE.list_runs()
+    except sqlite3.Error as e:
         print(f"尋找結果資料夾時發生錯誤: {e}")
         return []
 
 
-def find_latest_result_folder() -> Optional[Dict[str, str]]:
-    """尋找最新的結果資料夾（格式：IGID_YYYYMMDDHHMMSS）並驗證包含完整的 CSV 檔案"""
-    folders = find_all_result_folders()
-    if folders:
-        return folders[0]  # 返回最新的資料夾
-    return None
-
-
-def read_existing_csv(
-        folder_info: Optional[Dict[str, str]] = None
-) -> Optional[Dict[str, List[Dict[str, str]]]]:
-    """從現有的 CSV 檔案載入資料（支援新的資料夾結構）。"""
-    print("開始讀取 CSV 檔案...")  # 偵錯日誌
+def find_latest_result_folder(igid: Optional[str] = None) -> Optional[Dict[str, str]]:
+    """尋找最新的結果；指定 igid 時只找該帳號的結果"""
     try:
-        if not folder_info:
-            folder_info = find_latest_result_folder()
-
-        if not folder_info:
-            print("未找到符合格式的結果資料夾")
-            return None
-
-        folder_name = folder_info["folder"]
-        date_str = folder_info["date"]
-        result_dir = os.path.join(DATA_DIR, folder_name)
-        # 強化: 防止路徑逃逸
-        abs_result_dir = os.path.abspath(result_dir)
-        if not abs_result_dir.startswith(DATA_DIR):
-            print(f"資料夾越界! {abs_result_dir}")
-            return None
-        if not os.path.exists(abs_result_dir):
-            print(f"結果資料夾不存在: {abs_result_dir}")
-            return None
-
-        result: Dict[str, List[Dict[str, str]]] = {
-            "following": [],
-            "followers": [],
-            "following_only": [],
-            "fans_only": [],
-        }
-
-        # 定義檔案對應關係
-        file_mapping = {
-            "following": f"following_users_{date_str}.csv",
-            "followers": f"followers_users_{date_str}.csv",
-            "non_followers": f"non_followers_{date_str}.csv",
-            "fans_you_dont_follow": f"fans_you_dont_follow_{date_str}.csv",
-        }
-
-        chosen_files: Dict[str, Optional[str]] = {}
-
-        # 檢查並讀取檔案
-        def read_into(result_key: str, file_key: str) -> None:
-            filename = file_mapping.get(file_key)
-            if not filename:
-                return
-
-            file_path = os.path.join(result_dir, filename)
-            abs_file_path = os.path.abspath(file_path)
-            # 防止路徑逃逸: 確保檔案在 DATA_DIR 內
-            if not abs_file_path.startswith(DATA_DIR):
-                print(f"檔案越界! {abs_file_path}")
-                return
-            if not os.path.exists(abs_file_path):
-                print(f"檔案不存在: {abs_file_path}")
-                return
+        return STORE.latest_run(igid)
+    except sqlite3.Error as e:
+        print(f"尋找結果資料夾時發生錯誤: {e}")
+        return None
 
-            chosen_files[file_key] = os.path.join(folder_name, filename)
 
-            with open(abs_file_path, "r", encoding="utf-8-sig") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    result[result_key].append({
-                        "username": row.get("username", ""),
-                        "full_name": row.get("full_name", ""),
-                        "avatar_url": "",
-                    })
+def avatar_url(username: str) -> str:
+    """頭像快取中該使用者的網址（含內容 hash）；尚未快取時回傳空字串。"""
+    digest = AVATARS.lookup(username)
+    return f"/avatar/{username}?v={digest}" if digest else ""
 
-        read_into("following", "following")
-        read_into("followers", "followers")
-        read_into("following_only", "non_followers")
-        read_into("fans_only", "fans_you_dont_follow")
 
-        result["files"] = chosen_files  # type: ignore
-        result["folder_info"] = folder_info  # type: ignore
-        return result
-    except (OSError, IOError) as e:  # More specific exceptions
-        print(f"讀取 CSV 時發生錯誤: {e}")
-        return None
+def run_result_urls(folder: str) -> Dict[str, str]:
+    """某次結果四份 CSV 的下載連結（檔案不存在時 /download 由資料庫匯出）。"""
+    date = folder.rsplit("_", 1)[-1]
+    return {
+        "following_url": f"/download/{folder}/following_users_{date}.csv",
+        "followers_url": f"/download/{folder}/followers_users_{date}.csv",
+        "non_followers_url": f"/download/{folder}/non_followers_{date}.csv",
+        "fans_you_dont_follow_url": f"/download/{folder}/fans_you_dont_follow_{date}.csv",
+    }
 
 
 def check_session(skip_folders: bool = False):
@@ -1544,8 +2026,10 @@ def check_session(skip_folders: bool = False):
         print(f"[DEBUG] DATA_DIR 不存在，已創建: {DATA_DIR}", flush=True)
         return {"has_folders": False, "has_session": False, "stage": "login"}
 
-    # 清除所有舊的執行狀態
-    RUNS.clear()
+    # 清除所有舊的執行狀態（背景執行中的工作仍需要其 2FA 狀態）
+    for name in list(RUNS):
+        if not JOBS.active_job(name):
+            del RUNS[name]
 
     print(f"[DEBUG] DATA_DIR 內容: {os.listdir(DATA_DIR)}", flush=True)
 
@@ -1557,6 +2041,11 @@ def check_session(skip_folders: bool = False):
         # 檢查結果資料夾（除非被跳過）
         if not skip_folders:
             print("[DEBUG] 開始檢查結果資料夾", flush=True)
+            try:
+                # CLI 或手動放入的舊資料夾 → 先匯入快照資料庫
+                STORE.import_folders(DATA_DIR)
+            except sqlite3.Error as e:
+                print(f"[WARN] 匯入結果資料夾時發生錯誤：{e}", flush=True)
             all_folders = find_all_result_folders()
             if all_folders:
                 print(f"[DEBUG] 找到 {len(all_folders)} 個結果資料夾", flush=True)
@@ -1649,15 +2138,53 @@ def stream():
     fetch_avatar_override = None
     if fetch_param is not None:
         fetch_avatar_override = fetch_param.lower() in ("1", "true", "yes", "on")
+    incremental_param = request.args.get("incremental")
+    incremental_override = None
+    if incremental_param is not None:
+        incremental_override = incremental_param.lower() in ("1", "true", "yes", "on")
+    try:
+        known_streak = max(1, int(request.args.get("known_streak", INCREMENTAL_KNOWN_STREAK)))
+    except ValueError:
+        known_streak = INCREMENTAL_KNOWN_STREAK
+    watchlist_param = request.args.get("watchlist")
+    watchlist_override = None
+    if watchlist_param is not None:
+        watchlist_override, rejected = parse_watchlist(watchlist_param)
+        if rejected:
+            return sse_response(sse(f"ERROR:不合法的帳號：{', '.join(rejected[:5])}"))
+        if len(watchlist_override) > WATCHLIST_MAX:
+            return sse_response(sse(f"ERROR:watchlist 一次最多 {WATCHLIST_MAX} 個帳號"))
+    strategy_param = request.args.get("strategy")
+    strategy_override = None
+    if strategy_param is not None or incremental_override:
+        strategy_override = parse_strategy(strategy_param, bool(incremental_override))
+        if strategy_override is None:
+            return sse_response(sse("ERROR:未知的抓取策略"))
 
     print(
         f"[DEBUG] Stream request - username: {username}, use_existing: {use_existing}", flush=True)
     print(f"[DEBUG] Current RUNS: {list(RUNS.keys())}", flush=True)
 
-    # 檢查是否已經在執行中
-    if username in RUNS and RUNS[username].get("running"):
-        print(f"[DEBUG] Username {username} already running", flush=True)
-        return Response(sse("ERROR:此帳號已經在執行中"), mimetype="text/event-stream")
+    # EventSource 斷線後自動重連會帶上 Last-Event-ID → 只重播漏掉的訊息
+    active = JOBS.active_job(username)
+    last_event_id = request.headers.get("Last-Event-ID")
+    if last_event_id is not None:
+        job = active or JOBS.latest_job(username)
+        if job is None:
+            return sse_response(sse("ERROR:找不到執行中的工作（伺服器可能已重新啟動），請重新開始"))
+        after = job.channel.parse_event_id(last_event_id)
+        if job.channel.closed and job.channel.last_event_id == last_event_id:
+            # 已收到全部訊息：204 讓 EventSource 停止重連
+            return Response(status=204)
+        print(f"[DEBUG] Resuming job {job.id} for {username} after event {after}", flush=True)
+        return sse_response(job.channel.subscribe(after))
+
+    # 已在背景執行中 → 加入該工作的廣播（先送既有日誌，再接即時訊息），不重複抓取
+    if active:
+        viewers = active.channel.subscribers + 1
+        print(f"[DEBUG] Attaching to running job {active.id} for {username} "
+              f"(viewers: {viewers})", flush=True)
+        return sse_response(active.channel.subscribe())
 
     if use_existing:
         # 如果使用現有 session，創建一個臨時的 RUNS 條目
@@ -1666,25 +2193,34 @@ def stream():
             fetch_avatar_override if fetch_avatar_override is not None else True
         )
         RUNS[username] = {
-            "password": None, "twofa_code": None, "running": True,
-            "fetch_avatar": fetch_avatar_value
+            "password": None, "twofa_code": None,
+            "fetch_avatar": fetch_avatar_value,
+            "incremental": bool(incremental_override),
+            "watchlist": watchlist_override or [],
+            "strategy": strategy_override or STRATEGY_AUTO
         }
     elif username not in RUNS:
         print(
             f"[DEBUG] Username {username} not in RUNS, returning error", flush=True)
-        return Response(sse("ERROR:沒有此任務"), mimetype="text/event-stream")
+        return sse_response(sse("ERROR:沒有此任務"))
     else:
-        # 標記為執行中
-        print(f"[DEBUG] Marking {username} as running", flush=True)
-        RUNS[username]["running"] = True
         if fetch_avatar_override is not None:
             RUNS[username]["fetch_avatar"] = fetch_avatar_override
-
-    @stream_with_context
-    def run_and_stream():
+        if incremental_override is not None:
+            RUNS[username]["incremental"] = incremental_override
+        if watchlist_override is not None:
+            RUNS[username]["watchlist"] = watchlist_override
+        if strategy_override is not None:
+            RUNS[username]["strategy"] = strategy_override
+
+    def run_and_stream(job: Job):
         state = RUNS[username]
         fetch_avatar = state.get("fetch_avatar", True)
+        watchlist = state.get("watchlist") or []
+        strategy = state.get("strategy") or parse_strategy(None, state.get("incremental", False))
         pwd = state["password"]
+        # 已取得的名單 spill；不論如何結束都在 finally 中關閉（暫存檔刪除）
+        spills: List[UserSpill] = []
 
         try:
             yield log_emit("=== IG Non-Followers（Web）===")
@@ -1695,7 +2231,10 @@ def stream():
             time_str = current_time.strftime('%Y-%m-%d %H:%M:%S')
             yield log_emit(f"[INFO] 當前時區: {tz_info}, 本機時間: {time_str}")
 
-            loader = Instaloader()
+            # 共用的自適應速率控制：following / followers 並行抓取時共用同一個請求間隔，
+            # 並從此帳號上次確認安全的速率開始；請求數上限與其他同時執行的分析合計
+            rate_ctl = AdaptiveRateController(rate_state_path(DATA_DIR, username), ledger=LEDGER)
+            loader = Instaloader(rate_controller=rate_ctl.attach)
             loader.context.iphone_support = False
             if not fetch_avatar:
                 yield log_emit("[INFO] 跳過頭像下載以縮短時間")
@@ -1705,38 +2244,8 @@ def stream():
             # 設定更保守的請求參數以避免 429 錯誤
             loader.context.sleep = True
             loader.context.request_timeout = 120  # 增加超時時間
-
-            # 安全地設定速率控制參數
-            try:
-                # pylint: disable=protected-access
-                if hasattr(loader.context, '_rate_controller') and loader.context._rate_controller:
-                    # 保存原始方法
-                    original_query_waittime = loader.context._rate_controller.query_waittime
-
-                    # 創建新的方法來覆蓋原始等待時間
-                    def custom_query_waittime(query_type, current_time, untracked_queries):
-                        if callable(original_query_waittime):
-                            base_wait = original_query_waittime(
-                                query_type, current_time, untracked_queries)
-                        else:
-                            base_wait = 1.0  # 預設值
-
-                        # 根據查詢類型增加等待時間（更保守的設定）
-                        if query_type == 'iphone':
-                            return max(base_wait, 10.0)  # iPhone 查詢至少等待 10 秒
-                        else:
-                            return max(base_wait, 8.0)  # 其他查詢至少等待 8 秒
-
-                    # 替換方法
-                    # pylint: disable=protected-access
-                    loader.context._rate_controller.query_waittime = custom_query_waittime
-                    yield log_emit("[INFO] 已設定保守的請求間隔以避免 API 限制")
-                else:
-                    yield log_emit("[WARN] 無法設定自訂請求間隔，使用預設值")
-            except Exception as e:  # pylint: disable=broad-except
-                print(f"[WARN] 設定請求間隔時發生錯誤: {e}", flush=True)  # 僅在伺服器端記錄詳細信息
-                yield log_emit("[WARN] 設定請求間隔時發生錯誤。已使用預設速率控制。")
-                # 繼續執行，使用預設的速率控制
+            for msg in rate_ctl.pop_events():
+                yield log_emit(msg)
 
             sess_path = os.path.join(DATA_DIR, f"session-{username}")
             # 先試 session
@@ -1764,9 +2273,14 @@ def stream():
                         yield log_emit("[INFO] 需要 2FA 驗證碼…")
                         # 等待 2FA
                         yield log_emit("等待輸入 2FA 驗證碼...")
-                        while RUNS[username].get("twofa_code") in (None, ""):
+                        deadline = time.monotonic() + TWOFA_TIMEOUT
+                        while state.get("twofa_code") in (None, ""):
+                            if time.monotonic() > deadline:
+                                yield sse("UNLOCK_FORM")
+                                yield sse("ERROR:等待 2FA 驗證碼逾時，請重新開始")
+                                return
                             time.sleep(0.5)  # 減少檢查頻率，避免過多日誌
-                        code = RUNS[username].pop("twofa_code")
+                        code = state.pop("twofa_code")
                         try:
                             loader.two_factor_login(code)
                             loader.save_session_to_file(sess_path)
@@ -1812,9 +2326,6 @@ def stream():
                 yield log_emit(f"[INFO] 正在取得用戶 {username} 的資料...")
 
                 # 設定一個簡單的監控機制，不使用輸出重定向避免死鎖
-                import threading  # pylint: disable=import-outside-toplevel
-                import queue  # pylint: disable=import-outside-toplevel
-
                 result_queue = queue.Queue()
 
                 def get_profile_thread():
@@ -1957,101 +2468,193 @@ def stream():
                     yield sse("ERROR:無法取得用戶資料，請稍後再試")
                 return
 
-            # following
-            try:
-                following_count = profile.followees if hasattr(
-                    profile, 'followees') else None
-                following_pairs, following_objs = yield from (
-                    fetch_users_with_progress(
-                        profile.get_followees(), following_count, "following",
-                        include_avatar=fetch_avatar
-                    )
-                )
-            except Exception as e:  # pylint: disable=broad-except
-                print(f"[ERROR] 取得追蹤中列表時發生錯誤：{e}", file=sys.stderr)
-                traceback.print_exc()
-                yield sse("ERROR:取得追蹤中列表時發生錯誤，請稍後再試")
+            # watchlist 模式：只查詢指定帳號，不抓完整名單
+            if watchlist:
+                yield from stream_watchlist(loader.context, username, watchlist, rate_ctl)
                 return
 
-            # followers
+            # 抓取規劃：依兩份名單的人數估算各策略的請求數，選最便宜的（或依參數指定）
             try:
-                followers_count = profile.followers if hasattr(
-                    profile, 'followers') else None
-                followers_pairs, followers_objs = yield from (
-                    fetch_users_with_progress(
-                        profile.get_followers(), followers_count, "followers",
-                        include_avatar=fetch_avatar
+                baseline = snapshot_baseline(STORE.list_runs(username))
+            except sqlite3.Error as e:
+                print(f"[WARN] 讀取上次結果失敗：{e}", flush=True)
+                baseline = None
+
+            # 變化檢查（只在自動模式）：人數與最新快照相同且快照夠新 → 沿用快照或只做增量開頭掃描
+            strategy_reason = "依參數指定"
+            if strategy == STRATEGY_AUTO:
+                latest = (baseline or {}).get("latest")
+                gate, reason = change_gate(
+                    getattr(profile, "followees", None), getattr(profile, "followers", None), latest)
+                yield log_emit(f"[GATE] {reason}")
+                if gate == GATE_REUSE:
+                    yield log_emit(f"[GATE] 沿用 {latest['folder']} 的結果，不重新抓取"
+                                   "（指定抓取策略可強制重新抓取）")
+                    job.result_folder = latest["folder"]
+                    payload = {
+                        "run": latest["folder"],
+                        "counts": latest["counts"],
+                        "reused": True,
+                        **run_result_urls(latest["folder"]),
+                    }
+                    yield sse("DONE:" + json.dumps(payload, ensure_ascii=False))
+                    return
+                if gate == GATE_INCREMENTAL:
+                    yield log_emit("[GATE] 只做增量的開頭掃描")
+                    strategy = STRATEGY_INCREMENTAL
+                    strategy_reason = "人數未變，只做開頭掃描"
+
+            plan = plan_fetch(
+                getattr(profile, "followees", None), getattr(profile, "followers", None),
+                rate_ctl.interval, baseline, known_streak=known_streak,
+                cached_followees=WATCHLIST_CACHE.count_following(username, WATCHLIST_TTL_HOURS),
+                override=strategy, override_reason=strategy_reason)
+            for line in plan.describe():
+                yield log_emit(f"[PLAN] {line}")
+            if plan.strategy == STRATEGY_PER_USER:
+                yield from stream_followee_lookups(
+                    profile, loader.context, username, fetch_avatar, rate_ctl)
+                return
+            incremental = plan.strategy == STRATEGY_INCREMENTAL
+
+            # 大帳號模式：追蹤者超過門檻時，spill 只記住最近的使用者，分類改以外部排序合併
+            # （增量模式需要上次的完整名單，不套用）
+            large = not incremental and is_large_account(getattr(profile, "followers", None))
+            key_window = RECENT_KEYS if large else None
+            if large:
+                yield log_emit(
+                    f"[LARGE] 追蹤者超過 {LARGE_ACCOUNT_THRESHOLD} 人，名單以外部排序比對"
+                    f"（記憶體上限約 {EXTERNAL_SORT_MB} MB）")
+            following_ckpt = FetchCheckpoint(DATA_DIR, username, "following", key_window)
+            followers_ckpt = FetchCheckpoint(DATA_DIR, username, "followers", key_window)
+
+            # 增量模式：以同帳號最新的快照為基準，只抓名單最前面（最新）的部分
+            prev_following: Optional[List[UserRecord]] = None
+            prev_followers: Optional[List[UserRecord]] = None
+            if incremental:
+                prev_folder = find_latest_result_folder(username)
+                if prev_folder:
+                    try:
+                        prev_data = STORE.load_run(prev_folder["folder"])
+                        if prev_data:
+                            prev_following = prev_data["following"]
+                            prev_followers = prev_data["followers"]
+                            yield log_emit(
+                                f"[INCREMENTAL] 以 {prev_folder['folder']} 為基準，"
+                                f"連續 {known_streak} 位已知使用者即停止")
+                    except sqlite3.Error as e:
+                        print(f"[WARN] 讀取上次結果失敗：{e}", flush=True)
+                        prev_following = prev_followers = None
+                if prev_following is None:
+                    yield log_emit("[INCREMENTAL] 找不到可用的上次結果，改為完整抓取")
+
+            def fetch_list(label: str, prev: Optional[List[UserRecord]],
+                           ckpt: FetchCheckpoint):
+                """抓取單一名單（增量或完整），回傳存放名單的 UserSpill。"""
+                get_list = profile.get_followees if label == "following" else profile.get_followers
+                if prev is not None:
+                    users = yield from fetch_users_with_progress(
+                        get_list(), None, label,
+                        include_avatar=fetch_avatar,
+                        known={u.username for u in prev},
+                        known_streak=known_streak,
+                        rate_controller=rate_ctl
                     )
+                    spills.append(users)
+                    yield log_emit(f"[INCREMENTAL] {label} 新增 {len(users)} 筆")
+                    # 新使用者（最新在前）之後接上一份名單；已存在的 username 會被略過，
+                    # id 已出現在新名單的（改名的使用者）也略過，以免同一人出現兩次
+                    fetched_ids = set(users.ids)
+                    users.extend(UserRecord(u.username, u.full_name, user_id=u.user_id)
+                                 for u in prev
+                                 if not (u.user_id and u.user_id in fetched_ids))
+                    return users
+                total = getattr(profile, "followees" if label == "following" else "followers", None)
+                iterator = ckpt.resume_iterator(loader.context)
+                if iterator is None:
+                    iterator = get_list()
+                users = yield from fetch_users_with_progress(
+                    iterator, total, label,
+                    include_avatar=fetch_avatar, checkpoint=ckpt,
+                    rate_controller=rate_ctl
                 )
-            except Exception as e:  # pylint: disable=broad-except
-                print(f"[ERROR] 取得追蹤者列表時發生錯誤：{e}", file=sys.stderr)
-                traceback.print_exc()
-                yield sse("ERROR:取得追蹤者列表時發生錯誤，請稍後再試")
-                return
+                spills.append(users)
+                return users
 
-            following_set: Set[str] = {u for u, _ in following_pairs}
-            followers_set: Set[str] = {u for u, _ in followers_pairs}
-
-            # 分類（物件版也要分）
-            following_only_set = following_set - followers_set
-            fans_only_set = followers_set - following_set
-
-            def filter_objs(objs: List[Dict[str, str]], keep: Set[str]) -> List[Dict[str, str]]:
-                return [o for o in objs if o.get("username") in keep]
-
-            following_only_objs = filter_objs(
-                following_objs, following_only_set)
-            fans_only_objs = filter_objs(followers_objs, fans_only_set)
+            # following / followers 並行抓取，兩者共用同一個 AdaptiveRateController
+            try:
+                results = yield from run_concurrently({
+                    "following": fetch_list("following", prev_following, following_ckpt),
+                    "followers": fetch_list("followers", prev_followers, followers_ckpt),
+                })
+            except ConcurrentFetchError as e:
+                print(f"[ERROR] 取得 {e.label} 列表時發生錯誤：{e.__cause__}", file=sys.stderr)
+                traceback.print_exception(e.__cause__)
+                if e.label == "following":
+                    yield sse("ERROR:取得追蹤中列表時發生錯誤，請稍後再試")
+                else:
+                    yield sse("ERROR:取得追蹤者列表時發生錯誤，請稍後再試")
+                return
+            following_users = results["following"]
+            followers_users = results["followers"]
+
+            if prev_following is not None:
+                # 增量合併看不到取消追蹤，總數不符時提醒改跑完整分析
+                for label, merged, expected in (
+                        ("following", following_users, getattr(profile, "followees", None)),
+                        ("followers", followers_users, getattr(profile, "followers", None))):
+                    if expected is not None and len(merged) != expected:
+                        yield log_emit(
+                            f"[INCREMENTAL] {label} 合併後 {len(merged)} 筆，與帳號顯示的 "
+                            f"{expected} 筆不符（可能有人取消追蹤），建議定期執行完整分析")
+
+            # 分類以兩份名單的 user id 陣列計算（舊資料沒有 id 時以 username），
+            # 大帳號模式則以磁碟上的 sorted runs 合併；名單內容之後由 spill 檔串流輸出
+            if large:
+                yield log_emit("[LARGE] 以外部排序合併比對兩份名單...")
+                following_only, fans_only = external_classify(
+                    following_users, followers_users, spill_dir(DATA_DIR))
+            else:
+                following_only, fans_only = idsets.classify(following_users, followers_users)
+            counts = {
+                "following": len(following_users),
+                "followers": len(followers_users),
+                "following_only": idsets.count(following_only),
+                "fans_only": idsets.count(fans_only),
+            }
 
             # CSV
             yield log_emit("[INFO] 輸出 CSV 檔案...")
 
-            # 產生資料夾路徑（用於顯示訊息）
-            date_tag = datetime.now().strftime("%Y%m%d%H%M%S")
-            folder_name = f"{username}_{date_tag}"
-            result_folder_path = os.path.join(DATA_DIR, folder_name)
-
-            # 1. 追蹤中的使用者
-            following_filename = write_csv(
-                os.path.join(DATA_DIR, "following_users.csv"),
-                following_objs,
-                username
-            )
-
-            # 2. 追蹤你的使用者
-            followers_filename = write_csv(
-                os.path.join(DATA_DIR, "followers_users.csv"),
-                followers_objs,
-                username
-            )
-
-            # 3. 沒回追的使用者
-            nf_filename = write_csv(
-                os.path.join(DATA_DIR, "non_followers.csv"),
-                following_only_objs,
-                username
-            )
-
-            # 4. 沒追蹤回的使用者
-            fy_filename = write_csv(
-                os.path.join(DATA_DIR, "fans_you_dont_follow.csv"),
-                fans_only_objs,
-                username
-            )
-
-            yield log_emit(f"[OK] 已儲存所有 CSV 檔案到 {result_folder_path}")
-
-            # 回傳完成 payload：含四類清單（for UI）與下載連結
+            # 所有輸出使用同一個時間戳，寫進暫存資料夾後一次 rename 到
+            # IGID_YYYYMMDDHHMMSS；兩份差集名單不另存檔，由基本名單推導，下載時才產生 CSV
+            with RunWriter(DATA_DIR, username) as writer:
+                writer.write_users("following_users", following_users.pairs())
+                writer.write_users("followers_users", followers_users.pairs())
+                writer.write_summary(counts)
+                run_folder = writer.commit()
+
+            yield log_emit(f"[OK] 已儲存 CSV 檔案到 {os.path.join(DATA_DIR, run_folder)}")
+
+            # 寫入快照資料庫（之後的載入 / 列表都由資料庫查詢）
+            job.result_folder = run_folder
+            STORE.save_run(
+                username, writer.taken_at, following_users, followers_users,
+                source="incremental" if prev_following is not None else "fetch")
+            for users in spills:
+                users.release()
+
+            # 結果已落地，兩份名單都完整時才刪除 checkpoint
+            if following_ckpt.complete and followers_ckpt.complete:
+                following_ckpt.clear()
+                followers_ckpt.clear()
+
+            # 回傳完成 payload：只含 run id、各名單筆數與下載連結；名單由 /runs/<run>/lists 分頁取得
             payload = {
-                "following": following_objs,
-                "followers": followers_objs,
-                "following_only": following_only_objs,
-                "fans_only": fans_only_objs,
-                # CSV 下載連結
-                "following_url": f"/download/{following_filename}",
-                "followers_url": f"/download/{followers_filename}",
-                "non_followers_url": f"/download/{nf_filename}",
-                "fans_you_dont_follow_url": f"/download/{fy_filename}"
+                "run": run_folder,
+                "counts": counts,
+                # CSV 下載連結（差集名單由 /download 即時產生）
+                **run_result_urls(run_folder),
             }
             yield sse("DONE:" + json.dumps(payload, ensure_ascii=False))
 
@@ -2061,6 +2664,8 @@ def stream():
             yield sse("ERROR:發生未預期錯誤，請稍後再試或聯絡管理員。")
             traceback.print_exc()
         finally:
+            for users in spills:
+                users.release()
             # 清理執行狀態，讓該帳號可以重新登入
             try:
                 if username in RUNS:
@@ -2069,7 +2674,53 @@ def stream():
             except Exception as cleanup_error:  # pylint: disable=broad-except
                 print(f"[DEBUG] 清理狀態時發生錯誤: {cleanup_error}", flush=True)
 
-    return Response(run_and_stream(), mimetype="text/event-stream")
+    job = JOBS.submit(username, {
+        "fetch_avatar": RUNS[username].get("fetch_avatar", True),
+        "incremental": RUNS[username].get("incremental", False),
+        "watchlist": len(RUNS[username].get("watchlist") or []),
+        "strategy": RUNS[username].get("strategy", STRATEGY_AUTO),
+        "known_streak": known_streak,
+        "use_existing": use_existing,
+    }, run_and_stream)
+    print(f"[DEBUG] Submitted job {job.id} for {username}", flush=True)
+    return sse_response(job.channel.subscribe())
+
+
+@APP.get("/jobs")
+def list_jobs():
+    """列出最近的背景分析工作（可用 ?username= 篩選）。
+
+    Returns:
+        JSON response with persisted job states, newest first
+    """
+    username = request.args.get("username") or None
+    return {"ok": True, "jobs": JOBS.list_jobs(username)}
+
+
+@APP.get("/jobs/<job_id>")
+def job_status(job_id):
+    """查詢單一背景分析工作的狀態。
+
+    Returns:
+        JSON response with the job state (status, timestamps, result folder, error)
+    """
+    import re  # pylint: disable=import-outside-toplevel
+    if not re.match(r"^[0-9a-f]{12}$", job_id):
+        return {"ok": False, "error": "非法的工作 ID"}, 400
+    state = JOBS.state(job_id)
+    if state is None:
+        return {"ok": False, "error": "找不到此工作"}, 404
+    return {"ok": True, "job": state}
+
+
+@APP.get("/cache-stats")
+def cache_stats():
+    """快照記憶體快取的命中 / 未命中 / 淘汰次數（僅限本 worker process）。
+
+    Returns:
+        JSON response with the snapshot cache counters and size
+    """
+    return {"ok": True, "snapshots": STORE.cache_stats()}
 
 
 @APP.get("/download/<path:filename>")
@@ -2086,6 +2737,11 @@ def download(filename):
     # filename 可能是 "folder_name/file.csv" 格式
     file_path = os.path.join(DATA_DIR, filename)
     if not os.path.exists(file_path):
+        # 結果資料夾只保存基本名單：差集名單（及舊結果缺少的檔案）由快照資料庫匯出
+        import re  # pylint: disable=import-outside-toplevel
+        m = re.match(r"^([\w\.\-]+_(\d{14}))/(\w+)_(\d{14})\.csv$", filename)
+        if m and m.group(2) == m.group(4) and m.group(3) in EXPORT_FILES:
+            return export_csv(m.group(1), m.group(3))
         return {"error": "檔案不存在"}, 404
 
     # 確保檔案在 DATA_DIR 內（安全性檢查）
@@ -2097,6 +2753,88 @@ def download(filename):
     return send_from_directory(directory, filename_only, as_attachment=True)
 
 
+@APP.get("/avatar/<username>")
+def avatar(username):
+    """從本機頭像快取提供使用者頭像（不連到 Instagram CDN）。
+
+    Args:
+        username: Instagram username
+
+    Returns:
+        JPEG image with long-lived cache headers, or 404 if not cached
+    """
+    import re  # pylint: disable=import-outside-toplevel
+    if not re.match(r"^[\w\.]+$", username):
+        return {"error": "非法的使用者名稱"}, 400
+    path = AVATARS.open_path(username)
+    if path is None:
+        return {"error": "沒有快取的頭像"}, 404
+    resp = send_file(path, mimetype="image/jpeg", max_age=AVATAR_MAX_AGE, conditional=True)
+    # 網址帶有內容 hash（?v=），換頭像時網址也會改變
+    resp.headers["Cache-Control"] = f"public, max-age={AVATAR_MAX_AGE}, immutable"
+    return resp
+
+
+@APP.get("/export/<folder>/<file_key>.csv")
+def export_csv(folder, file_key):
+    """從快照資料庫匯出某次結果的 CSV（與原本四份 CSV 相同格式）。
+
+    Args:
+        folder: Run folder name (IGID_YYYYMMDDHHMMSS)
+        file_key: following_users / followers_users / non_followers / fans_you_dont_follow
+
+    Returns:
+        CSV download or error message
+    """
+    list_key = EXPORT_FILES.get(file_key)
+    if list_key is None:
+        return {"error": "未知的名單"}, 404
+    run = STORE.get_run(folder)
+    if run is None:
+        return {"error": "檔案不存在"}, 404
+
+    import io  # pylint: disable=import-outside-toplevel
+    buf = io.StringIO()
+    buf.write("\ufeff")  # Excel 用 BOM 避免中文亂碼
+    STORE.export_csv(folder, list_key, buf)
+    filename = f"{file_key}_{run['date']}.csv"
+    return Response(
+        buf.getvalue().encode("utf-8", errors="replace"),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+@APP.get("/diff")
+def diff():
+    """比較兩次結果：新增 / 減少的追蹤者與追蹤中，以及取消後又回來的追蹤者。
+
+    Query args:
+        from: Older run folder (IGID_YYYYMMDDHHMMSS)
+        to: Newer run folder
+
+    Returns:
+        JSON response with the diff (memoized on disk per run pair)
+    """
+    import re  # pylint: disable=import-outside-toplevel
+    from_folder = request.args.get("from", "")
+    to_folder = request.args.get("to", "")
+    for folder in (from_folder, to_folder):
+        if not re.match(r"^[\w\.\-]+_\d{14}$", folder):
+            return {"ok": False, "error": "非法的資料夾名稱"}, 400
+
+    try:
+        result = STORE.diff_runs(from_folder, to_folder)
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}, 400
+    except sqlite3.Error as e:
+        print(f"[ERROR] 計算差異時發生錯誤：{e}", file=sys.stderr)
+        return {"ok": False, "error": "無法計算差異，請稍後再試"}, 500
+    if result is None:
+        return {"ok": False, "error": "找不到指定的結果"}, 404
+    return {"ok": True, "data": result}
+
+
 @APP.get("/generate-chart")
 def generate_chart():
     """生成圓餅圖"""
@@ -2128,7 +2866,7 @@ def get_folders():
 
 @APP.get("/load-existing")
 def load_existing():
-    """載入既有 CSV 資料"""
+    """載入既有的分析結果（由快照資料庫讀取）"""
     # 檢查是否指定了特定資料夾
     folder = request.args.get("folder")
     igid = request.args.get("igid")
@@ -2145,30 +2883,122 @@ def load_existing():
             return {"ok": False, "error": "路徑非法"}, 400
         folder_info = {"folder": folder, "igid": igid, "date": date}
 
-    data = read_existing_csv(folder_info)
-    if not data:
+    if not folder_info:
+        folder_info = find_latest_result_folder()
+    try:
+        run = STORE.get_run(folder_info["folder"]) if folder_info else None
+    except sqlite3.Error as e:
+        print(f"讀取快照時發生錯誤: {e}")
+        run = None
+    if not run:
         return {"ok": False, "error": "無法讀取現有資料"}, 400
 
-    files = data.get("files") or {}
-    urls: Dict[str, str] = {}
-    if files.get("following"):
-        urls["following_url"] = f"/download/{files['following']}"
-    if files.get("followers"):
-        urls["followers_url"] = f"/download/{files['followers']}"
-    if files.get("non_followers"):
-        urls["non_followers_url"] = f"/download/{files['non_followers']}"
-    if files.get("fans_you_dont_follow"):
-        urls["fans_you_dont_follow_url"] = f"/download/{files['fans_you_dont_follow']}"
+    # 只回傳 run id 與筆數；名單由 /runs/<run>/lists/<kind> 分頁取得
+    return {
+        "ok": True,
+        "data": {
+            "run": run["folder"],
+            "counts": run["counts"],
+            "folder_info": run,
+            **run_result_urls(run["folder"]),
+        }
+    }
+
 
+@APP.post("/import-export")
+def import_export_archive():
+    """分析上傳的 Instagram「下載你的資訊」匯出檔（JSON 格式 ZIP），不需登入也不呼叫 API。
+
+    Form fields:
+        archive: The ZIP file
+        igid: Account name (optional; read from the archive when omitted)
+
+    Returns:
+        JSON response shaped like /load-existing (run id, counts and download links)
+    """
+    archive = request.files.get("archive")
+    if archive is None or not archive.filename:
+        return {"ok": False, "error": "請選擇匯出的 ZIP 檔"}, 400
+    igid = (request.form.get("igid") or "").strip() or None
+
+    # 上傳內容先寫到 DATA_DIR/spill（zipfile 需要可隨機讀取的檔案），用完即刪除
+    fd, path = tempfile.mkstemp(prefix="export-", suffix=".zip", dir=spill_dir(DATA_DIR))
+    os.close(fd)
+    try:
+        archive.save(path)
+        result = import_export(path, DATA_DIR, STORE, igid)
+    except zipfile.BadZipFile:
+        return {"ok": False, "error": "上傳的檔案不是有效的 ZIP 檔"}, 400
+    except ExportFormatError as e:
+        return {"ok": False, "error": str(e)}, 400
+    except (OSError, sqlite3.Error) as e:
+        print(f"[ERROR] 匯入匯出檔時發生錯誤：{e}", file=sys.stderr)
+        traceback.print_exc()
+        return {"ok": False, "error": "無法匯入匯出檔，請稍後再試"}, 500
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    run = STORE.get_run(result["run"])
+    print(f"[INFO] 已由匯出檔建立結果 {result['run']}"
+          f"{'' if result['imported'] else '（先前已匯入）'}", flush=True)
     return {
         "ok": True,
         "data": {
-            **data,
-            **urls,
+            "run": result["run"],
+            "counts": result["counts"],
+            "folder_info": run,
+            "imported": result["imported"],
+            **run_result_urls(result["run"]),
         }
     }
 
 
+@APP.get("/runs/<run_id>/lists/<kind>")
+def run_list(run_id, kind):
+    """分頁查詢某次結果的一份名單。
+
+    Query args:
+        offset: Number of users to skip (default 0)
+        limit: Page size (default 100, at most LIST_PAGE_MAX)
+        q: Case-insensitive search on username / full name
+        sort: position | username | full_name, "-" prefix for descending
+
+    Returns:
+        JSON response with ``total`` matching users and the page ``items``
+    """
+    import re  # pylint: disable=import-outside-toplevel
+    if not re.match(r"^[\w\.\-]+_\d{14}$", run_id):
+        return {"ok": False, "error": "非法的資料夾名稱"}, 400
+    if kind not in LIST_KINDS:
+        return {"ok": False, "error": "未知的名單種類"}, 400
+    sort = request.args.get("sort", "position")
+    if sort.lstrip("-") not in LIST_SORTS:
+        return {"ok": False, "error": "不支援的排序方式"}, 400
+    try:
+        offset = max(0, int(request.args.get("offset", 0)))
+        limit = min(LIST_PAGE_MAX, max(1, int(request.args.get("limit", 100))))
+    except ValueError:
+        return {"ok": False, "error": "offset / limit 必須是整數"}, 400
+    q = (request.args.get("q") or "").strip()
+
+    try:
+        page = STORE.page_list(run_id, kind, offset, limit, q, sort)
+    except sqlite3.Error as e:
+        print(f"[ERROR] 查詢名單時發生錯誤：{e}", file=sys.stderr)
+        return {"ok": False, "error": "無法讀取名單，請稍後再試"}, 500
+    if page is None:
+        return {"ok": False, "error": "找不到指定的結果"}, 404
+
+    # JSON 邊界：UserRecord 在這裡才轉成 dict
+    items = [{"username": u.username, "full_name": u.full_name, "avatar_url": avatar_url(u.username)}
+             for u in page["items"]]
+    return {"ok": True, "run": run_id, "kind": kind, "total": page["total"],
+            "offset": offset, "limit": limit, "items": items}
+
+
 if __name__ == "__main__":
     # 建議仍用 docker 跑；本機時也可直接 python app.py
     APP.run(host="0.0.0.0", port=int(os.environ.get(
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+On-disk avatar cache (DATA_DIR/avatars/).
+
+to_user_obj 取得的是 Instagram CDN 的頭像網址：網址會過期，快照資料庫也不保存，
+所以舊結果從來沒有頭像，而新結果的每張卡片都直接連到 CDN。
+這裡在抓取期間以有上限的 worker pool 把頭像下載到本機，之後由 /avatar/<username> 提供，
+重新載入舊結果時不需要任何額外的網路請求。
+
+檔名為 <username>.<網址 hash>.jpg：同一使用者換了頭像（網址不同）才會重新下載，
+舊檔隨即刪除。總大小超過上限時依最後使用時間（mtime，每次讀取時更新）淘汰最舊的檔案。
+"""
+from __future__ import annotations
+import hashlib
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Set, Tuple
+
+AVATAR_DIRNAME = "avatars"
+AVATAR_EXT = ".jpg"
+
+# 快取總大小上限（MB）與同時下載數，可用環境變數調整
+AVATAR_CACHE_MB = int(os.environ.get("AVATAR_CACHE_MB", "200"))
+AVATAR_WORKERS = int(os.environ.get("AVATAR_WORKERS", "4"))
+AVATAR_TIMEOUT = 15
+# 單一頭像大小上限（小尺寸頭像通常只有數 KB）
+AVATAR_MAX_BYTES = 512 * 1024
+
+# 讀取時更新 mtime 的最短間隔，避免每次請求都寫入檔案系統
+_TOUCH_INTERVAL = 3600
+# 查無快取時重新掃描目錄（取得其他 worker process 寫入的檔案）的最短間隔（秒）
+_RESCAN_INTERVAL = 30
+
+_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+)
+
+
+def url_hash(url: str) -> str:
+    """頭像網址的 hash（去掉會變動的簽章參數，只看路徑）。"""
+    return hashlib.sha1(url.split("?", 1)[0].encode("utf-8")).hexdigest()[:16]
+
+
+class AvatarCache:
+    """
+    Size-bounded, LRU-evicted cache of avatar images keyed by username and URL hash.
+
+    The in-memory index (username -> (url hash, size, last use)) is built from the
+    directory on start and kept up to date by downloads, so a lookup never touches
+    the file system. Files written by other gunicorn workers are picked up by a
+    rescan, at most once every ``_RESCAN_INTERVAL`` seconds and only on a miss.
+
+    Args:
+        root: Cache directory.
+        max_bytes: Total size above which the least recently used files are removed.
+        workers: Maximum number of concurrent downloads.
+    """
+
+    def __init__(self, root: str, max_bytes: int, workers: int = AVATAR_WORKERS):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index: Dict[str, Tuple[str, int, float]] = {}
+        self._size = 0
+        self._pending: Set[Tuple[str, str]] = set()
+        self._scanned_at = 0.0
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="avatar")
+        self._scan()
+
+    def _path(self, username: str, digest: str) -> str:
+        return os.path.join(self.root, f"{username}.{digest}{AVATAR_EXT}")
+
+    def _scan(self) -> None:
+        """由目錄重建索引；保留記憶體中較新的使用時間（讀取時不一定寫回 mtime）。"""
+        with self._lock:
+            previous = self._index
+            self._index = {}
+            self._size = 0
+            self._scanned_at = time.monotonic()
+            for entry in os.scandir(self.root):
+                name = entry.name
+                if not name.endswith(AVATAR_EXT):
+                    continue
+                username, _, digest = name[:-len(AVATAR_EXT)].rpartition(".")
+                if not username:
+                    continue
+                st = entry.stat()
+                old = self._index.get(username)
+                if old and old[2] >= st.st_mtime:
+                    self._remove(username, digest, st.st_size, index=False)
+                    continue
+                if old:
+                    self._remove(username, old[0], old[1])
+                last_use = st.st_mtime
+                prev = previous.get(username)
+                if prev and prev[0] == digest:
+                    last_use = max(last_use, prev[2])
+                self._index[username] = (digest, st.st_size, last_use)
+                self._size += st.st_size
+
+    def _remove(self, username: str, digest: str, size: int, index: bool = True) -> None:
+        """刪除一個快取檔（呼叫端持有 _lock）。"""
+        try:
+            os.remove(self._path(username, digest))
+        except OSError:
+            pass
+        if index:
+            self._index.pop(username, None)
+            self._size -= size
+
+    def _evict(self) -> None:
+        """總大小超過上限時，從最久未使用的檔案開始刪除（呼叫端持有 _lock）。"""
+        if self._size <= self.max_bytes:
+            return
+        for username, (digest, size, _) in sorted(self._index.items(), key=lambda kv: kv[1][2]):
+            if self._size <= self.max_bytes:
+                break
+            self._remove(username, digest, size)
+
+    def lookup(self, username: str) -> Optional[str]:
+        """回傳使用者目前快取頭像的網址 hash；沒有快取時回傳 None。"""
+        with self._lock:
+            entry = self._index.get(username)
+            if entry:
+                return entry[0]
+            # 可能是其他 worker process 寫入的檔案：每次未命中都列目錄太慢，
+            # 只在距離上次掃描超過 _RESCAN_INTERVAL 秒時重新掃描
+            now = time.monotonic()
+            if now - self._scanned_at < _RESCAN_INTERVAL:
+                return None
+            self._scanned_at = now
+        self._scan()
+        with self._lock:
+            entry = self._index.get(username)
+        return entry[0] if entry else None
+
+    def open_path(self, username: str) -> Optional[str]:
+        """/avatar 用：回傳快取檔路徑並記錄使用時間（LRU）。"""
+        digest = self.lookup(username)
+        if digest is None:
+            return None
+        path = self._path(username, digest)
+        now = time.time()
+        with self._lock:
+            entry = self._index.get(username)
+            if entry and now - entry[2] > _TOUCH_INTERVAL:
+                try:
+                    os.utime(path, (now, now))
+                except OSError:
+                    pass
+                self._index[username] = (entry[0], entry[1], now)
+        return path if os.path.exists(path) else None
+
+    def submit(self, username: str, url: str) -> Optional[Future]:
+        """排入背景下載；已快取相同網址或已在佇列中時不做任何事。"""
+        if not username or not url:
+            return None
+        digest = url_hash(url)
+        with self._lock:
+            entry = self._index.get(username)
+            if (entry and entry[0] == digest) or (username, digest) in self._pending:
+                return None
+            self._pending.add((username, digest))
+        return self._pool.submit(self._download, username, url, digest)
+
+    def _download(self, username: str, url: str, digest: str) -> bool:
+        try:
+            req = urllib.request.Request(url, headers={"User-Agent": _USER_AGENT})
+            with urllib.request.urlopen(req, timeout=AVATAR_TIMEOUT) as resp:  # nosec B310
+                data = resp.read(AVATAR_MAX_BYTES + 1)
+            if not data or len(data) > AVATAR_MAX_BYTES:
+                return False
+            path = self._path(username, digest)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            with self._lock:
+                old = self._index.get(username)
+                if old and old[0] != digest:
+                    self._remove(username, old[0], old[1])
+                elif old:
+                    self._size -= old[1]
+                self._index[username] = (digest, len(data), time.time())
+                self._size += len(data)
+                self._evict()
+            return True
+        except OSError as e:
+            # 頭像只是輔助資訊：下載失敗不影響分析（網址過期、CDN 拒絕等）
+            print(f"[WARN] 無法下載 {username} 的頭像：{e}", flush=True)
+            return False
+        finally:
+            with self._lock:
+                self._pending.discard((username, digest))
+
+
+def open_avatar_cache(data_dir: str) -> AvatarCache:
+    """開啟 data_dir 中的頭像快取。"""
+    return AvatarCache(os.path.join(data_dir, AVATAR_DIRNAME), AVATAR_CACHE_MB * 1024 * 1024)
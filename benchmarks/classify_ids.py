@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: following-only / fans-only classification by username sets (before)
+vs numeric user id arrays (idsets.classify).
+
+以合成名單（following 與 followers 各 n 人，一半重疊）比較兩種分類方式的耗時。
+與抓取時的 UserSpill 相同，username 集合與 id 陣列都在抓取時就已建立，不計入分類時間。
+有安裝 NumPy 時 idsets 使用排序 + searchsorted，否則為 Python 的 int set。
+
+執行方式（於專案根目錄）：python benchmarks/classify_ids.py [使用者數]
+"""
+from __future__ import annotations
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import idsets  # noqa: E402  pylint: disable=wrong-import-position
+
+DEFAULT_USERS = 1_000_000
+
+
+class SyntheticList:
+    """模擬 UserSpill：username 集合與依序排列的 id 陣列。"""
+
+    def __init__(self, n: int, offset: int):
+        self.names = [f"user.{i:07d}" for i in range(offset, offset + n)]
+        self.keys = set(self.names)
+        self.ids = idsets.id_array(10_000_000_000 + i * 7919 for i in range(offset, offset + n))
+
+
+def by_username(following, followers):
+    """過去的做法：走訪 username，查另一份名單的集合。"""
+    return ([u not in followers.keys for u in following.names],
+            [u not in following.keys for u in followers.names])
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_USERS
+    following, followers = SyntheticList(n, 0), SyntheticList(n, n // 2)
+    before, (nf, _) = timed(by_username, following, followers)
+    now, (nf_ids, _) = timed(idsets.classify, following, followers)
+    assert idsets.count(nf_ids) == sum(nf)
+    print(f"users per list : {n:,}（following + followers，一半重疊）")
+    print(f"backend        : {'numpy ' + idsets.np.__version__ if idsets.np else 'python int set'}")
+    print(f"username sets  : {before:8.3f} s")
+    print(f"user id arrays : {now:8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Memory benchmark: list users as tuple + dict (before) vs UserRecord (now).
+
+以 100k 位合成使用者比較名單在記憶體中的佔用量：
+- before：fetch 時同時保存 (username, full_name) tuple 與三個鍵的 dict，
+  following / followers 中的共同使用者各自持有一份 username 字串
+- now：每位使用者一個 UserRecord（__slots__），username 經 sys.intern 共用
+
+執行方式（於專案根目錄）：python benchmarks/memory_records.py [使用者數]
+"""
+from __future__ import annotations
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import UserRecord  # noqa: E402  pylint: disable=wrong-import-position
+
+DEFAULT_USERS = 100_000
+
+
+def synthetic(n: int, offset: int = 0):
+    """產生 (username, full_name, avatar_url)；每次呼叫都建立新的字串物件，模擬 API 回應。"""
+    for i in range(offset, offset + n):
+        yield (f"user.{i:07d}", f"Synthetic User {i}",
+               f"https://scontent.cdninstagram.com/v/t51.2885-19/s100x100/{i:012d}_n.jpg")
+
+
+def build_before(n: int):
+    lists = []
+    # following 與 followers 各 n 人，其中一半重疊
+    for offset in (0, n // 2):
+        pairs, objs = [], []
+        for username, full_name, avatar in synthetic(n, offset):
+            pairs.append((username, full_name))
+            objs.append({"username": username, "full_name": full_name, "avatar_url": avatar})
+        lists.append((pairs, objs))
+    return lists
+
+
+def build_now(n: int):
+    return [[UserRecord(username, full_name, avatar)
+             for username, full_name, avatar in synthetic(n, offset)]
+            for offset in (0, n // 2)]
+
+
+def measure(builder, n: int) -> int:
+    tracemalloc.start()
+    data = builder(n)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return current
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_USERS
+    before = measure(build_before, n)
+    now = measure(build_now, n)
+    print(f"users per list : {n:,}（following + followers，一半重疊）")
+    print(f"tuple + dict   : {before / 2**20:8.1f} MiB  ({before / (2 * n):.0f} B/user)")
+    print(f"UserRecord     : {now / 2**20:8.1f} MiB  ({now / (2 * n):.0f} B/user)")
+    print(f"reduction      : {100 * (1 - now / before):.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Resumable fetch checkpoints for follower / followee pagination.
+
+大帳號抓取名單時，只要一次長時間的 429 或容器重啟就會前功盡棄。
+這裡把 instaloader NodeIterator 的分頁狀態（FrozenNodeIterator）與已抓到的使用者
+存到 DATA_DIR/checkpoints/ 底下，下次同一帳號、同一名單便能從游標處接續，
+不需要再呼叫 profile.get_followers() / get_followees() 從頭開始。
+
+每個 checkpoint 由兩個檔案組成：
+- <account>-<label>.json  ：分頁狀態與已持久化的使用者筆數（原子性覆寫）
+- <account>-<label>.jsonl ：已抓到的使用者，一行一筆（僅附加寫入；即抓取時的 UserSpill）
+
+名單抓完後 checkpoint 會標記為 complete 而非立即刪除，
+等整份結果寫入後才由呼叫端 clear()，避免 followers 中斷時連 following 也要重抓。
+"""
+from __future__ import annotations
+import os
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional
+
+from instaloader import Profile, exceptions
+from instaloader.nodeiterator import FrozenNodeIterator, NodeIterator
+
+from spill import UserSpill
+
+# 每累積多少筆使用者就寫一次 checkpoint（約 10 頁 GraphQL 分頁）
+CHECKPOINT_INTERVAL = 120
+
+# 已抓完的名單在 checkpoint 中保留多久仍可直接沿用
+COMPLETE_MAX_AGE = timedelta(hours=24)
+
+# 名單種類 → GraphQL 回應中的 edge 欄位（與 instaloader.Profile 一致）
+_EDGE_KEYS = {
+    "followers": "edge_followed_by",
+    "following": "edge_follow",
+}
+
+
+def checkpoint_dir(data_dir: str) -> str:
+    """回傳（並建立）存放 checkpoint 的資料夾。"""
+    path = os.path.join(data_dir, "checkpoints")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class FetchCheckpoint:
+    """
+    Checkpoint of a single list fetch (one account, one label).
+
+    Args:
+        data_dir: Directory holding sessions and results (DATA_DIR).
+        account: Instagram username whose list is being fetched.
+        label: Either "followers" or "following".
+        key_window: Large-account mode; passed to :class:`UserSpill` so that only
+            the most recent usernames are kept in memory.
+    """
+
+    def __init__(self, data_dir: str, account: str, label: str,
+                 key_window: Optional[int] = None):
+        if label not in _EDGE_KEYS:
+            raise ValueError(f"unknown checkpoint label: {label}")
+        self.account = account
+        self.label = label
+        base = os.path.join(checkpoint_dir(data_dir), f"{account}-{label}")
+        self.state_path = base + ".json"
+        self.users_path = base + ".jsonl"
+        self.key_window = key_window
+        self.users: Optional[UserSpill] = None
+        self.complete = False
+
+    def _load_state(self) -> Optional[Dict]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def spill(self) -> UserSpill:
+        """抓取時附加使用者的 spill 檔；沒有從 checkpoint 接續時建立新的空檔。"""
+        if self.users is None:
+            self.users = UserSpill(self.users_path, key_window=self.key_window)
+        return self.users
+
+    def resume_iterator(self, context) -> Optional[Iterator]:
+        """
+        從 checkpoint 重建已解凍的 NodeIterator。
+
+        直接以存下來的分頁資料建構 iterator，不會發出任何請求；
+        若 checkpoint 不存在、已過期或不屬於目前登入的帳號，回傳 None 並清除 checkpoint。
+        成功時 :meth:`spill` 會包含先前已抓到的使用者；若該名單先前已抓完，
+        回傳空的 iterator。
+        """
+        state = self._load_state()
+        if not state:
+            return None
+        if state.get("complete"):
+            saved_at = datetime.fromisoformat(state.get("saved_at", "1970-01-01T00:00:00"))
+            if datetime.now() - saved_at > COMPLETE_MAX_AGE:
+                self.clear()
+                return None
+            self.users = UserSpill(self.users_path, resume=int(state.get("count", 0)),
+                                   key_window=self.key_window)
+            self.complete = True
+            return iter(())
+        try:
+            frozen = FrozenNodeIterator(**state["iterator"])
+            if not frozen.best_before or \
+                    datetime.fromtimestamp(frozen.best_before) < datetime.now():
+                raise exceptions.InvalidArgumentException("checkpoint expired")
+            edge_key = _EDGE_KEYS[self.label]
+            iterator = NodeIterator(
+                context,
+                frozen.query_hash,
+                lambda d: d['data']['user'][edge_key],
+                lambda n: Profile(context, n),
+                frozen.query_variables,
+                frozen.query_referer,
+                first_data=frozen.remaining_data,
+                doc_id=frozen.doc_id,
+            )
+            iterator.thaw(frozen)
+        except (KeyError, TypeError, exceptions.InvalidArgumentException) as e:
+            print(f"[WARN] 忽略無效的 checkpoint {self.state_path}：{e}", flush=True)
+            self.clear()
+            return None
+
+        # UserSpill 會把 jsonl 截到已確認的筆數，避免上次中斷時多寫的尾巴造成重複
+        self.users = UserSpill(self.users_path, resume=int(state.get("count", 0)),
+                               key_window=self.key_window)
+        return iterator
+
+    def _write_state(self, **extra) -> None:
+        users = self.spill()
+        users.flush()
+        state = {
+            "account": self.account,
+            "label": self.label,
+            "count": len(users),
+            "saved_at": datetime.now().isoformat(timespec="seconds"),
+            **extra,
+        }
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, self.state_path)
+
+    def save(self, iterator) -> None:
+        """
+        將 spill 檔的緩衝寫出，並原子性地更新分頁狀態與已確認的筆數。
+
+        Args:
+            iterator: The NodeIterator being consumed (ignored if it cannot be frozen).
+        """
+        if self.complete or not isinstance(iterator, NodeIterator):
+            return
+        self._write_state(iterator=iterator.freeze()._asdict())
+
+    def finish(self) -> None:
+        """名單已抓完：寫出剩餘使用者並標記為 complete。"""
+        self._write_state(complete=True)
+        self.complete = True
+
+    def clear(self) -> None:
+        """抓取完成（或 checkpoint 無效）後刪除 checkpoint 檔案。"""
+        if self.users is not None:
+            self.users.close()
+        for path in (self.state_path, self.users_path,
+                     self.state_path + ".tmp", self.users_path + ".tmp"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.users = None
+        self.complete = False
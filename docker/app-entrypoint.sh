@@ -21,9 +21,12 @@ fi
 
 MODE="${MODE:-web}"
 PORT="${PORT:-7860}"
+# 請求數由 DATA_DIR/rate_ledger.db 跨 worker 合計，不會因 worker 變多而超量；
+# 但 /start 與 /stream 之間的執行狀態仍存在各 worker 的記憶體中，預設維持 1
+WORKERS="${WORKERS:-1}"
 
 if [ "$MODE" = "web" ]; then
-  exec gunicorn "app:APP" --bind "0.0.0.0:${PORT}" --workers "1" --threads "8" --timeout "120"
+  exec gunicorn "app:APP" --bind "0.0.0.0:${PORT}" --workers "${WORKERS}" --threads "8" --timeout "120"
 else
   exec python main.py
 fi
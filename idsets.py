@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+List classification (following-only / fans-only / mutual) on numeric user ids.
+
+過去的差集以 username 字串 set 計算：帳號改名後同一個人會被當成「取消追蹤 + 新追蹤」，
+而在百萬筆的名單上，字串 hash 是主要成本。每位使用者現在都帶有 Instagram 的數字
+user id（UserRecord.user_id），兩份名單的 id 都齊全時以 int64 陣列計算：
+NumPy 排序其中一份後以 searchsorted 二分搜尋（與 setdiff1d / intersect1d 相同的
+排序式演算法，但保留名單原順序），沒有安裝 NumPy 時退回 Python 的 int set。
+
+CSV 匯入等舊資料沒有 id（user_id == 0），這時改以 username 比對。
+NumPy 為選用相依套件（Web 版的 matplotlib 已會一併安裝）。
+"""
+from __future__ import annotations
+from array import array
+from typing import Iterable, Sequence, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover - 沒有 NumPy 時使用純 Python 版本
+    np = None
+
+# 沒有 id 的使用者（舊資料）
+NO_ID = 0
+
+
+def id_array(ids: Iterable[int] = ()) -> array:
+    """以 8 bytes / 筆的 int64 陣列保存 user id。"""
+    return array("q", ids)
+
+
+def _ids_of(users) -> array:
+    # UserSpill 已在附加時記錄 id；UserRecord 名單則在此收集
+    ids = getattr(users, "ids", None)
+    return ids if ids is not None else id_array(u.user_id for u in users)
+
+
+def _complete(ids: array) -> bool:
+    """是否每位使用者都有 id。"""
+    if np is not None:
+        return bool(np.frombuffer(ids, dtype=np.int64).all()) if len(ids) else True
+    return NO_ID not in ids
+
+
+def _not_in(a_ids: array, b_ids: array) -> Sequence[bool]:
+    """a 中每個 id 是否不在 b 中（與 a 同順序的布林遮罩）。"""
+    if np is not None:
+        a_arr = np.frombuffer(a_ids, dtype=np.int64)
+        b_sorted = np.sort(np.frombuffer(b_ids, dtype=np.int64))
+        if not len(b_sorted):
+            return np.ones(len(a_arr), dtype=bool)
+        # 在排序後的 b 中二分搜尋 a 的每個 id（即 setdiff1d，但保留 a 的原順序）
+        idx = np.searchsorted(b_sorted, a_arr)
+        idx[idx == len(b_sorted)] = 0
+        return b_sorted[idx] != a_arr
+    b_set = set(b_ids)
+    return [x not in b_set for x in a_ids]
+
+
+def _names_not_in(a, a_ids: array, b, b_ids: array) -> Sequence[bool]:
+    """username 不在 b 中，且沒有 id 或 id 也不在 b 中（與資料庫的比對規則相同）。"""
+    b_names = getattr(b, "keys", None)
+    if b_names is None:
+        b_names = {u.username for u in b}
+    b_id_set = set(b_ids)
+    b_id_set.discard(NO_ID)
+    return [u.username not in b_names and (uid == NO_ID or uid not in b_id_set)
+            for u, uid in zip(a, a_ids)]
+
+
+def classify(following, followers) -> Tuple[Sequence[bool], Sequence[bool]]:
+    """
+    回傳 (following 中沒有回追的遮罩, followers 中你沒有追蹤的遮罩)，皆依名單原順序；
+    遮罩為 False 的即為互相追蹤。
+
+    兩份名單的 id 都齊全時以 id 比對（改名不影響結果）；否則 username 或 id 任一相同
+    即視為同一人。
+
+    Args:
+        following: UserSpill or sequence of UserRecord.
+        followers: UserSpill or sequence of UserRecord.
+    """
+    a_ids, b_ids = _ids_of(following), _ids_of(followers)
+    if _complete(a_ids) and _complete(b_ids):
+        return _not_in(a_ids, b_ids), _not_in(b_ids, a_ids)
+    return (_names_not_in(following, a_ids, followers, b_ids),
+            _names_not_in(followers, b_ids, following, a_ids))
+
+
+def count(mask: Sequence[bool]) -> int:
+    """遮罩中 True 的數量。"""
+    if np is not None and isinstance(mask, np.ndarray):
+        return int(np.count_nonzero(mask))
+    if isinstance(mask, (bytes, bytearray)):
+        # external_merge 的遮罩：每位使用者 1 byte
+        return len(mask) - mask.count(0)
+    return sum(1 for m in mask if m)
+
+
+def select(users: Iterable, mask: Sequence[bool]) -> Iterable:
+    """依遮罩串流挑出使用者（users 與 mask 同順序）。"""
+    return (u for u, keep in zip(users, mask) if keep)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Analyse the ZIP archive from Instagram's "Download your information" export.
+
+Instagram 的資料匯出（JSON 格式）在 connections/followers_and_following/ 中附有
+followers_1.json、followers_2.json…與 following.json。這裡直接以 zipfile 串流解壓這些檔案
+（不解開整個壓縮檔），逐一解析陣列中的元素寫入 UserSpill，之後與線上抓取相同：
+分類、RunWriter 輸出 CSV 與摘要、寫入快照資料庫。完全不需要登入，也不會呼叫任何 API。
+
+匯出檔沒有數字 user id，比對以 username 進行；run 的時間戳取自壓縮檔中名單檔案的時間。
+"""
+from __future__ import annotations
+import io
+import json
+import re
+import zipfile
+from datetime import datetime
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
+
+import idsets
+from records import UserRecord
+from run_writer import RunWriter
+from snapshot_store import SnapshotStore
+from spill import open_spill
+
+# 名單檔案（舊版匯出沒有 connections/ 這一層）
+_FOLLOWERS_RE = re.compile(r"(?:^|/)followers(?:_(\d+))?\.json$")
+_FOLLOWING_RE = re.compile(r"(?:^|/)following\.json$")
+_OWNER_RE = re.compile(r"(?:^|/)personal_information\.json$")
+_PROFILE_HREF_RE = re.compile(r"instagram\.com/(?:_u/)?([\w.]+)")
+# 陣列之前只允許出現外層物件的開頭與一個鍵（例如 {"relationships_following": [ ）
+_ARRAY_PREFIX_RE = re.compile(r'^\s*(?:\{\s*"[^"]*"\s*:\s*)?$')
+_IGID_RE = re.compile(r"^[\w.]+$")
+
+# 串流解析時每次讀取的字元數
+_READ_CHUNK = 64 * 1024
+
+
+class ExportFormatError(ValueError):
+    """壓縮檔不是可辨識的 Instagram 匯出檔（或為 HTML 格式）。"""
+
+
+def _iter_array(text: IO[str]) -> Iterator[Dict]:
+    """
+    逐一產生 JSON 檔中第一個陣列的物件元素，每次只讀入一小段文字。
+
+    支援頂層即為陣列（followers_N.json），或外層物件只有一個鍵、其值為陣列
+    （following.json 的 relationships_following）。
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    eof = False
+
+    def fill() -> None:
+        nonlocal buf, eof
+        chunk = text.read(_READ_CHUNK)
+        if not chunk:
+            eof = True
+        buf += chunk
+
+    while "[" not in buf and not eof:
+        fill()
+    start = buf.find("[")
+    if start < 0 or not _ARRAY_PREFIX_RE.match(buf[:start]):
+        raise ExportFormatError("名單檔案中找不到使用者陣列")
+    buf = buf[start + 1:]
+    pos = 0
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ExportFormatError("名單檔案不完整")
+            buf = ""
+            pos = 0
+            fill()
+            continue
+        if buf[pos] == "]":
+            return
+        if buf[pos] != "{":
+            raise ExportFormatError("名單檔案格式不符")
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # 元素被讀取邊界截斷：丟掉已處理的部分，補讀後重試
+            if eof:
+                raise ExportFormatError("名單檔案不完整") from None
+            buf = buf[pos:]
+            pos = 0
+            fill()
+            continue
+        yield obj
+        pos = end
+
+
+def _entry_username(entry: Dict) -> Optional[str]:
+    """名單元素中的帳號名稱：string_list_data 的 value，其次 title，最後由個人檔案連結取得。"""
+    items = entry.get("string_list_data") or []
+    for item in items:
+        if isinstance(item, dict) and item.get("value"):
+            return str(item["value"])
+    if entry.get("title"):
+        return str(entry["title"])
+    for item in items:
+        m = _PROFILE_HREF_RE.search(str(item.get("href") or "")) if isinstance(item, dict) else None
+        if m:
+            return m.group(1)
+    return None
+
+
+def iter_export_users(zf: zipfile.ZipFile, members: List[zipfile.ZipInfo]) -> Iterator[UserRecord]:
+    """依序串流讀取名單檔案中的使用者（同一檔案內依匯出檔的順序）。"""
+    for info in members:
+        with zf.open(info) as raw:
+            text = io.TextIOWrapper(raw, encoding="utf-8")
+            for entry in _iter_array(text):
+                username = _entry_username(entry)
+                if username:
+                    yield UserRecord(username)
+
+
+def find_list_members(zf: zipfile.ZipFile) -> Tuple[List[zipfile.ZipInfo], List[zipfile.ZipInfo]]:
+    """回傳 (following 檔案, followers 檔案)；followers 依 _1、_2… 排序。"""
+    following: List[zipfile.ZipInfo] = []
+    followers: List[Tuple[int, zipfile.ZipInfo]] = []
+    has_html = False
+    for info in zf.infolist():
+        name = info.filename
+        if name.endswith(".html") and "followers_and_following" in name:
+            has_html = True
+        if _FOLLOWING_RE.search(name):
+            following.append(info)
+            continue
+        m = _FOLLOWERS_RE.search(name)
+        if m:
+            followers.append((int(m.group(1) or 0), info))
+    if not following or not followers:
+        if has_html:
+            raise ExportFormatError("這是 HTML 格式的匯出檔，請在 Instagram 重新申請 JSON 格式")
+        raise ExportFormatError("壓縮檔中找不到 followers_*.json 與 following.json")
+    return following, [info for _, info in sorted(followers, key=lambda x: x[0])]
+
+
+def export_owner(zf: zipfile.ZipFile) -> Optional[str]:
+    """由 personal_information.json 取得匯出檔所屬的帳號名稱；找不到時回傳 None。"""
+    for info in zf.infolist():
+        if not _OWNER_RE.search(info.filename):
+            continue
+        try:
+            with zf.open(info) as f:
+                data = json.load(f)
+            fields = data["profile_user"][0]["string_map_data"]
+        except (ValueError, KeyError, IndexError, TypeError):
+            return None
+        for key in ("Username", "使用者名稱", "用戶名稱"):
+            value = (fields.get(key) or {}).get("value")
+            if value:
+                return str(value)
+    return None
+
+
+def export_taken_at(members: List[zipfile.ZipInfo]) -> str:
+    """名單檔案在壓縮檔中最晚的修改時間（YYYYMMDDHHMMSS），即匯出的時間。"""
+    stamp = max(datetime(*info.date_time) for info in members)
+    if stamp.year <= 1980:
+        # 沒有記錄時間（ZIP 的最小值）
+        stamp = datetime.now()
+    return stamp.strftime("%Y%m%d%H%M%S")
+
+
+def import_export(source: Union[str, IO[bytes]], data_dir: str, store: SnapshotStore,
+                  igid: Optional[str] = None) -> Dict:
+    """
+    分析 Instagram 匯出的 ZIP 檔並存成一次結果，回傳 {"run", "counts", "imported"}。
+
+    同一份匯出檔（同帳號、同時間戳）已匯入過時不重複寫入，``imported`` 為 False。
+
+    Args:
+        source: Path or seekable binary file object of the ZIP archive.
+        data_dir: Directory holding the result folders (DATA_DIR).
+        store: Snapshot store the run is saved to.
+        igid: Account name; read from the archive when omitted.
+
+    Raises:
+        zipfile.BadZipFile: If ``source`` is not a ZIP archive.
+        ExportFormatError: If the archive is not a JSON Instagram export or the
+            account name cannot be determined.
+    """
+    with zipfile.ZipFile(source) as zf:
+        following_members, followers_members = find_list_members(zf)
+        igid = igid or export_owner(zf)
+        if not igid:
+            raise ExportFormatError("匯出檔中找不到帳號名稱，請指定帳號")
+        if not _IGID_RE.match(igid):
+            raise ExportFormatError("非法的帳號名稱")
+        taken_at = export_taken_at(following_members + followers_members)
+        existing = store.get_run(f"{igid}_{taken_at}")
+        if existing is not None:
+            return {"run": existing["folder"], "counts": existing["counts"], "imported": False}
+
+        following = open_spill(data_dir, "following")
+        followers = open_spill(data_dir, "followers")
+        try:
+            following.extend(iter_export_users(zf, following_members))
+            followers.extend(iter_export_users(zf, followers_members))
+            following_only, fans_only = idsets.classify(following, followers)
+            counts = {
+                "following": len(following),
+                "followers": len(followers),
+                "following_only": idsets.count(following_only),
+                "fans_only": idsets.count(fans_only),
+            }
+            with RunWriter(data_dir, igid, taken_at) as writer:
+                writer.write_users("following_users", following.pairs())
+                writer.write_users("followers_users", followers.pairs())
+                writer.write_summary(counts)
+                run_folder = writer.commit()
+            store.save_run(igid, writer.taken_at, following, followers, source="export")
+        finally:
+            following.remove()
+            followers.remove()
+    return {"run": run_folder, "counts": counts, "imported": True}
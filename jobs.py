@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Background analysis jobs, decoupled from the SSE response.
+
+原本整個分析在 /stream 的 response generator 裡執行：瀏覽器分頁關閉或 proxy 斷線，
+抓取就跟著中止，而且一次數小時的抓取會一直佔住 gunicorn 的一個 thread。
+這裡把分析包成工作交給固定大小的執行緒池執行，產生的 SSE 訊息存在工作上，
+/stream 只是訂閱者：可以隨時連上、斷開、再重新連上，工作本身會跑完並寫入結果。
+
+每個工作有自己的廣播頻道（EventChannel），任意數量的分頁可同時觀看同一次分析，
+各自收到既有的日誌再接著收即時訊息，不會因此重複抓取。
+每則訊息帶有 SSE id（<job_id>:<序號>），工作只保留最近 EVENT_BUFFER 則；
+EventSource 斷線重連時會送出 Last-Event-ID，訂閱者只重播漏掉的部分。
+等待期間（例如 rate-limit 冷卻）每 HEARTBEAT_INTERVAL 秒送出註解行，避免反向代理切斷閒置連線。
+
+工作狀態（不含密碼）持久化在 DATA_DIR/jobs/<job_id>.json；
+程式重啟時仍標記為執行中的工作會改為 interrupted（名單可由 checkpoint 接續）。
+"""
+from __future__ import annotations
+import os
+import json
+import uuid
+import threading
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 同時執行的分析數上限（其餘排隊）
+MAX_CONCURRENT_JOBS = int(os.environ.get("MAX_JOBS", "4"))
+
+# 記憶體中保留多少個已結束的工作（供重新連線時重播）
+JOB_HISTORY = 20
+
+# 每個工作保留的 SSE 訊息數（ring buffer）
+EVENT_BUFFER = 2000
+
+# 沒有新訊息時送出 keep-alive 註解的間隔（秒）
+HEARTBEAT_INTERVAL = 15
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# 工作產生的 SSE 訊息中代表失敗的前綴（見 app.sse）
+_ERROR_EVENT = "data: ERROR:"
+
+
+# 目前程式碼所屬的工作（run_concurrently 的 worker 也會複製此 context）
+_current_job: ContextVar[Optional["Job"]] = ContextVar("current_job", default=None)
+
+
+def current_job() -> Optional["Job"]:
+    """回傳目前執行中的工作；不在工作內（例如 CLI 或一般 request）時為 None。"""
+    return _current_job.get()
+
+
+def jobs_dir(data_dir: str) -> str:
+    """回傳（並建立）存放工作狀態的資料夾。"""
+    path = os.path.join(data_dir, "jobs")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class EventChannel:
+    """
+    Broadcast channel of one run: a numbered ring buffer of SSE events that any
+    number of subscribers can follow.
+
+    Each subscriber gets the buffered backlog and then live events; a
+    subscriber disconnecting has no effect on the publisher or other viewers.
+
+    Args:
+        name: Prefix of the SSE ids (the job id).
+        maxlen: Number of events kept for replay.
+    """
+
+    def __init__(self, name: str, maxlen: int = EVENT_BUFFER):
+        self.name = name
+        self._events: Deque[Tuple[int, str]] = deque(maxlen=maxlen)
+        self._seq = 0
+        self._closed = False
+        self._subscribers = 0
+        self._cond = threading.Condition()
+
+    @property
+    def subscribers(self) -> int:
+        return self._subscribers
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def last_event_id(self) -> str:
+        return f"{self.name}:{self._seq}"
+
+    def parse_event_id(self, event_id: Optional[str]) -> int:
+        """由 Last-Event-ID 取得已收到的序號；屬於其他頻道或格式不符時為 0。"""
+        name, _, seq = (event_id or "").partition(":")
+        if name != self.name or not seq.isdigit():
+            return 0
+        return int(seq)
+
+    def publish(self, event: str) -> None:
+        """加入一則 SSE 訊息（編上序號）並喚醒所有訂閱者。"""
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, event))
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        """不再有新訊息；訂閱者送完剩餘訊息後結束。"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def subscribe(self, after: int = 0,
+                  heartbeat: float = HEARTBEAT_INTERVAL) -> Iterator[str]:
+        """
+        產生序號大於 after 的訊息（加上 SSE id），頻道關閉且訊息送完後停止。
+
+        已被 ring buffer 淘汰的訊息無法重播，會以一行日誌說明略過的數量；
+        沒有新訊息時每 heartbeat 秒產生一行 SSE 註解。
+        """
+        with self._cond:
+            last = min(after, self._seq)
+            self._subscribers += 1
+        try:
+            while True:
+                with self._cond:
+                    if self._seq <= last and not self._closed:
+                        self._cond.wait(heartbeat)
+                    first = self._events[0][0] if self._events else self._seq + 1
+                    batch = list(islice(self._events, max(0, last + 1 - first), None))
+                    finished = self._closed
+                if batch:
+                    skipped = batch[0][0] - last - 1
+                    if skipped > 0:
+                        yield f"data: LOG:[INFO] 已略過 {skipped} 則較舊的日誌\n\n"
+                    for seq, event in batch:
+                        yield f"id: {self.name}:{seq}\n{event}"
+                    last = batch[-1][0]
+                elif finished:
+                    return
+                else:
+                    yield ": keep-alive\n\n"
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+
+
+class Job:
+    """
+    One analysis run, its broadcast channel and its per-run logging state.
+
+    Args:
+        job_id: Unique id of the job.
+        username: Instagram account being analysed.
+        options: Non-secret run options (fetch_avatar, incremental, ...).
+    """
+
+    def __init__(self, job_id: str, username: str, options: Dict):
+        self.id = job_id
+        self.username = username
+        self.options = options
+        self.status = "queued"
+        self.created_at = _now()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.result_folder: Optional[str] = None
+        self.error: Optional[str] = None
+        self.channel = EventChannel(job_id)
+        # 伺服器終端機上一行是否為同行覆寫的進度（取代原本全域的 _log_state）
+        self.last_same_line = False
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+    def publish(self, event: str) -> None:
+        """廣播一則 SSE 訊息給所有訂閱者。"""
+        if event.startswith(_ERROR_EVENT):
+            self.error = event[len(_ERROR_EVENT):].strip()
+        self.channel.publish(event)
+
+    def set_status(self, status: str) -> None:
+        self.status = status
+        if status == "running":
+            self.started_at = _now()
+        elif status not in ACTIVE_STATUSES:
+            self.finished_at = _now()
+            self.channel.close()
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "username": self.username,
+            "options": self.options,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result_folder": self.result_folder,
+            "error": self.error,
+            "viewers": self.channel.subscribers,
+            "pid": os.getpid(),
+        }
+
+
+class JobManager:
+    """
+    Runs analysis jobs on a bounded thread pool and persists their state.
+
+    Args:
+        data_dir: Directory holding sessions and results (DATA_DIR).
+        max_workers: Number of analyses allowed to run at the same time.
+    """
+
+    def __init__(self, data_dir: str, max_workers: int = MAX_CONCURRENT_JOBS):
+        self.dir = jobs_dir(data_dir)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._mark_interrupted()
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.dir, f"{job_id}.json")
+
+    def _save(self, job: Job) -> None:
+        path = self._path(job.id)
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(job.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[WARN] 無法寫入工作狀態 {path}：{e}", flush=True)
+
+    def _load(self, job_id: str) -> Optional[Dict]:
+        try:
+            with open(self._path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _mark_interrupted(self) -> None:
+        """上次執行時尚未結束、且所屬 process 已不存在的工作標記為 interrupted。"""
+        for name in os.listdir(self.dir):
+            if not name.endswith(".json"):
+                continue
+            state = self._load(name[:-5])
+            if not state or state.get("status") not in ACTIVE_STATUSES:
+                continue
+            pid = state.get("pid")
+            if pid and pid != os.getpid() and _pid_alive(pid):
+                continue  # 其他 worker 仍在執行
+            state["status"] = "interrupted"
+            state["finished_at"] = _now()
+            tmp = self._path(state["id"]) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp, self._path(state["id"]))
+            print(f"[INFO] 工作 {state['id']}（{state.get('username')}）於重啟前中斷", flush=True)
+
+    def active_job(self, username: str) -> Optional[Job]:
+        """該帳號目前排隊中或執行中的工作。"""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.username == username and job.active:
+                    return job
+        return None
+
+    def latest_job(self, username: str) -> Optional[Job]:
+        """該帳號在記憶體中最近的工作（含已結束者，供斷線重連時重播）。"""
+        with self._lock:
+            for job in reversed(self._jobs.values()):
+                if job.username == username:
+                    return job
+        return None
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def state(self, job_id: str) -> Optional[Dict]:
+        """工作狀態：記憶體中的工作優先，否則讀取持久化的狀態。"""
+        job = self.get(job_id)
+        return job.to_dict() if job else self._load(job_id)
+
+    def list_jobs(self, username: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """最近的工作（最新在前），可依帳號篩選。"""
+        states = []
+        for name in os.listdir(self.dir):
+            if name.endswith(".json"):
+                state = self.state(name[:-5])
+                if state and (username is None or state.get("username") == username):
+                    states.append(state)
+        states.sort(key=lambda s: s.get("created_at") or "", reverse=True)
+        return states[:limit]
+
+    def submit(self, username: str, options: Dict,
+               work: Callable[[Job], Iterable[str]]) -> Job:
+        """
+        建立並排入一個工作；若該帳號已有進行中的工作，直接回傳該工作。
+
+        Args:
+            username: Instagram account to analyse.
+            options: Non-secret options, persisted with the job state.
+            work: Called with the job on a pool thread; every item it yields is
+                published to subscribers.
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                if job.username == username and job.active:
+                    return job
+            job = Job(uuid.uuid4().hex[:12], username, options)
+            self._jobs[job.id] = job
+            # 只保留最近的已結束工作
+            finished = [j for j in self._jobs.values() if not j.active]
+            for old in finished[:max(0, len(finished) - JOB_HISTORY)]:
+                del self._jobs[old.id]
+        self._save(job)
+        self._pool.submit(self._run, job, work)
+        return job
+
+    def _run(self, job: Job, work: Callable[[Job], Iterable[str]]) -> None:
+        token = _current_job.set(job)
+        job.set_status("running")
+        self._save(job)
+        status = "done"
+        try:
+            for event in work(job):
+                job.publish(event)
+            if job.error:
+                status = "error"
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"[ERROR] 工作 {job.id} 發生未預期錯誤：{e}", flush=True)
+            traceback.print_exc()
+            job.error = job.error or str(e)
+            status = "error"
+        finally:
+            job.set_status(status)
+            self._save(job)
+            _current_job.reset(token)
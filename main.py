@@ -7,23 +7,56 @@ IG Non-Followers – 互動版（含登入自動重試，CSV 含 full_name）
 - Session 與 CSV 儲存在 data/（或 /app/data）。
 - 進度條 + 節流/連線重試。
 - CSV 欄位：username, full_name, profile_url
+- --incremental：只抓上次結果之後新增的使用者，再與上次名單合併。
+- 追蹤者超過 --large-threshold 時自動改用大帳號模式：名單以磁碟上的外部排序比對，
+  記憶體以 --sort-memory-mb 為上限。
+- 每次結果也寫入 data/snapshots.db；`import` 匯入舊資料夾、`export` 依需求匯出 CSV、
+  `diff` 比較任兩次結果（新增 / 取消 / 回流）。
+- 抓取前依人數估算完整抓取 / 增量 / 逐一查詢追蹤中帳號的請求數，自動選最便宜的（--strategy 可指定）。
+- 人數與最新快照相同且快照夠新時（--gate-ttl-hours），沿用快照或只做增量開頭掃描（--gate-action）。
+- `import-zip`：直接分析 Instagram「下載你的資訊」匯出的 ZIP 檔（不需登入、不呼叫 API）。
+- `watchlist`：只逐一查詢指定帳號與你的追蹤關係（有 TTL 快取），輸出一份小報告 CSV。
 """
 from __future__ import annotations
 import os
 import sys
 import csv
+import argparse
 import time
 import getpass
 import traceback
+import zipfile
 from typing import Iterable, List, Tuple, Set, Optional
 from datetime import datetime
 
 from instaloader import Instaloader, Profile, exceptions
 from tqdm import tqdm
 
+import idsets
+from checkpoint import CHECKPOINT_INTERVAL, FetchCheckpoint
+from ig_export import ExportFormatError, import_export
+from external_merge import (
+    EXTERNAL_SORT_MB, LARGE_ACCOUNT_THRESHOLD, RECENT_KEYS, external_classify, is_large_account
+)
+from planner import (
+    CHANGE_GATE_ACTION, CHANGE_GATE_TTL_HOURS, GATE_ACTIONS, GATE_INCREMENTAL, GATE_REUSE,
+    STRATEGIES, STRATEGY_AUTO, STRATEGY_INCREMENTAL, STRATEGY_PER_USER, change_gate,
+    parse_strategy, plan_fetch, snapshot_baseline
+)
+from rate_control import AdaptiveRateController, is_rate_limited, rate_state_path
+from rate_ledger import open_ledger
+from records import UserRecord
+from snapshot_store import EXPORT_FILES, open_store
+from run_writer import RunWriter
+from snapshots import INCREMENTAL_KNOWN_STREAK
+from spill import UserSpill, open_spill, spill_dir
+from watchlist import (
+    WATCHLIST_MAX, WATCHLIST_TTL_HOURS, open_relationship_cache, parse_watchlist,
+    read_watchlist_file, resolve_watchlist, summarize, write_report
+)
+
 # === 可調參數 ===
 PROGRESS_STEP = 1
-RATE_LIMIT_SLEEP = 90
 CONNECTION_MAX_RETRIES = 5
 OUTPUT_NON_FOLLOWERS = "non_followers.csv"
 OUTPUT_FANS_NOT_FOLLOWED = "fans_you_dont_follow.csv"
@@ -214,45 +247,79 @@ def ensure_session(loader: Instaloader) -> tuple[str, str]:
 
 
 def fetch_users_with_progress(
-    it: Iterable, total: Optional[int], label: str
-) -> List[Tuple[str, str]]:
+    it: Iterable, total: Optional[int], label: str,
+    checkpoint: Optional[FetchCheckpoint] = None,
+    known: Optional[Set[str]] = None,
+    known_streak: int = INCREMENTAL_KNOWN_STREAK,
+    rate_controller: Optional[AdaptiveRateController] = None
+) -> UserSpill:
     """
-    逐步迭代名單，顯示進度條，並回傳 [(username, full_name)]。
+    逐步迭代名單，顯示進度條，並回傳存放使用者的 UserSpill（逐筆附加到磁碟）。
+    若提供 checkpoint，spill 即 checkpoint 的使用者檔，會沿用其中已抓到的使用者，
+    並定期 / 遇到 429 / 中斷時保存游標；否則為暫存檔，用完由呼叫端 remove()。
+    若提供 known（增量模式），只回傳不在 known 中的使用者，
+    並在連續 known_streak 位已知使用者後停止（名單為最新在前）。
+    遇到 429 時的冷卻時間由 rate_controller 決定。
     """
-    users: List[Tuple[str, str]] = []
-    pbar = tqdm(total=total, desc=label, unit="user")
+    users = checkpoint.spill() if checkpoint else open_spill(resolve_data_dir(), label)
+    if users:
+        print(f"[RESUME] {label} 從 checkpoint 接續，已有 {len(users)} 筆", flush=True)
+    pbar = tqdm(total=total, initial=len(users), desc=label, unit="user")
 
     iterator = iter(it)
     retry = 0
-    while True:
-        try:
-            user = next(iterator)
-            users.append((user.username, (user.full_name or "")))
-            pbar.update(PROGRESS_STEP)
-            retry = 0
-        except StopIteration:
-            break
-        except exceptions.TooManyRequestsException:
-            pbar.set_postfix_str("rate-limited; sleeping…")
-            time.sleep(RATE_LIMIT_SLEEP)
-            continue
-        except exceptions.ConnectionException as e:
-            if retry < CONNECTION_MAX_RETRIES:
-                wait = min(60, 2 ** retry * 3)
-                pbar.set_postfix_str(f"conn err; retry in {wait}s")
-                time.sleep(wait)
-                retry += 1
-                continue
+    streak = 0
+    completed = False
+    try:
+        while True:
+            try:
+                user = next(iterator)
+                if user.username in users:
+                    continue  # checkpoint 接續時會重播最後一筆
+                if known is not None:
+                    if user.username in known:
+                        streak += 1
+                        if streak >= known_streak:
+                            pbar.set_postfix_str(f"{streak} known in a row; stop")
+                            break
+                        continue
+                    streak = 0
+                users.append(UserRecord(user.username, user.full_name or "",
+                                        user_id=getattr(user, "userid", 0) or 0))
+                pbar.update(PROGRESS_STEP)
+                retry = 0
+                if checkpoint and len(users) % CHECKPOINT_INTERVAL == 0:
+                    checkpoint.save(iterator)
+            except StopIteration:
+                break
+            except exceptions.ConnectionException as e:
+                if is_rate_limited(e):
+                    wait = rate_controller.cooldown() if rate_controller else 90
+                    pbar.set_postfix_str(f"rate-limited; sleeping {int(wait)}s…")
+                    if checkpoint:
+                        checkpoint.save(iterator)
+                    time.sleep(wait)
+                    continue
+                if retry < CONNECTION_MAX_RETRIES:
+                    wait = min(60, 2 ** retry * 3)
+                    pbar.set_postfix_str(f"conn err; retry in {wait}s")
+                    time.sleep(wait)
+                    retry += 1
+                    continue
+                else:
+                    raise RuntimeError(
+                        f"Reach max retries due to connection errors: {e}"
+                    ) from e
+        completed = True
+    finally:
+        pbar.close()
+        # 中斷（Ctrl+C、重試用盡、容器停止）時保留游標，完成時標記 complete
+        if checkpoint:
+            if completed:
+                checkpoint.finish()
             else:
-                pbar.close()
-                raise RuntimeError(
-                    f"Reach max retries due to connection errors: {e}"
-                ) from e
-        except Exception:
-            pbar.close()
-            raise
-
-    pbar.close()
+                checkpoint.save(iterator)
+
     return users
 
 
@@ -275,21 +342,198 @@ def write_csv(path: str, rows: Iterable[Tuple[str, str]]) -> None:
                 [username, full_name, f"https://instagram.com/{username}"])
 
 
-def build_ts_csv_path(data_dir: str, base: str, username: str) -> str:
-    """建立含帳號與時間戳的 CSV 路徑，放在 IGID_YYYYMMDDHHMMSS 資料夾中"""
-    ts = datetime.now().strftime("%Y%m%d%H%M%S")
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """解析命令列參數。"""
+    parser = argparse.ArgumentParser(description="IG Non-Followers（互動版 CLI）")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="只抓上次結果之後新增的使用者，並與上次名單合併")
+    parser.add_argument(
+        "--strategy", choices=(STRATEGY_AUTO, *STRATEGIES), default=STRATEGY_AUTO,
+        help="抓取策略：auto 依人數估算請求數選最便宜的（預設）；full 完整抓取；"
+             "incremental 增量；per_user 只抓 following 並逐一查詢是否回追")
+    parser.add_argument(
+        "--gate-ttl-hours", type=float, default=CHANGE_GATE_TTL_HOURS,
+        help=f"人數與最新快照相同且快照未超過此時數時不重新抓取"
+             f"（預設 {CHANGE_GATE_TTL_HOURS:g}，0 表示停用；只在 --strategy auto 時檢查）")
+    parser.add_argument(
+        "--gate-action", choices=GATE_ACTIONS, default=CHANGE_GATE_ACTION,
+        help=f"人數未變時的動作：reuse 沿用快照、incremental 只做增量開頭掃描（預設 {CHANGE_GATE_ACTION}）")
+    parser.add_argument(
+        "--known-streak", type=int, default=INCREMENTAL_KNOWN_STREAK,
+        help=f"增量模式下連續遇到幾位已知使用者即停止（預設 {INCREMENTAL_KNOWN_STREAK}）")
+    parser.add_argument(
+        "--large-threshold", type=int, default=LARGE_ACCOUNT_THRESHOLD,
+        help=f"追蹤者超過此數量時改用大帳號模式（預設 {LARGE_ACCOUNT_THRESHOLD}，0 表示停用）")
+    parser.add_argument(
+        "--sort-memory-mb", type=int, default=EXTERNAL_SORT_MB,
+        help=f"大帳號模式外部排序可使用的記憶體 MB（預設 {EXTERNAL_SORT_MB}）")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("import", help="將 data/ 中既有的結果資料夾匯入快照資料庫")
+    export = sub.add_parser("export", help="從快照資料庫匯出某次結果的四份 CSV")
+    export.add_argument("folder", help="結果名稱，例如 myid_20250101120000")
+    export.add_argument("--out", default=None, help="輸出資料夾（預設 data/<folder>/）")
+    diff = sub.add_parser("diff", help="比較兩次結果：新增 / 取消追蹤與回流的使用者")
+    diff.add_argument("from_folder", metavar="FROM", help="較早的結果名稱")
+    diff.add_argument("to_folder", metavar="TO", help="較新的結果名稱")
+    import_zip = sub.add_parser(
+        "import-zip", help="分析 Instagram「下載你的資訊」匯出的 ZIP 檔（JSON 格式）")
+    import_zip.add_argument("archive", help="匯出的 ZIP 檔路徑")
+    import_zip.add_argument("--igid", default=None, help="帳號名稱（預設由匯出檔讀取）")
+    watch = sub.add_parser(
+        "watchlist", help="只查詢指定帳號與你的追蹤關係（不抓完整名單）")
+    watch.add_argument("usernames", nargs="*", help="要檢查的帳號")
+    watch.add_argument("--file", default=None,
+                       help="帳號清單檔（每行一個，或第一欄為 username 的 CSV）")
+    watch.add_argument(
+        "--ttl-hours", type=float, default=WATCHLIST_TTL_HOURS,
+        help=f"此時間內查詢過的帳號直接使用快取（預設 {WATCHLIST_TTL_HOURS:g} 小時，0 表示不使用）")
+    args = parser.parse_args(argv)
+    # 與 Web 版相同：至少 1 位（負數會讓抓取規劃低估增量的請求數）
+    args.known_streak = max(1, args.known_streak)
+    return args
+
+
+def import_command(data_dir: str) -> None:
+    """匯入既有的 IGID_YYYYMMDDHHMMSS 資料夾到快照資料庫。"""
+    count = open_store(data_dir).import_folders(data_dir, force=True)
+    print(f"[OK] 已匯入 {count} 個結果資料夾", flush=True)
+
+
+def import_zip_command(data_dir: str, archive: str, igid: Optional[str]) -> None:
+    """分析 Instagram 匯出的 ZIP 檔，結果與線上抓取相同地寫入結果資料夾與快照資料庫。"""
+    try:
+        result = import_export(archive, data_dir, open_store(data_dir), igid)
+    except (zipfile.BadZipFile, ExportFormatError) as e:
+        print(f"[ERROR] 無法讀取匯出檔：{e}", flush=True)
+        sys.exit(1)
+    run_folder, counts = result["run"], result["counts"]
+    if not result["imported"]:
+        print(f"[INFO] 此匯出檔已匯入過：{run_folder}", flush=True)
+    print("\n=== 完成！===", flush=True)
+    print(f"結果：{run_folder}（來源：匯出檔，未呼叫 API）", flush=True)
+    print(f"following 總數：{counts['following']}", flush=True)
+    print(f"followers 總數：{counts['followers']}", flush=True)
+    print(f"你追但沒回追：{counts['following_only']}", flush=True)
+    print(f"他人追你但你沒回追：{counts['fans_only']}", flush=True)
+    print(f"（四份 CSV 可用 python main.py export {run_folder} 匯出）", flush=True)
+
+
+def load_watchlist(args: argparse.Namespace) -> List[str]:
+    """由命令列參數與 --file 取得要檢查的帳號（登入前先驗證，不合法時結束）。"""
+    names, rejected = parse_watchlist(" ".join(args.usernames))
+    if args.file:
+        try:
+            from_file, rejected_file = read_watchlist_file(args.file)
+        except OSError as e:
+            print(f"[ERROR] 無法讀取帳號清單：{e}", flush=True)
+            sys.exit(1)
+        names = list(dict.fromkeys(names + from_file))
+        rejected += rejected_file
+    for token in rejected:
+        print(f"[WARN] 略過不合法的帳號：{token}", flush=True)
+    if not names:
+        print("[ERROR] 沒有要檢查的帳號", flush=True)
+        sys.exit(1)
+    if len(names) > WATCHLIST_MAX:
+        print(f"[ERROR] 一次最多檢查 {WATCHLIST_MAX} 個帳號，更多時請執行完整分析", flush=True)
+        sys.exit(1)
+    return names
+
+
+def watchlist_command(context, viewer: str, data_dir: str, names: List[str],
+                      ttl_hours: float, rate_controller: AdaptiveRateController) -> None:
+    """逐一查詢帳號與登入者的關係，輸出 watchlist 報告 CSV。"""
+    cache = open_relationship_cache(data_dir)
+    rows = []
+    cached_count = 0
+    with tqdm(total=len(names), desc="watchlist", unit="user") as bar:
+        for batch, cached in resolve_watchlist(context, viewer, names, cache, ttl_hours,
+                                               cooldown=rate_controller.cooldown):
+            rows.extend(batch)
+            if cached:
+                cached_count = len(batch)
+                tqdm.write(f"[INFO] {cached_count} 個帳號使用 {ttl_hours:g} 小時內的查詢結果")
+            bar.update(len(batch))
+    # 報告依輸入順序排列
+    order = {name: i for i, name in enumerate(names)}
+    rows.sort(key=lambda r: order[r["username"]])
+    report = os.path.join(data_dir, write_report(data_dir, viewer, rows))
+    counts = summarize(rows)
 
-    # 建立以 IGID_YYYYMMDDHHMMSS 命名的資料夾
-    folder_name = f"{username}_{ts}"
-    result_dir = os.path.join(data_dir, folder_name)
-    os.makedirs(result_dir, exist_ok=True)
+    print("\n=== 完成！===", flush=True)
+    print(f"使用者：{viewer}", flush=True)
+    print(f"檢查帳號：{counts['total']}（實際查詢 {counts['total'] - cached_count}，"
+          f"快取 {cached_count}）", flush=True)
+    print(f"有追蹤你：{counts['follows_you']}", flush=True)
+    print(f"你追但沒回追：{counts['not_following_back']}", flush=True)
+    print(f"他人追你但你沒回追：{counts['fans_only']}", flush=True)
+    if counts["not_found"] or counts["errors"]:
+        print(f"查無帳號：{counts['not_found']}，查詢失敗：{counts['errors']}", flush=True)
+    print(f"報告 → {report}", flush=True)
+
+
+def export_command(data_dir: str, folder: str, out_dir: Optional[str]) -> None:
+    """從快照資料庫匯出某次結果的四份 CSV。"""
+    store = open_store(data_dir)
+    run = store.get_run(folder)
+    if run is None:
+        print(f"[ERROR] 快照資料庫中沒有 {folder}", flush=True)
+        sys.exit(1)
+    out_dir = out_dir or os.path.join(data_dir, folder)
+    os.makedirs(out_dir, exist_ok=True)
+    for file_key, list_key in EXPORT_FILES.items():
+        path = os.path.join(out_dir, f"{file_key}_{run['date']}.csv")
+        with open(path, "w", newline="", encoding="utf-8-sig", errors="replace") as f:
+            store.export_csv(folder, list_key, f)
+        print(f"{file_key} → {path}", flush=True)
+
+
+def fetch_incremental(
+    it: Iterable, label: str, previous: List[UserRecord], known_streak: int,
+    rate_controller: Optional[AdaptiveRateController] = None
+) -> UserSpill:
+    """增量抓取名單最前面的新使用者，並合併上一份名單（回傳暫存的 UserSpill）。"""
+    users = fetch_users_with_progress(
+        it, None, f"{label} (incremental)",
+        known={u.username for u in previous}, known_streak=known_streak,
+        rate_controller=rate_controller)
+    print(f"[INCREMENTAL] {label} 新增 {len(users)} 筆", flush=True)
+    # 新使用者（最新在前）之後接上一份名單；已存在的 username 會被略過，
+    # id 已出現在新名單的（改名的使用者）也略過，以免同一人出現兩次
+    fetched_ids = set(users.ids)
+    users.extend(u for u in previous if not (u.user_id and u.user_id in fetched_ids))
+    return users
 
-    # CSV 檔案名稱：base_YYYYMMDDHHMMSS.csv
-    filename = f"{base}_{ts}.csv"
-    return os.path.join(result_dir, filename)
 
+def diff_command(data_dir: str, from_folder: str, to_folder: str) -> None:
+    """印出兩次結果之間的差異。"""
+    store = open_store(data_dir)
+    try:
+        result = store.diff_runs(from_folder, to_folder)
+    except ValueError as e:
+        print(f"[ERROR] {e}", flush=True)
+        sys.exit(1)
+    if result is None:
+        print("[ERROR] 找不到指定的結果，可先執行 `python main.py import`", flush=True)
+        sys.exit(1)
 
-def main() -> None:
+    print(f"=== {from_folder} → {to_folder}"
+          f"{'（快取）' if result['cached'] else ''} ===", flush=True)
+    sections = (
+        ("新追蹤你的人", result["followers"]["gained"]),
+        ("取消追蹤你的人", result["followers"]["lost"]),
+        ("取消後又回來追蹤你的人", result["followers"]["returned"]),
+        ("你新追蹤的人", result["following"]["gained"]),
+        ("你取消追蹤的人", result["following"]["lost"]),
+    )
+    for title, users in sections:
+        print(f"\n{title}：{len(users)}", flush=True)
+        for user in users:
+            print(f"  @{user['username']}  {user['full_name']}", flush=True)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
     """
     Main entry point for the Instagram follower analysis tool.
     This function performs the following operations:
@@ -311,67 +555,200 @@ def main() -> None:
          This function requires an authenticated Instagram session managed by ensure_session().
          All CSV outputs are saved to the data directory associated with the session.
     """
-    loader = Instaloader()
+    args = parse_args(argv)
+    if args.command == "import":
+        import_command(resolve_data_dir())
+        return
+    if args.command == "export":
+        export_command(resolve_data_dir(), args.folder, args.out)
+        return
+    if args.command == "diff":
+        diff_command(resolve_data_dir(), args.from_folder, args.to_folder)
+        return
+    if args.command == "import-zip":
+        import_zip_command(resolve_data_dir(), args.archive, args.igid)
+        return
+    watch_names = load_watchlist(args) if args.command == "watchlist" else None
+
+    # 自適應速率控制；決策訊息經 tqdm.write 輸出，不打斷進度條
+    # 與 Web 版共用 DATA_DIR 的請求紀錄，同時執行時合計請求數
+    rate_ctl = AdaptiveRateController(log=tqdm.write, ledger=open_ledger(resolve_data_dir()))
+    loader = Instaloader(rate_controller=rate_ctl.attach)
     loader.context.sleep = True
     loader.context.request_timeout = 90
 
     username, data_dir = ensure_session(loader)
+    rate_ctl.load(rate_state_path(data_dir, username))
+    if watch_names:
+        watchlist_command(loader.context, username, data_dir, watch_names, args.ttl_hours, rate_ctl)
+        return
     profile = Profile.from_username(loader.context, username)
 
     total_following = getattr(profile, "followees", None)
     total_followers = getattr(profile, "followers", None)
 
+    # 抓取規劃：依兩份名單的人數估算各策略的請求數，選最便宜的（或依 --strategy 指定）
+    store = open_store(data_dir)
+    store.import_folders(data_dir)
+    baseline = snapshot_baseline(store.list_runs(username))
+    strategy = parse_strategy(args.strategy, args.incremental)
+
+    # 變化檢查（只在自動模式）：人數與最新快照相同且快照夠新 → 沿用快照或只做增量開頭掃描
+    strategy_reason = "依參數指定"
+    if strategy == STRATEGY_AUTO:
+        latest = baseline["latest"]
+        gate, reason = change_gate(total_following, total_followers, latest,
+                                   args.gate_ttl_hours, args.gate_action)
+        print(f"[GATE] {reason}", flush=True)
+        if gate == GATE_REUSE:
+            counts = latest["counts"]
+            print("\n=== 完成！（人數未變，未重新抓取）===", flush=True)
+            print(f"結果：{latest['folder']}（沿用快照；--strategy full 可強制重新抓取）", flush=True)
+            print(f"following 總數：{counts['following']}", flush=True)
+            print(f"followers 總數：{counts['followers']}", flush=True)
+            print(f"你追但沒回追：{counts['following_only']}", flush=True)
+            print(f"他人追你但你沒回追：{counts['fans_only']}", flush=True)
+            print(f"（四份 CSV 可用 python main.py export {latest['folder']} 匯出）", flush=True)
+            return
+        if gate == GATE_INCREMENTAL:
+            print("[GATE] 只做增量的開頭掃描", flush=True)
+            strategy = STRATEGY_INCREMENTAL
+            strategy_reason = "人數未變，只做開頭掃描"
+
+    plan = plan_fetch(
+        total_following, total_followers, rate_ctl.interval, baseline,
+        known_streak=args.known_streak,
+        cached_followees=open_relationship_cache(data_dir).count_following(
+            username, WATCHLIST_TTL_HOURS),
+        override=strategy, override_reason=strategy_reason)
+    for line in plan.describe():
+        print(f"[PLAN] {line}", flush=True)
+    if plan.strategy == STRATEGY_PER_USER:
+        print("[1/2] 取得 following（你追的人）…", flush=True)
+        following_users = fetch_users_with_progress(
+            profile.get_followees(), total_following, "following", rate_controller=rate_ctl)
+        try:
+            names = [u.username for u in following_users]
+        finally:
+            following_users.remove()
+        print("[2/2] 逐一查詢追蹤中的帳號是否回追…", flush=True)
+        watchlist_command(loader.context, username, data_dir, names, WATCHLIST_TTL_HOURS, rate_ctl)
+        return
+    incremental = plan.strategy == STRATEGY_INCREMENTAL
+
+    # 大帳號模式：spill 只記住最近的使用者，分類改以外部排序合併（增量模式不套用）
+    large = not incremental and is_large_account(total_followers, args.large_threshold)
+    key_window = RECENT_KEYS if large else None
+    if large:
+        print(f"[LARGE] 追蹤者 {total_followers} 人超過 {args.large_threshold}，"
+              f"名單以外部排序比對（記憶體上限約 {args.sort_memory_mb} MB）", flush=True)
+    following_ckpt = FetchCheckpoint(data_dir, username, "following", key_window)
+    followers_ckpt = FetchCheckpoint(data_dir, username, "followers", key_window)
+
+    prev_folder = None
+    prev_data = None
+    if incremental:
+        prev_folder = store.latest_run(username)
+        prev_data = store.load_run(prev_folder["folder"]) if prev_folder else None
+        if prev_data:
+            print(f"[INCREMENTAL] 以 {prev_folder['folder']} 為基準，"
+                  f"連續 {args.known_streak} 位已知使用者即停止", flush=True)
+        else:
+            print("[INCREMENTAL] 找不到上次結果，改為完整抓取", flush=True)
+
     print("[1/4] 取得 following（你追的人）…", flush=True)
-    following_users = fetch_users_with_progress(
-        profile.get_followees(), total_following, "following")
+    if prev_data:
+        following_users = fetch_incremental(
+            profile.get_followees(), "following", prev_data["following"], args.known_streak,
+            rate_controller=rate_ctl)
+    else:
+        following_iter = following_ckpt.resume_iterator(loader.context)
+        if following_iter is None:
+            following_iter = profile.get_followees()
+        following_users = fetch_users_with_progress(
+            following_iter, total_following, "following", checkpoint=following_ckpt,
+            rate_controller=rate_ctl)
 
     print("[2/4] 取得 followers（追你的人）…", flush=True)
-    followers_users = fetch_users_with_progress(
-        profile.get_followers(), total_followers, "followers")
+    if prev_data:
+        followers_users = fetch_incremental(
+            profile.get_followers(), "followers", prev_data["followers"], args.known_streak,
+            rate_controller=rate_ctl)
+    else:
+        followers_iter = followers_ckpt.resume_iterator(loader.context)
+        if followers_iter is None:
+            followers_iter = profile.get_followers()
+        followers_users = fetch_users_with_progress(
+            followers_iter, total_followers, "followers", checkpoint=followers_ckpt,
+            rate_controller=rate_ctl)
+
+    if prev_data:
+        # 增量合併看不到取消追蹤，總數不符時提醒改跑完整分析
+        for label, merged, expected in (("following", following_users, total_following),
+                                        ("followers", followers_users, total_followers)):
+            if expected is not None and len(merged) != expected:
+                print(f"[INCREMENTAL] {label} 合併後 {len(merged)} 筆，與帳號顯示的 "
+                      f"{expected} 筆不符（可能有人取消追蹤），建議定期執行完整分析", flush=True)
 
     print("[3/4] 計算集合差集…", flush=True)
-    following_usernames: Set[str] = {u for u, _ in following_users}
-    followers_usernames: Set[str] = {u for u, _ in followers_users}
-
-    # 你追但對方沒回追
-    non_followers = [(u, n)
-                     for (u, n) in following_users if u not in followers_usernames]
-    # 對方追你但你沒回追
-    fans_you_dont_follow = [(u, n) for (
-        u, n) in followers_users if u not in following_usernames]
+    # 以兩份名單的 user id 陣列分類（舊資料沒有 id 時以 username；大帳號模式以外部排序），
+    # 差集名單由 spill 檔串流產生
+    # 你追但對方沒回追 / 對方追你但你沒回追
+    if large:
+        nf_mask, fnf_mask = external_classify(
+            following_users, followers_users, spill_dir(data_dir), args.sort_memory_mb)
+    else:
+        nf_mask, fnf_mask = idsets.classify(following_users, followers_users)
+    non_followers = idsets.count(nf_mask)
+    fans_you_dont_follow = idsets.count(fnf_mask)
 
     # 原固定檔名（相容）
     nf_path = os.path.join(data_dir, OUTPUT_NON_FOLLOWERS)
     fnf_path = os.path.join(data_dir, OUTPUT_FANS_NOT_FOLLOWED)
 
     print("[4/4] 輸出 CSV…", flush=True)
-    write_csv(nf_path, non_followers)
-    write_csv(fnf_path, fans_you_dont_follow)
-
-    # 另外輸出四份含帳號與時間戳的 CSV
-    following_ts_path = build_ts_csv_path(
-        data_dir, "following_users", username)
-    followers_ts_path = build_ts_csv_path(
-        data_dir, "followers_users", username)
-    nf_ts_path = build_ts_csv_path(data_dir, "non_followers", username)
-    fy_ts_path = build_ts_csv_path(data_dir, "fans_you_dont_follow", username)
-
-    write_csv(following_ts_path, following_users)
-    write_csv(followers_ts_path, followers_users)
-    write_csv(nf_ts_path, non_followers)
-    write_csv(fy_ts_path, fans_you_dont_follow)
+    write_csv(nf_path, idsets.select(following_users.pairs(), nf_mask))
+    write_csv(fnf_path, idsets.select(followers_users.pairs(), fnf_mask))
+
+    # 結果資料夾只保存兩份基本名單與摘要（差集名單可用 export 指令匯出）；
+    # 同一個時間戳寫入暫存資料夾後一次 rename 到 IGID_YYYYMMDDHHMMSS
+    with RunWriter(data_dir, username) as writer:
+        following_ts_path = writer.write_users("following_users", following_users.pairs())
+        followers_ts_path = writer.write_users("followers_users", followers_users.pairs())
+        summary_path = writer.write_summary({
+            "following": len(following_users),
+            "followers": len(followers_users),
+            "following_only": non_followers,
+            "fans_only": fans_you_dont_follow,
+        })
+        run_folder = writer.commit()
+    following_ts_path, followers_ts_path, summary_path = (
+        os.path.join(data_dir, p) for p in (following_ts_path, followers_ts_path, summary_path))
+
+    # 寫入快照資料庫
+    store.save_run(
+        username, writer.taken_at,
+        following_users, followers_users,
+        source="incremental" if prev_data else "fetch")
+
+    # 結果已落地，刪除 checkpoint 與增量模式的暫存 spill 檔
+    for users in (following_users, followers_users):
+        if users.temporary:
+            users.remove()
+    following_ckpt.clear()
+    followers_ckpt.clear()
 
     print("\n=== 完成！===", flush=True)
     print(f"使用者：{username}", flush=True)
-    print(f"following 總數：{len(following_usernames)}", flush=True)
-    print(f"followers 總數：{len(followers_usernames)}", flush=True)
-    print(f"你追但沒回追：{len(non_followers)} → {nf_path}", flush=True)
-    print(f"他人追你但你沒回追：{len(fans_you_dont_follow)} → {fnf_path}", flush=True)
-    print("— 另已輸出含帳號與時間戳的四份 CSV：", flush=True)
+    print(f"following 總數：{len(following_users)}", flush=True)
+    print(f"followers 總數：{len(followers_users)}", flush=True)
+    print(f"你追但沒回追：{non_followers} → {nf_path}", flush=True)
+    print(f"他人追你但你沒回追：{fans_you_dont_follow} → {fnf_path}", flush=True)
+    print("— 另已輸出含帳號與時間戳的基本名單與摘要：", flush=True)
     print(f"following_users → {following_ts_path}", flush=True)
     print(f"followers_users → {followers_ts_path}", flush=True)
-    print(f"non_followers → {nf_ts_path}", flush=True)
-    print(f"fans_you_dont_follow → {fy_ts_path}", flush=True)
+    print(f"summary → {summary_path}", flush=True)
+    print(f"（四份 CSV 可用 python main.py export {run_folder} 匯出）", flush=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cost-based fetch planner: pick the cheapest way to refresh an account's lists.
+
+抓取前依個人檔案上的 followees / followers 人數估算各策略需要的請求數：
+- full：完整分頁抓取兩份名單（instaloader 每頁 PAGE_SIZE 人）
+- incremental：以最新快照為基準，只抓兩份名單最前面新增的部分（加上連續已知使用者的停止長度）
+- per_user：只抓 following 名單，再逐一查詢每位追蹤中的帳號是否回追（watchlist 的查詢與快取）；
+  不會取得完整的 followers 名單，也不寫入快照，結果為 watchlist 報告
+
+自動模式選請求數最少的策略，並以目前的請求間隔估算耗時；也可用參數直接指定策略。
+增量看不到取消追蹤，因此人數減少或距離上次完整抓取太久時不會自動選增量。
+
+規劃之前先經過變化檢查（change_gate）：兩份名單的人數與最新快照相同、且快照未超過
+CHANGE_GATE_TTL_HOURS 時，通常沒有新資訊，依 CHANGE_GATE_ACTION 直接沿用快照（reuse）
+或只做增量的開頭掃描（incremental）。只在自動模式下檢查，指定策略時照常抓取。
+"""
+from __future__ import annotations
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+STRATEGY_AUTO = "auto"
+STRATEGY_FULL = "full"
+STRATEGY_INCREMENTAL = "incremental"
+STRATEGY_PER_USER = "per_user"
+STRATEGIES = (STRATEGY_FULL, STRATEGY_INCREMENTAL, STRATEGY_PER_USER)
+STRATEGY_LABELS = {
+    STRATEGY_FULL: "完整抓取",
+    STRATEGY_INCREMENTAL: "增量更新",
+    STRATEGY_PER_USER: "逐一查詢追蹤中的帳號",
+}
+
+# instaloader NodeIterator 的 GraphQL 分頁大小（每次請求的使用者數）
+PAGE_SIZE = 12
+# 距離上次完整抓取超過此天數時，自動模式不選增量，可用環境變數調整
+PLANNER_FULL_EVERY_DAYS = float(os.environ.get("PLANNER_FULL_EVERY_DAYS", "7"))
+# 變化檢查：人數未變且快照未超過此時數（小時）時不重新完整抓取（0 表示停用）
+CHANGE_GATE_TTL_HOURS = float(os.environ.get("CHANGE_GATE_TTL_HOURS", "24"))
+# 變化檢查通過時的動作：reuse 沿用快照、incremental 只做增量的開頭掃描
+GATE_REUSE = "reuse"
+GATE_INCREMENTAL = "incremental"
+GATE_PROCEED = "proceed"
+GATE_ACTIONS = (GATE_REUSE, GATE_INCREMENTAL)
+CHANGE_GATE_ACTION = os.environ.get("CHANGE_GATE_ACTION", GATE_REUSE)
+if CHANGE_GATE_ACTION not in GATE_ACTIONS:
+    CHANGE_GATE_ACTION = GATE_REUSE
+# per_user 只產生部分結果（沒有 followers 名單與快照），請求數需低於其他策略的此比例才自動選用
+PER_USER_MARGIN = 0.5
+
+
+def parse_strategy(raw: Optional[str], incremental: bool = False) -> Optional[str]:
+    """抓取策略參數；舊的 incremental 選項視為指定增量。不合法時回傳 None。"""
+    strategy = (raw or STRATEGY_AUTO).strip().lower()
+    if strategy not in (STRATEGY_AUTO, *STRATEGIES):
+        return None
+    if strategy == STRATEGY_AUTO and incremental:
+        return STRATEGY_INCREMENTAL
+    return strategy
+
+
+def pages(count: int) -> int:
+    """分頁抓取 count 位使用者需要的請求數。"""
+    return -(-max(0, count) // PAGE_SIZE)
+
+
+def format_duration(seconds: float) -> str:
+    """把預估秒數轉成「約 X 小時 Y 分」。"""
+    minutes = int(round(seconds / 60))
+    if minutes < 1:
+        return "不到 1 分鐘"
+    hours, minutes = divmod(minutes, 60)
+    if not hours:
+        return f"約 {minutes} 分鐘"
+    return f"約 {hours} 小時 {minutes} 分鐘" if minutes else f"約 {hours} 小時"
+
+
+def snapshot_baseline(runs: List[Dict]) -> Dict[str, Optional[Dict]]:
+    """
+    由同帳號的 run 清單（最新在前，SnapshotStore.list_runs 的格式）
+    取得 {"latest": 最新的 run, "last_full": 最新的非增量 run}。
+    """
+    latest = runs[0] if runs else None
+    last_full = next((run for run in runs if run.get("source") != "incremental"), None)
+    return {"latest": latest, "last_full": last_full}
+
+
+def _run_age_days(run: Dict, now: datetime) -> float:
+    return (now - datetime.strptime(run["date"], "%Y%m%d%H%M%S")).total_seconds() / 86400
+
+
+def change_gate(followees: Optional[int], followers: Optional[int],
+                latest: Optional[Dict], ttl_hours: float = CHANGE_GATE_TTL_HOURS,
+                action: str = CHANGE_GATE_ACTION,
+                now: Optional[datetime] = None) -> Tuple[str, str]:
+    """
+    比較個人檔案的人數與最新快照的摘要，決定是否需要重新抓取。
+
+    Args:
+        followees: Following count shown on the profile.
+        followers: Follower count shown on the profile.
+        latest: Latest run of the account (``snapshot_baseline(...)["latest"]``).
+        ttl_hours: Maximum snapshot age for a skip; 0 disables the gate.
+        action: GATE_REUSE or GATE_INCREMENTAL, returned when nothing changed.
+        now: Current time (for the snapshot age).
+
+    Returns:
+        (GATE_PROCEED / GATE_REUSE / GATE_INCREMENTAL, reason for the log)
+    """
+    if ttl_hours <= 0:
+        return GATE_PROCEED, "變化檢查已停用"
+    if latest is None:
+        return GATE_PROCEED, "沒有上次結果"
+    if followees is None or followers is None:
+        return GATE_PROCEED, "無法取得目前的人數"
+    prev = latest["counts"]
+    if (int(followees), int(followers)) != (prev["following"], prev["followers"]):
+        return GATE_PROCEED, (f"人數有變化（追蹤中 {prev['following']} → {followees}，"
+                              f"追蹤者 {prev['followers']} → {followers}）")
+    age_hours = _run_age_days(latest, now or datetime.now()) * 24
+    if age_hours > ttl_hours:
+        return GATE_PROCEED, (f"人數與 {latest['folder']} 相同，但快照已超過 {ttl_hours:g} 小時"
+                              f"（{age_hours:.1f} 小時）")
+    reason = (f"人數與 {latest['folder']} 相同（追蹤中 {followees}，追蹤者 {followers}），"
+              f"且快照在 {ttl_hours:g} 小時內（{age_hours:.1f} 小時前）")
+    return action, reason
+
+
+class FetchPlan:
+    """
+    The chosen strategy and the estimated request count of every strategy.
+
+    Args:
+        strategy: Chosen strategy (one of STRATEGIES).
+        costs: Estimated requests per strategy; None when the strategy is not applicable.
+        unavailable: Per strategy, why it was not considered (or its caveat).
+        interval: Seconds per request used for the duration estimate.
+        reason: Why the strategy was chosen.
+    """
+
+    __slots__ = ("strategy", "costs", "unavailable", "interval", "reason")
+
+    def __init__(self, strategy: str, costs: Dict[str, Optional[int]],
+                 unavailable: Dict[str, str], interval: float, reason: str):
+        self.strategy = strategy
+        self.costs = costs
+        self.unavailable = unavailable
+        self.interval = interval
+        self.reason = reason
+
+    @property
+    def requests(self) -> int:
+        """所選策略的預估請求數。"""
+        return self.costs[self.strategy] or 0
+
+    @property
+    def seconds(self) -> float:
+        """所選策略的預估耗時（秒）。"""
+        return self.requests * self.interval
+
+    def describe(self) -> List[str]:
+        """各策略的估算與選擇結果（每行一則日誌）。"""
+        lines = []
+        for strategy in STRATEGIES:
+            label = STRATEGY_LABELS[strategy]
+            cost = self.costs.get(strategy)
+            if cost is None:
+                lines.append(f"{label}：不適用（{self.unavailable.get(strategy, '')}）")
+                continue
+            note = f"；{self.unavailable[strategy]}" if strategy in self.unavailable else ""
+            lines.append(f"{label}：約 {cost} 次請求（{format_duration(cost * self.interval)}）{note}")
+        lines.append(f"選擇{STRATEGY_LABELS[self.strategy]}（{self.reason}），"
+                     f"預估 {self.requests} 次請求，{format_duration(self.seconds)}"
+                     f"（每次請求間隔 {self.interval:.1f}s）")
+        return lines
+
+
+def plan_fetch(followees: Optional[int], followers: Optional[int], interval: float,
+               baseline: Optional[Dict[str, Optional[Dict]]] = None,
+               known_streak: int = 0, cached_followees: int = 0,
+               override: str = STRATEGY_AUTO, override_reason: str = "依參數指定",
+               now: Optional[datetime] = None) -> FetchPlan:
+    """
+    估算各策略的請求數並選擇策略。
+
+    Args:
+        followees: Following count shown on the profile.
+        followers: Follower count shown on the profile.
+        interval: Current seconds between requests (rate controller interval).
+        baseline: Result of :func:`snapshot_baseline` for the account.
+        known_streak: Run of known users that ends an incremental fetch.
+        cached_followees: Accounts the viewer follows whose relationship is still
+            in the watchlist cache (no request needed in per_user).
+        override: STRATEGY_AUTO, or a strategy to use regardless of cost.
+        override_reason: Logged reason when ``override`` is used.
+        now: Current time (for the snapshot age).
+    """
+    followees, followers = int(followees or 0), int(followers or 0)
+    now = now or datetime.now()
+    baseline = baseline or {}
+    latest, last_full = baseline.get("latest"), baseline.get("last_full")
+
+    costs: Dict[str, Optional[int]] = {
+        STRATEGY_FULL: pages(followees) + pages(followers),
+        STRATEGY_INCREMENTAL: None,
+        STRATEGY_PER_USER: pages(followees) + max(0, followees - cached_followees),
+    }
+    unavailable: Dict[str, str] = {
+        STRATEGY_PER_USER: "不產生 followers 名單與快照",
+    }
+    if latest is None:
+        unavailable[STRATEGY_INCREMENTAL] = "沒有上次結果"
+    else:
+        prev = latest["counts"]
+        # 每份名單至少一頁，加上停止所需的連續已知使用者
+        costs[STRATEGY_INCREMENTAL] = sum(
+            max(1, pages(max(0, now_count - prev[kind]) + known_streak))
+            for kind, now_count in (("following", followees), ("followers", followers)))
+        if followees < prev["following"] or followers < prev["followers"]:
+            unavailable[STRATEGY_INCREMENTAL] = "人數比上次少，增量看不到取消追蹤"
+        elif last_full is None or _run_age_days(last_full, now) > PLANNER_FULL_EVERY_DAYS:
+            unavailable[STRATEGY_INCREMENTAL] = \
+                f"距離上次完整抓取超過 {PLANNER_FULL_EVERY_DAYS:g} 天"
+
+    if override != STRATEGY_AUTO:
+        if costs.get(override) is None:
+            return FetchPlan(STRATEGY_FULL, costs, unavailable, interval,
+                             f"指定的{STRATEGY_LABELS.get(override, override)}不適用")
+        return FetchPlan(override, costs, unavailable, interval, override_reason)
+
+    # 自動：在可完整更新名單的策略中選請求數最少的；per_user 需明顯更便宜才選
+    strategy, reason = STRATEGY_FULL, "請求數最少"
+    incremental_cost = costs[STRATEGY_INCREMENTAL]
+    if incremental_cost is not None and incremental_cost < costs[STRATEGY_FULL]:
+        if STRATEGY_INCREMENTAL in unavailable:
+            reason = f"增量不適用：{unavailable[STRATEGY_INCREMENTAL]}"
+        else:
+            strategy = STRATEGY_INCREMENTAL
+    if costs[STRATEGY_PER_USER] < costs[strategy] * PER_USER_MARGIN:
+        strategy, reason = STRATEGY_PER_USER, "請求數最少"
+    return FetchPlan(strategy, costs, unavailable, interval, reason)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared request pacing for instaloader.
+
+同一個 Instaloader context 可能同時被多個執行緒使用（例如同時抓 following 與 followers）。
+instaloader 內建的 RateController 並非執行緒安全，各執行緒各自 sleep 會讓實際請求速率倍增；
+這裡的 PacedRateController 以一把鎖序列化「等待 → 記錄時間」，
+保證所有執行緒合計仍維持原本「每次請求至少間隔 N 秒」的速率，
+同時讓一個請求的網路往返與另一個請求的等待時間重疊。
+
+AdaptiveRateController 在此之上以 AIMD（加法增、乘法減）調整請求間隔：
+連續成功一段時間就小幅提高速率，收到 429 就把速率減半。
+加速不會低於原本的保守下限（ADAPTIVE_MIN_INTERVAL，預設即 MIN_INTERVAL_DEFAULT），
+也就是只會從 429 後的減速恢復，不會比原本的固定間隔更快。
+每個帳號最後確認安全的間隔會存到 DATA_DIR/rate-<account>.json，
+下次執行直接從該值開始，而不是每次都從最保守的間隔慢慢來。
+
+若提供 RequestLedger（rate_ledger.py），sliding window 的請求數改為所有執行、
+所有 worker process 合計，429 的暫停也會套用到其他執行。
+"""
+from __future__ import annotations
+import os
+import json
+import time
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, List, Optional
+
+from instaloader import RateController, exceptions
+
+from rate_ledger import RequestLedger
+
+# 原 custom_query_waittime 的保守下限（秒）：iPhone API 10 秒，其他查詢 8 秒
+MIN_INTERVAL_IPHONE = 10.0
+MIN_INTERVAL_DEFAULT = 8.0
+
+# AIMD 參數：間隔的上下限、每多少次成功請求加速一次、每次增加的速率、429 時的速率倍數
+# 下限預設為上面的保守下限（iPhone API 依 10:8 換算為 10 秒），可用環境變數調整
+ADAPTIVE_MIN_INTERVAL = float(os.environ.get("ADAPTIVE_MIN_INTERVAL", str(MIN_INTERVAL_DEFAULT)))
+ADAPTIVE_MAX_INTERVAL = 60.0
+ADAPTIVE_PROBE_EVERY = 25
+ADAPTIVE_RATE_STEP = 0.01  # 請求 / 秒
+ADAPTIVE_DECREASE = 0.5
+
+# 名單迭代拋出 429 時（instaloader 已重試失敗）的冷卻時間：約 N 個請求間隔，並限制上下限
+COOLDOWN_REQUESTS = 15
+COOLDOWN_MIN = 60.0
+COOLDOWN_MAX = 300.0
+
+
+class PacedRateController(RateController):
+    """
+    Thread-safe rate controller enforcing a minimum interval between request starts.
+
+    The interval is shared by every thread using the same context, on top of
+    instaloader's own sliding-window limits. 429 handling also holds the lock,
+    so a rate-limit pause stops all workers at once.
+
+    With a ``ledger`` the sliding-window limits are enforced over the requests of
+    every run sharing the ledger, and a 429 pauses all of them.
+    """
+
+    def __init__(self, context, ledger: Optional[RequestLedger] = None):
+        super().__init__(context)
+        self.ledger = ledger
+        self._lock = threading.Lock()
+        self._last_request = 0.0
+
+    def min_interval(self, query_type: str) -> float:
+        """兩次請求開始之間的最短間隔。"""
+        return MIN_INTERVAL_IPHONE if query_type == 'iphone' else MIN_INTERVAL_DEFAULT
+
+    def wait_before_query(self, query_type: str) -> None:
+        with self._lock:
+            now = time.monotonic()
+            waittime = max(
+                self.query_waittime(query_type, now, False),
+                self._last_request + self.min_interval(query_type) - now,
+            )
+            if self.ledger:
+                # 在共用紀錄中預約時段：其他執行的請求也計入 sliding window
+                slot = self.ledger.reserve(query_type, time.time() + waittime)
+                waittime = slot - time.time()
+            if waittime > 0:
+                self.sleep(waittime)
+            stamp = time.monotonic()
+            self._query_timestamps.setdefault(query_type, []).append(stamp)
+            self._last_request = stamp
+
+    def handle_429(self, query_type: str) -> None:
+        with self._lock:
+            if self.ledger:
+                # 與 instaloader 相同的等待時間，同步給共用紀錄的其他執行
+                self.ledger.hold(self.query_waittime(query_type, time.monotonic(), True))
+            super().handle_429(query_type)
+            self._last_request = time.monotonic()
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """例外本身或其成因是否為 429（instaloader 重試用盡時會包成 ConnectionException）。"""
+    while exc is not None:
+        if isinstance(exc, exceptions.TooManyRequestsException):
+            return True
+        exc = exc.__cause__
+    return False
+
+
+def rate_state_path(data_dir: str, account: str) -> str:
+    """每個帳號的速率狀態檔，與 session-<account> 放在一起。"""
+    return os.path.join(data_dir, f"rate-{account}.json")
+
+
+class AdaptiveRateController(PacedRateController):
+    """
+    Paced rate controller whose interval is tuned with AIMD and persisted per account.
+
+    After ``ADAPTIVE_PROBE_EVERY`` requests without a 429 the current interval is
+    recorded as known-good and the request rate is raised by ``ADAPTIVE_RATE_STEP``;
+    a 429 multiplies the rate by ``ADAPTIVE_DECREASE``. The known-good interval is
+    written to ``state_path`` so the next run starts from it.
+
+    The controller is created before the Instaloader instance so callers keep a
+    handle on it; pass :meth:`attach` as ``Instaloader(rate_controller=...)``.
+    When the account is only known after login (CLI), call :meth:`load` then.
+
+    Args:
+        state_path: JSON file holding the learned interval (see :func:`rate_state_path`).
+        log: Callback for decision messages; defaults to printing to stdout.
+            Messages are also kept in ``events`` for callers that relay them.
+        ledger: Optional shared request ledger (see :class:`PacedRateController`).
+    """
+
+    def __init__(self, state_path: Optional[str] = None,
+                 log: Optional[Callable[[str], None]] = None,
+                 ledger: Optional[RequestLedger] = None):
+        super().__init__(None, ledger)
+        self.state_path = state_path
+        self._log = log
+        self.events: Deque[str] = deque(maxlen=100)
+        self.good_interval = MIN_INTERVAL_DEFAULT
+        self.interval = MIN_INTERVAL_DEFAULT
+        self._successes = 0
+        self._streak_429 = 0
+        if state_path:
+            self.load(state_path)
+
+    def attach(self, context) -> "AdaptiveRateController":
+        """Instaloader 的 rate_controller 工廠：綁定 context 後回傳自己。"""
+        self._context = context
+        return self
+
+    def load(self, state_path: str) -> None:
+        """改用指定帳號的速率狀態檔，並從其中記錄的安全間隔開始。"""
+        with self._lock:
+            self.state_path = state_path
+            interval = None
+            try:
+                with open(state_path, "r", encoding="utf-8") as f:
+                    interval = float(json.load(f)["interval"])
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+            if interval is None:
+                self._emit(f"[RATE] 起始請求間隔 {self.interval:.1f}s")
+                return
+            self.interval = min(ADAPTIVE_MAX_INTERVAL, max(ADAPTIVE_MIN_INTERVAL, interval))
+            self.good_interval = self.interval
+            self._successes = 0
+            self._emit(f"[RATE] 起始請求間隔 {self.interval:.1f}s（上次確認安全的速率）")
+
+    def _save(self) -> None:
+        if not self.state_path:
+            return
+        state = {
+            "interval": round(self.good_interval, 3),
+            "saved_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        tmp = self.state_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.state_path)
+        except OSError as e:
+            print(f"[WARN] 無法寫入速率狀態 {self.state_path}：{e}", flush=True)
+
+    def _emit(self, msg: str) -> None:
+        self.events.append(msg)
+        if self._log:
+            self._log(msg)
+        else:
+            print(msg, flush=True)
+
+    def pop_events(self) -> List[str]:
+        """取出尚未轉送的決策訊息（Web 版用來送到 SSE 日誌）。"""
+        out = []
+        while True:
+            try:
+                out.append(self.events.popleft())
+            except IndexError:
+                return out
+
+    def min_interval(self, query_type: str) -> float:
+        # iPhone API 維持原本 10:8 的相對保守程度
+        scale = MIN_INTERVAL_IPHONE / MIN_INTERVAL_DEFAULT if query_type == 'iphone' else 1.0
+        return self.interval * scale
+
+    def wait_before_query(self, query_type: str) -> None:
+        super().wait_before_query(query_type)
+        with self._lock:
+            self._successes += 1
+            if self._successes < ADAPTIVE_PROBE_EVERY:
+                return
+            # 目前間隔已撐過一輪 → 記為安全值，並小幅加速試探
+            self._successes = 0
+            self._streak_429 = 0
+            self.good_interval = self.interval
+            faster = 1.0 / (1.0 / self.interval + ADAPTIVE_RATE_STEP)
+            faster = max(ADAPTIVE_MIN_INTERVAL, faster)
+            if faster < self.interval:
+                self._emit(f"[RATE] 連續 {ADAPTIVE_PROBE_EVERY} 次請求未受限，"
+                           f"間隔 {self.interval:.1f}s → {faster:.1f}s")
+                self.interval = faster
+            self._save()
+
+    def handle_429(self, query_type: str) -> None:
+        with self._lock:
+            slower = min(ADAPTIVE_MAX_INTERVAL, self.interval / ADAPTIVE_DECREASE)
+            self._emit(f"[RATE] 收到 429，間隔 {self.interval:.1f}s → {slower:.1f}s")
+            # 原本「安全」的間隔也被限制了 → 改以減速後的間隔作為新的安全值
+            if self.good_interval <= self.interval:
+                self.good_interval = slower
+            self.interval = slower
+            self._successes = 0
+            self._streak_429 += 1
+            self._save()
+        super().handle_429(query_type)
+
+    def cooldown(self) -> float:
+        """名單迭代因 429 中斷時，重試前應等待的秒數（隨連續 429 次數加倍）。"""
+        with self._lock:
+            secs = self.interval * COOLDOWN_REQUESTS * (2 ** max(0, self._streak_429 - 1))
+        return min(COOLDOWN_MAX, max(COOLDOWN_MIN, secs))
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Process-wide request ledger shared by every loader context (DATA_DIR/rate_ledger.db).
+
+每個 /stream 都會建立自己的 Instaloader，instaloader 的 RateController 只看得到自己的請求；
+多個分析同時執行（gunicorn 的多個 thread 或多個 worker、再加上 CLI）時，
+合計的請求數會超過 Instagram 的容許量，結果所有執行一起收到 429。
+
+這裡以 SQLite 記錄所有請求的時間，每次請求前在 BEGIN IMMEDIATE transaction 中
+（跨 process 的寫入鎖）依 instaloader 同樣的 sliding window 計算最早可發送的時間，
+並先寫入該時間作為預約，讓其他執行排在後面。收到 429 時寫入全域暫停時間，
+所有執行都會等到暫停結束。
+
+資料表：
+- requests(ts, query_type)：已發送或已預約的請求（ts 為 Unix 時間，可能在未來）
+- holds(id, until)：429 後的全域暫停
+"""
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List
+
+LEDGER_FILENAME = "rate_ledger.db"
+
+# 與 instaloader RateController.query_waittime 相同的 sliding window（秒）與上限
+PER_TYPE_WINDOW = 660
+PER_TYPE_LIMIT = 200
+PER_TYPE_LIMIT_OTHER = 75
+GRAPHQL_WINDOW = 600
+GRAPHQL_LIMIT = 275
+IPHONE_WINDOW = 1800
+IPHONE_LIMIT = 199
+
+# 超過最大 window 的紀錄即可刪除
+LEDGER_RETENTION = 3600
+
+_UNTYPED = ("iphone", "other")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    ts          REAL NOT NULL,
+    query_type  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_requests_type_ts ON requests(query_type, ts);
+CREATE INDEX IF NOT EXISTS idx_requests_ts ON requests(ts);
+CREATE TABLE IF NOT EXISTS holds (
+    id     INTEGER PRIMARY KEY CHECK (id = 1),
+    until  REAL NOT NULL
+);
+"""
+
+
+def _window_slot(timestamps: List[float], slot: float, window: float,
+                 limit: int, margin: float) -> float:
+    """回傳 >= slot 且 window 內請求數少於 limit 的最早時間（timestamps 已遞增排序）。"""
+    in_window = [t for t in timestamps if t > slot - window]
+    if len(in_window) < limit:
+        return slot
+    return max(slot, in_window[len(in_window) - limit] + window + margin)
+
+
+class RequestLedger:
+    """
+    SQLite-backed ledger of Instagram requests across threads and processes.
+
+    Connections are opened per call; the BEGIN IMMEDIATE transaction around a
+    reservation serialises all processes using the same DATA_DIR.
+
+    Args:
+        path: Path of the SQLite database file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # isolation_level=None：transaction 由這裡明確控制
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            if not self._initialized:
+                with self._init_lock:
+                    if not self._initialized:
+                        conn.execute("PRAGMA journal_mode = WAL")
+                        conn.executescript(_SCHEMA)
+                        self._initialized = True
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def _timestamps(self, conn: sqlite3.Connection, where: str, params: tuple) -> List[float]:
+        rows = conn.execute(f"SELECT ts FROM requests WHERE {where} ORDER BY ts", params)
+        return [r[0] for r in rows]
+
+    def reserve(self, query_type: str, not_before: float) -> float:
+        """
+        預約一次請求，回傳可以發送的 Unix 時間（呼叫端自行 sleep 到該時間）。
+
+        Args:
+            query_type: instaloader query type (query hash / doc_id, "iphone" or "other").
+            not_before: Earliest time allowed by the caller's own pacing.
+        """
+        with self._connect() as conn:
+            now = time.time()
+            conn.execute("DELETE FROM requests WHERE ts < ?", (now - LEDGER_RETENTION,))
+            hold = conn.execute("SELECT until FROM holds WHERE id = 1").fetchone()
+            slot = max(now, not_before, hold[0] if hold else 0.0)
+
+            since = slot - LEDGER_RETENTION
+            per_type = self._timestamps(conn, "query_type = ? AND ts > ?", (query_type, since))
+            graphql = [] if query_type in _UNTYPED else self._timestamps(
+                conn, "query_type NOT IN (?, ?) AND ts > ?", (*_UNTYPED, since))
+            limit = PER_TYPE_LIMIT_OTHER if query_type == "other" else PER_TYPE_LIMIT
+
+            # 每條規則只會把時間往後推，重複套用直到穩定
+            while True:
+                candidate = _window_slot(per_type, slot, PER_TYPE_WINDOW, limit, 6)
+                candidate = _window_slot(graphql, candidate, GRAPHQL_WINDOW, GRAPHQL_LIMIT, 0)
+                if query_type == "iphone":
+                    candidate = _window_slot(per_type, candidate, IPHONE_WINDOW, IPHONE_LIMIT, 18)
+                if candidate == slot:
+                    break
+                slot = candidate
+
+            conn.execute("INSERT INTO requests(ts, query_type) VALUES (?, ?)", (slot, query_type))
+        return slot
+
+    def hold(self, seconds: float) -> None:
+        """收到 429：所有執行在接下來 seconds 秒內都不再發送請求。"""
+        until = time.time() + seconds
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO holds(id, until) VALUES (1, ?)"
+                " ON CONFLICT(id) DO UPDATE SET until = MAX(until, excluded.until)",
+                (until,))
+
+
+def open_ledger(data_dir: str) -> RequestLedger:
+    """開啟 data_dir 中的共用請求紀錄。"""
+    os.makedirs(data_dir, exist_ok=True)
+    return RequestLedger(os.path.join(data_dir, LEDGER_FILENAME))
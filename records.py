@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact in-memory representation of a user in a follower / following list.
+
+名單中的每位使用者過去同時以 (username, full_name) tuple 與三個鍵的 dict 存在，
+篩選後又複製一份。UserRecord 以 __slots__ 保存欄位（沒有每筆的 __dict__），
+username 經 sys.intern，同一位使用者出現在 following 與 followers 時共用同一個字串。
+抓取、差集、快取與 CSV / 資料庫輸出都使用 UserRecord，只在 JSON 邊界（API 回應、
+spill 檔）才以 to_dict() 轉成 dict。
+"""
+from __future__ import annotations
+import sys
+from typing import Any, Dict, Mapping
+
+
+class UserRecord:
+    """
+    A single user of a list.
+
+    Args:
+        username: Instagram username (interned).
+        full_name: Display name, "" when unknown.
+        avatar_url: Avatar URL, "" when not fetched.
+        user_id: Instagram numeric user id, 0 when unknown (older runs).
+    """
+
+    __slots__ = ("username", "full_name", "avatar_url", "user_id")
+
+    def __init__(self, username: str, full_name: str = "", avatar_url: str = "",
+                 user_id: int = 0):
+        self.username = sys.intern(username)
+        self.full_name = full_name or ""
+        self.avatar_url = avatar_url or ""
+        self.user_id = int(user_id or 0)
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "UserRecord":
+        """由 JSON / CSV 讀回的 dict 建立。"""
+        return cls(data.get("username", ""), data.get("full_name", ""),
+                   data.get("avatar_url", ""), data.get("id", 0))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON 輸出用的 dict（沒有頭像網址 / id 時省略該欄位）。"""
+        out: Dict[str, Any] = {"username": self.username, "full_name": self.full_name}
+        if self.avatar_url:
+            out["avatar_url"] = self.avatar_url
+        if self.user_id:
+            out["id"] = self.user_id
+        return out
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, UserRecord):
+            return NotImplemented
+        return (self.username, self.full_name, self.avatar_url, self.user_id) == \
+            (other.username, other.full_name, other.avatar_url, other.user_id)
+
+    def __hash__(self) -> int:
+        return hash(self.username)
+
+    def __repr__(self) -> str:
+        return f"UserRecord({self.username!r}, {self.full_name!r})"
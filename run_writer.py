@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Atomic writer for result folders (IGID_YYYYMMDDHHMMSS).
+
+過去每份 CSV 各自呼叫 datetime.now()，跨過秒數邊界的執行會被拆成兩個資料夾，
+而讀取端也可能看到只寫了一半的資料夾。RunWriter 只取一次時間戳，
+把所有輸出寫到 DATA_DIR 中的暫存資料夾（大緩衝區逐列寫入），
+fsync 後再以 rename 一次放到正式名稱：讀取端只會看到完整的結果，或完全看不到。
+"""
+from __future__ import annotations
+import os
+import csv
+import json
+import shutil
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from snapshots import SUMMARY_PREFIX
+
+# CSV 寫入緩衝區大小（bytes）
+WRITE_BUFFER = 1024 * 1024
+
+_TS_FORMAT = "%Y%m%d%H%M%S"
+
+
+def _fsync_dir(path: str) -> None:
+    """讓目錄項目（新增 / rename）落地；不支援目錄 fsync 的平台（Windows）略過。"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class RunWriter:
+    """
+    Writes every output of one run under a single timestamp, then publishes the
+    folder atomically with :meth:`commit`.
+
+    Use as a context manager; leaving the block with an exception removes the
+    temporary folder. If a folder with the same name already exists (two runs of
+    one account within a second) the timestamp is moved forward so neither run
+    is lost.
+
+    Args:
+        data_dir: Directory holding the result folders.
+        igid: Analysed Instagram account.
+        taken_at: Run timestamp (YYYYMMDDHHMMSS); defaults to now.
+    """
+
+    def __init__(self, data_dir: str, igid: str, taken_at: Optional[str] = None):
+        self.data_dir = data_dir
+        self.igid = igid
+        stamp = datetime.strptime(taken_at, _TS_FORMAT) if taken_at else datetime.now()
+        while os.path.exists(os.path.join(data_dir, f"{igid}_{stamp.strftime(_TS_FORMAT)}")):
+            stamp += timedelta(seconds=1)
+        self.taken_at = stamp.strftime(_TS_FORMAT)
+        self.folder = f"{igid}_{self.taken_at}"
+        self.path = os.path.join(data_dir, self.folder)
+        # 以 "." 開頭且不符合 IGID_YYYYMMDDHHMMSS 格式，不會被當成結果資料夾
+        self.tmp_path = os.path.join(data_dir, f".{self.folder}.{os.getpid()}.tmp")
+        os.makedirs(self.tmp_path, exist_ok=True)
+        self.files: Dict[str, str] = {}
+        self.committed = False
+
+    def __enter__(self) -> "RunWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if not self.committed:
+            self.abort()
+
+    def _open(self, prefix: str, ext: str, **kwargs):
+        filename = f"{prefix}_{self.taken_at}{ext}"
+        self.files[prefix] = os.path.join(self.folder, filename)
+        return open(os.path.join(self.tmp_path, filename), "w",
+                    buffering=WRITE_BUFFER, **kwargs)
+
+    def write_users(self, prefix: str, rows: Iterable[Tuple[str, str]]) -> str:
+        """
+        寫入一份名單 CSV（username, full_name, profile_url），回傳相對於 data_dir 的路徑。
+
+        Args:
+            prefix: File name prefix, e.g. "following_users".
+            rows: (username, full_name) pairs; consumed lazily.
+        """
+        # Excel 用 utf-8-sig 避免中文亂碼
+        with self._open(prefix, ".csv", newline="", encoding="utf-8-sig", errors="replace") as f:
+            w = csv.writer(f)
+            w.writerow(["username", "full_name", "profile_url"])
+            w.writerows((u, n, f"https://instagram.com/{u}") for u, n in rows)
+            f.flush()
+            os.fsync(f.fileno())
+        return self.files[prefix]
+
+    def write_summary(self, counts: Dict[str, int]) -> str:
+        """寫入 summary_YYYYMMDDHHMMSS.json（帳號、時間與各名單筆數），回傳相對於 data_dir 的路徑。"""
+        with self._open(SUMMARY_PREFIX, ".json", encoding="utf-8") as f:
+            json.dump({"igid": self.igid, "taken_at": self.taken_at, "counts": counts},
+                      f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        return self.files[SUMMARY_PREFIX]
+
+    def commit(self) -> str:
+        """把暫存資料夾 rename 成正式名稱，回傳資料夾名稱。"""
+        _fsync_dir(self.tmp_path)
+        os.rename(self.tmp_path, self.path)
+        _fsync_dir(self.data_dir)
+        self.committed = True
+        return self.folder
+
+    def abort(self) -> None:
+        """放棄這次寫入，刪除暫存資料夾。"""
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
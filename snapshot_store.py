@@ -0,0 +1,679 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Embedded SQLite snapshot store (DATA_DIR/snapshots.db).
+
+每次分析的 following / followers 名單以一個 transaction 批次寫入 SQLite，
+之後列出歷史結果、載入某次結果都只需要一次走索引的查詢，不再逐份解析 CSV。
+每個 run 仍以 IGID_YYYYMMDDHHMMSS（folder）識別，與既有資料夾、下載連結相容；
+CSV 改為需要時才由 export_csv() 匯出，舊的結果資料夾可用 import_folders() 匯入。
+
+資料表：
+- accounts(id, username)
+- runs(id, account_id, folder, taken_at, 各名單筆數, source)
+- memberships(run_id, kind, position, username, full_name, user_id)
+  kind 為 "following" 或 "followers"；兩份差集名單於載入時推導。
+  user_id 為 Instagram 的數字 id（舊資料為 0），比對時 username 或 id 相同即視為同一人，
+  改名的使用者不會被當成取消追蹤 + 新追蹤
+- diff_cache(from_folder, to_folder, payload)
+  兩次 run 之間的差異（新增 / 減少 / 回流）計算後快取於此，run 重寫時一併失效；
+  回流取決於 from 之前的所有 run，因此寫入較早的 run（匯入舊資料）時，
+  同帳號 from 較晚的快取也一併失效
+- meta(key, value)
+  其他狀態，例如上次掃描時 DATA_DIR 中結果資料夾的簽章
+
+runs 即為所有結果的索引（帳號、時間、各名單筆數），每次寫入 run 都在同一個 transaction 中更新；
+列出結果不需要掃描目錄。import_folders() 只在結果資料夾的簽章（名稱與 mtime）改變時才重新解析，
+且只驗證資料庫中還沒有的資料夾。簽章不使用 DATA_DIR 本身的 mtime：
+snapshots.db 與其他資料庫的 -wal / -shm 檔也在 DATA_DIR 中，每次連線都會改變它。
+
+載入過的 run 會保留在記憶體中的 LRU 快取（總大小以 SNAPSHOT_CACHE_MB 限制），
+以資料庫檔案（含 -wal）的 mtime 與大小驗證：資料庫沒有變動時，重複查看同一次結果、
+名單分頁、搜尋與排序都直接由記憶體回應，不需讀取磁碟。
+"""
+from __future__ import annotations
+import os
+import csv
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import idsets
+from records import UserRecord
+from snapshots import parse_result_folder, read_snapshot_users
+
+STORE_FILENAME = "snapshots.db"
+
+# 已解析 run 的記憶體快取上限（MB），可用環境變數調整
+SNAPSHOT_CACHE_MB = int(os.environ.get("SNAPSHOT_CACHE_MB", "64"))
+# 每位使用者（UserRecord + 兩個字串 + user id + list 參照，不含字元本身）約略佔用的記憶體（bytes），
+# 用來估算快取大小
+_USER_OVERHEAD = 200
+# 每個 run 保留的搜尋 / 排序結果數（虛擬捲動會以相同條件連續要求多頁）
+_VIEWS_PER_RUN = 8
+
+# 匯出的 CSV 檔名前綴 → 快照中的名單鍵值
+EXPORT_FILES = {
+    "following_users": "following",
+    "followers_users": "followers",
+    "non_followers": "following_only",
+    "fans_you_dont_follow": "fans_only",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    id        INTEGER PRIMARY KEY,
+    username  TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id                    INTEGER PRIMARY KEY,
+    account_id            INTEGER NOT NULL REFERENCES accounts(id),
+    folder                TEXT NOT NULL UNIQUE,
+    taken_at              TEXT NOT NULL,
+    following_count       INTEGER NOT NULL,
+    followers_count       INTEGER NOT NULL,
+    following_only_count  INTEGER NOT NULL,
+    fans_only_count       INTEGER NOT NULL,
+    source                TEXT NOT NULL DEFAULT 'fetch'
+);
+CREATE INDEX IF NOT EXISTS idx_runs_taken_at ON runs(taken_at DESC);
+CREATE INDEX IF NOT EXISTS idx_runs_account ON runs(account_id, taken_at DESC);
+CREATE TABLE IF NOT EXISTS memberships (
+    run_id     INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    kind       TEXT NOT NULL,
+    position   INTEGER NOT NULL,
+    username   TEXT NOT NULL,
+    full_name  TEXT NOT NULL,
+    user_id    INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, kind, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_memberships_user ON memberships(run_id, kind, username);
+CREATE TABLE IF NOT EXISTS diff_cache (
+    from_folder  TEXT NOT NULL,
+    to_folder    TEXT NOT NULL,
+    version      INTEGER NOT NULL,
+    payload      TEXT NOT NULL,
+    PRIMARY KEY (from_folder, to_folder)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_diff_cache_to ON diff_cache(to_folder);
+CREATE TABLE IF NOT EXISTS meta (
+    key    TEXT PRIMARY KEY,
+    value  TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# user_id 欄位之前建立的資料庫需補上的欄位與索引
+_MIGRATIONS = (
+    ("memberships", "user_id", "INTEGER NOT NULL DEFAULT 0"),
+)
+_MIGRATION_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_memberships_uid ON memberships(run_id, kind, user_id);
+"""
+
+# diff 結果格式變更時遞增，舊快取自動失效
+# （2：寫入較早的 run 時，from 較晚的快取一併失效；3：以 user id 辨識改名的使用者，回流也以 id 比對）
+DIFF_CACHE_VERSION = 3
+
+# 結果資料夾名稱（IGID_YYYYMMDDHHMMSS），用於計算簽章
+_RESULT_FOLDER_RE = re.compile(r"^.+_\d{14}$")
+
+# 查詢 IN (...) 時每批的使用者數（低於 SQLite 的變數上限）
+_SQL_BATCH = 500
+
+# memberships m 在另一份名單（o.run_id = ?, o.kind = ?）中找不到同一人：
+# username 不同，且沒有 id 或 id 也不同（改名的使用者以 id 配對）
+_NOT_IN_OTHER = (
+    "NOT EXISTS (SELECT 1 FROM memberships o"
+    " WHERE o.run_id = ? AND o.kind = ? AND o.username = m.username)"
+    " AND (m.user_id = 0 OR NOT EXISTS (SELECT 1 FROM memberships o"
+    " WHERE o.run_id = ? AND o.kind = ? AND o.user_id = m.user_id))"
+)
+
+# 兩個 run 之間「出現在 a、不在 b」的使用者（依 a 的原順序）
+_MEMBERSHIP_EXCEPT = (
+    "SELECT m.username, m.full_name, m.user_id FROM memberships m"
+    f" WHERE m.run_id = ? AND m.kind = ? AND {_NOT_IN_OTHER}"
+    " ORDER BY m.position"
+)
+
+# 名單種類 → (基本名單, 需排除的名單)；兩份差集名單以 NOT EXISTS 推導
+LIST_KINDS = {
+    "following": ("following", None),
+    "followers": ("followers", None),
+    "following_only": ("following", "followers"),
+    "fans_only": ("followers", "following"),
+}
+
+# 分頁查詢允許的排序（前綴 "-" 表示遞減）→ 排序鍵；position 為原本的順序
+LIST_SORTS: Dict[str, Optional[Callable[[UserRecord], str]]] = {
+    "position": None,
+    "username": lambda u: u.username.casefold(),
+    "full_name": lambda u: u.full_name.casefold(),
+}
+
+_RUN_COLUMNS = (
+    "r.folder, a.username, r.taken_at, r.following_count, r.followers_count, "
+    "r.following_only_count, r.fans_only_count, r.source"
+)
+
+
+def derive_diffs(following: List[UserRecord],
+                 followers: List[UserRecord]) -> Tuple[List[UserRecord], List[UserRecord]]:
+    """由兩份基本名單推導（你追但沒回追, 追你但你沒回追），保留原順序。"""
+    following_mask, fans_mask = idsets.classify(following, followers)
+    return (list(idsets.select(following, following_mask)),
+            list(idsets.select(followers, fans_mask)))
+
+
+def _run_row_to_info(row: sqlite3.Row) -> Dict:
+    taken_at = row["taken_at"]
+    return {
+        "folder": row["folder"],
+        "igid": row["username"],
+        "date": taken_at,
+        "date_formatted": datetime.strptime(taken_at, '%Y%m%d%H%M%S')
+        .strftime('%Y年%m月%d日 %H:%M:%S'),
+        "sort_date": taken_at,
+        "counts": {
+            "following": row["following_count"],
+            "followers": row["followers_count"],
+            "following_only": row["following_only_count"],
+            "fans_only": row["fans_only_count"],
+        },
+        "source": row["source"],
+    }
+
+
+class _CachedRun:
+    """記憶體快取中的一次 run：四份名單與最近的搜尋 / 排序結果。"""
+
+    __slots__ = ("run_id", "lists", "size", "signature", "views")
+
+    def __init__(self, run_id: int, lists: Dict[str, List[UserRecord]],
+                 signature: Tuple):
+        self.run_id = run_id
+        self.lists = lists
+        self.signature = signature
+        self.views: "OrderedDict[Tuple[str, str, str], List[UserRecord]]" = OrderedDict()
+        self.size = sum(
+            _USER_OVERHEAD + len(u.username) + len(u.full_name)
+            for kind in ("following", "followers") for u in lists[kind]
+        ) + 8 * (len(lists["following_only"]) + len(lists["fans_only"]))
+
+
+class SnapshotStore:
+    """
+    SQLite-backed store of analysis runs.
+
+    Connections are opened per operation so the store can be shared by Flask
+    threads and by the CLI; WAL mode lets readers proceed during a write.
+
+    Parsed runs are kept in a size-bounded LRU cache. An entry is reused as is
+    while the database file and its WAL keep the same mtime and size; after any
+    write the entry is revalidated against the run's row id, which changes when
+    the run is rewritten (possibly by another process).
+
+    Args:
+        path: Path of the SQLite database file.
+        cache_bytes: Approximate memory budget of the run cache (0 disables it).
+    """
+
+    def __init__(self, path: str, cache_bytes: int = SNAPSHOT_CACHE_MB * 1024 * 1024):
+        self.path = path
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self.cache_bytes = cache_bytes
+        self._cache: "OrderedDict[str, _CachedRun]" = OrderedDict()
+        self._cache_size = 0
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA foreign_keys = ON")
+            if not self._initialized:
+                with self._init_lock:
+                    if not self._initialized:
+                        conn.execute("PRAGMA journal_mode = WAL")
+                        conn.executescript(_SCHEMA)
+                        self._migrate(conn)
+                        self._initialized = True
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection) -> None:
+        """為舊版資料庫補上新增的欄位（ALTER TABLE）與其索引。"""
+        for table, column, decl in _MIGRATIONS:
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+        conn.executescript(_MIGRATION_INDEXES)
+
+    def save_run(self, igid: str, taken_at: str,
+                 following: Iterable[UserRecord],
+                 followers: Iterable[UserRecord],
+                 source: str = "fetch") -> str:
+        """
+        以單一 transaction 批次寫入一次分析結果，回傳 run 的 folder 名稱。
+
+        兩份名單只各走訪一次（可直接傳入 UserSpill 串流寫入），
+        各名單筆數與兩份差集的筆數在寫入後由 SQLite 計算。
+
+        Args:
+            igid: Analysed Instagram account.
+            taken_at: Run timestamp, YYYYMMDDHHMMSS.
+            following: Users the account follows (UserRecord).
+            followers: Users following the account.
+            source: Where the run came from ("fetch", "incremental", "import", ...).
+        """
+        folder = f"{igid}_{taken_at}"
+        self._cache_drop(folder)
+        with self._connect() as conn, conn:
+            conn.execute("INSERT OR IGNORE INTO accounts(username) VALUES (?)", (igid,))
+            account_id = conn.execute(
+                "SELECT id FROM accounts WHERE username = ?", (igid,)).fetchone()[0]
+            # 同一 folder 重寫時以新資料為準，並讓相關的 diff 快取失效；
+            # 回流會參考 from 之前的所有 run → 同帳號 from 晚於此 run 的快取也失效
+            conn.execute("DELETE FROM runs WHERE folder = ?", (folder,))
+            conn.execute("DELETE FROM diff_cache WHERE from_folder = ? OR to_folder = ?",
+                         (folder, folder))
+            conn.execute(
+                "DELETE FROM diff_cache WHERE from_folder IN"
+                " (SELECT folder FROM runs WHERE account_id = ? AND taken_at > ?)",
+                (account_id, taken_at))
+            run_id = conn.execute(
+                "INSERT INTO runs(account_id, folder, taken_at, following_count, followers_count,"
+                " following_only_count, fans_only_count, source) VALUES (?, ?, ?, 0, 0, 0, 0, ?)",
+                (account_id, folder, taken_at, source)
+            ).lastrowid
+            for kind, users in (("following", following), ("followers", followers)):
+                conn.executemany(
+                    "INSERT INTO memberships(run_id, kind, position, username, full_name, user_id)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    ((run_id, kind, i, u.username, u.full_name, u.user_id)
+                     for i, u in enumerate(users))
+                )
+            counts = [
+                conn.execute("SELECT COUNT(*) FROM memberships WHERE run_id = ? AND kind = ?",
+                             (run_id, kind)).fetchone()[0]
+                for kind in ("following", "followers")
+            ] + [
+                conn.execute(
+                    "SELECT COUNT(*) FROM memberships m WHERE m.run_id = ? AND m.kind = ?"
+                    f" AND {_NOT_IN_OTHER}",
+                    (run_id, base, run_id, exclude, run_id, exclude)).fetchone()[0]
+                for base, exclude in (LIST_KINDS["following_only"], LIST_KINDS["fans_only"])
+            ]
+            conn.execute(
+                "UPDATE runs SET following_count = ?, followers_count = ?,"
+                " following_only_count = ?, fans_only_count = ? WHERE id = ?",
+                (*counts, run_id))
+        return folder
+
+    def list_runs(self, igid: Optional[str] = None) -> List[Dict]:
+        """列出所有 run（最新在前）；指定 igid 時只列該帳號。"""
+        query = f"SELECT {_RUN_COLUMNS} FROM runs r JOIN accounts a ON a.id = r.account_id"
+        params: Tuple = ()
+        if igid is not None:
+            query += " WHERE a.username = ?"
+            params = (igid,)
+        query += " ORDER BY r.taken_at DESC, r.id DESC"
+        with self._connect() as conn:
+            return [_run_row_to_info(row) for row in conn.execute(query, params)]
+
+    def latest_run(self, igid: Optional[str] = None) -> Optional[Dict]:
+        """回傳最新的 run 資訊；指定 igid 時只看該帳號。"""
+        runs = self.list_runs(igid)
+        return runs[0] if runs else None
+
+    def get_run(self, folder: str) -> Optional[Dict]:
+        """依 folder 名稱取得 run 資訊。"""
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {_RUN_COLUMNS} FROM runs r JOIN accounts a ON a.id = r.account_id"
+                " WHERE r.folder = ?", (folder,)).fetchone()
+        return _run_row_to_info(row) if row else None
+
+    def has_run(self, folder: str) -> bool:
+        """是否已儲存指定 folder 的 run。"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM runs WHERE folder = ?", (folder,)).fetchone() is not None
+
+    def _db_signature(self) -> Tuple:
+        """資料庫檔案與 WAL 的 (mtime, 大小)；任何寫入都會改變其中之一。"""
+        signature = []
+        for suffix in ("", "-wal"):
+            try:
+                st = os.stat(self.path + suffix)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _cache_drop(self, folder: str) -> None:
+        with self._cache_lock:
+            entry = self._cache.pop(folder, None)
+            if entry is not None:
+                self._cache_size -= entry.size
+
+    def _cached_run(self, folder: str) -> Optional[_CachedRun]:
+        """取得 run 的快取項目，必要時由資料庫載入；run 不存在時回傳 None。"""
+        signature = self._db_signature()
+        with self._cache_lock:
+            entry = self._cache.get(folder)
+            if entry is not None and entry.signature == signature:
+                self._cache.move_to_end(folder)
+                self.cache_hits += 1
+                return entry
+
+        with self._connect() as conn:
+            run = conn.execute("SELECT id FROM runs WHERE folder = ?", (folder,)).fetchone()
+            if run is None:
+                self._cache_drop(folder)
+                return None
+            if entry is not None and entry.run_id == run["id"]:
+                # 資料庫有其他寫入，但這次 run 沒有被重寫
+                with self._cache_lock:
+                    entry.signature = signature
+                    if folder in self._cache:
+                        self._cache.move_to_end(folder)
+                    self.cache_hits += 1
+                return entry
+            lists: Dict[str, List[UserRecord]] = {"following": [], "followers": []}
+            rows = conn.execute(
+                "SELECT kind, username, full_name, user_id FROM memberships"
+                " WHERE run_id = ? ORDER BY kind, position", (run["id"],))
+            for kind, username, full_name, user_id in rows:
+                lists[kind].append(UserRecord(username, full_name, user_id=user_id))
+        lists["following_only"], lists["fans_only"] = derive_diffs(
+            lists["following"], lists["followers"])
+        entry = _CachedRun(run["id"], lists, signature)
+
+        with self._cache_lock:
+            self.cache_misses += 1
+            if entry.size > self.cache_bytes:
+                return entry  # 單一 run 就超過上限：不放入快取
+            old = self._cache.pop(folder, None)
+            if old is not None:
+                self._cache_size -= old.size
+            self._cache[folder] = entry
+            self._cache_size += entry.size
+            while self._cache_size > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_size -= evicted.size
+                self.cache_evictions += 1
+        return entry
+
+    def cache_stats(self) -> Dict[str, int]:
+        """記憶體快取的命中 / 未命中 / 淘汰次數與目前大小。"""
+        with self._cache_lock:
+            return {
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "evictions": self.cache_evictions,
+                "entries": len(self._cache),
+                "bytes": self._cache_size,
+                "max_bytes": self.cache_bytes,
+            }
+
+    def load_run(self, folder: str) -> Optional[Dict[str, List[UserRecord]]]:
+        """
+        載入一次 run 的四份名單（following / followers / following_only / fans_only）。
+        回傳 None 表示不存在。名單與快取共用，呼叫端不可修改。
+        """
+        entry = self._cached_run(folder)
+        return dict(entry.lists) if entry else None
+
+    def page_list(self, folder: str, kind: str, offset: int = 0, limit: int = 100,
+                  q: str = "", sort: str = "position") -> Optional[Dict]:
+        """
+        分頁查詢某次 run 的一份名單；搜尋與排序結果保留在該 run 的快取項目中，
+        以相同條件繼續捲動時直接切片。
+
+        Args:
+            folder: Run folder name.
+            kind: One of ``LIST_KINDS``.
+            offset: Number of matching users to skip.
+            limit: Maximum number of users to return.
+            q: Case-insensitive substring matched against username and full name.
+            sort: A key of ``LIST_SORTS``, optionally prefixed with "-" for descending.
+
+        Returns:
+            None if the run does not exist, otherwise ``{"total", "items"}`` where
+            ``total`` counts all users matching ``q``.
+
+        Raises:
+            ValueError: If ``kind`` or ``sort`` is not supported.
+        """
+        if kind not in LIST_KINDS:
+            raise ValueError(f"unknown list kind: {kind}")
+        if sort.lstrip("-") not in LIST_SORTS:
+            raise ValueError(f"unknown sort: {sort}")
+        entry = self._cached_run(folder)
+        if entry is None:
+            return None
+
+        view_key = (kind, q.casefold(), sort)
+        with self._cache_lock:
+            users = entry.views.get(view_key)
+            if users is not None:
+                entry.views.move_to_end(view_key)
+        if users is None:
+            users = entry.lists[kind]
+            if q:
+                needle = q.casefold()
+                users = [u for u in users if needle in u.username.casefold()
+                         or needle in u.full_name.casefold()]
+            key = LIST_SORTS[sort.lstrip("-")]
+            descending = sort.startswith("-")
+            if key is not None:
+                # sorted 為穩定排序：同名者維持原本順序
+                users = sorted(users, key=key, reverse=descending)
+            elif descending:
+                users = users[::-1]
+            with self._cache_lock:
+                entry.views[view_key] = users
+                while len(entry.views) > _VIEWS_PER_RUN:
+                    entry.views.popitem(last=False)
+
+        offset = max(0, offset)
+        return {"total": len(users), "items": users[offset:offset + max(0, limit)]}
+
+    def export_csv(self, folder: str, list_key: str, out) -> bool:
+        """
+        將某次 run 的一份名單以既有 CSV 格式寫到檔案物件 out（需以 utf-8-sig 開啟）。
+
+        Args:
+            folder: Run folder name.
+            list_key: following / followers / following_only / fans_only.
+            out: Writable text file object.
+
+        Returns:
+            False if the run does not exist.
+        """
+        data = self.load_run(folder)
+        if data is None or list_key not in data:
+            return False
+        w = csv.writer(out)
+        w.writerow(["username", "full_name", "profile_url"])
+        for user in data[list_key]:
+            w.writerow([user.username, user.full_name,
+                        f"https://instagram.com/{user.username}"])
+        return True
+
+    def diff_runs(self, from_folder: str, to_folder: str) -> Optional[Dict]:
+        """
+        比較同一帳號的兩次 run：誰新追蹤、誰取消追蹤、誰取消後又回來追蹤。
+
+        結果以 (from, to) 為鍵快取在 diff_cache，重複查詢直接回傳快取。
+
+        Args:
+            from_folder: Older run folder name.
+            to_folder: Newer run folder name.
+
+        Returns:
+            None if either run does not exist, otherwise a dict with ``from`` / ``to``
+            run info, ``followers`` (gained / lost / returned), ``following``
+            (gained / lost) and ``cached``.
+
+        Raises:
+            ValueError: If the two runs belong to different accounts.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT payload FROM diff_cache"
+                " WHERE from_folder = ? AND to_folder = ? AND version = ?",
+                (from_folder, to_folder, DIFF_CACHE_VERSION)).fetchone()
+            if row is not None:
+                return {**json.loads(row["payload"]), "cached": True}
+
+            runs = {}
+            for folder in (from_folder, to_folder):
+                run = conn.execute(
+                    f"SELECT r.id, r.account_id, {_RUN_COLUMNS} FROM runs r"
+                    " JOIN accounts a ON a.id = r.account_id WHERE r.folder = ?",
+                    (folder,)).fetchone()
+                if run is None:
+                    return None
+                runs[folder] = run
+            old, new = runs[from_folder], runs[to_folder]
+            if old["account_id"] != new["account_id"]:
+                raise ValueError("兩次結果屬於不同帳號，無法比較")
+
+            # 新增的追蹤者的 user id（回流比對用，不放進結果）
+            gained_ids: Dict[str, int] = {}
+
+            def except_users(a, b, kind: str, ids: Optional[Dict[str, int]] = None
+                             ) -> List[Dict[str, str]]:
+                users = []
+                for u, n, uid in conn.execute(_MEMBERSHIP_EXCEPT,
+                                              (a["id"], kind, b["id"], kind, b["id"], kind)):
+                    users.append({"username": u, "full_name": n})
+                    if ids is not None and uid:
+                        ids[u] = uid
+                return users
+
+            result = {
+                "from": _run_row_to_info(old),
+                "to": _run_row_to_info(new),
+                "followers": {
+                    "gained": except_users(new, old, "followers", gained_ids),
+                    "lost": except_users(old, new, "followers"),
+                },
+                "following": {
+                    "gained": except_users(new, old, "following"),
+                    "lost": except_users(old, new, "following"),
+                },
+            }
+
+            # 回流：這次新增的追蹤者，曾出現在 from 之前同帳號的某次結果中
+            # （username 相同，或 id 相同 → 改名後回來的使用者也算）
+            def seen_before(column: str, values: List) -> set:
+                found: set = set()
+                for i in range(0, len(values), _SQL_BATCH):
+                    batch = values[i:i + _SQL_BATCH]
+                    placeholders = ",".join("?" * len(batch))
+                    found.update(row[0] for row in conn.execute(
+                        f"SELECT DISTINCT m.{column} FROM memberships m"
+                        " JOIN runs r ON r.id = m.run_id"
+                        " WHERE r.account_id = ? AND r.taken_at < ? AND m.kind = 'followers'"
+                        f" AND m.{column} IN ({placeholders})",
+                        (old["account_id"], old["taken_at"], *batch)))
+                return found
+
+            returned_names = seen_before(
+                "username", [u["username"] for u in result["followers"]["gained"]])
+            returned_ids = seen_before("user_id", list(set(gained_ids.values())))
+            result["followers"]["returned"] = [
+                u for u in result["followers"]["gained"]
+                if u["username"] in returned_names
+                or gained_ids.get(u["username"], 0) in returned_ids]
+
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO diff_cache(from_folder, to_folder, version, payload)"
+                    " VALUES (?, ?, ?, ?)",
+                    (from_folder, to_folder, DIFF_CACHE_VERSION,
+                     json.dumps(result, ensure_ascii=False)))
+        return {**result, "cached": False}
+
+    def import_folders(self, data_dir: str, force: bool = False) -> int:
+        """
+        匯入 data_dir 中尚未匯入的 IGID_YYYYMMDDHHMMSS 結果資料夾，回傳匯入數量。
+
+        結果資料夾的簽章（folders_signature）與上次完整掃描時相同就直接返回
+        （只列目錄與 stat 結果資料夾，不解析 CSV），force=True 時一律重新掃描。
+        """
+        data_dir = os.path.abspath(data_dir)
+        signature_key = f"folders_signature:{data_dir}"
+        signature = folders_signature(data_dir)
+        with self._connect() as conn:
+            if not force:
+                row = conn.execute(
+                    "SELECT value FROM meta WHERE key = ?", (signature_key,)).fetchone()
+                if row is not None and row[0] == signature:
+                    return 0
+            known = {row[0] for row in conn.execute("SELECT folder FROM runs")}
+
+        imported = 0
+        pending = False
+        for item in os.listdir(data_dir):
+            if item in known:
+                continue
+            info = parse_result_folder(data_dir, item)
+            if info is None:
+                continue
+            if not info["complete"]:
+                # 可能仍在寫入；下次需再掃描
+                pending = True
+                continue
+            try:
+                following = read_snapshot_users(data_dir, info, "following")
+                followers = read_snapshot_users(data_dir, info, "followers")
+            except (OSError, csv.Error) as e:
+                print(f"[WARN] 無法匯入 {info['folder']}：{e}", flush=True)
+                pending = True
+                continue
+            self.save_run(info["igid"], info["date"], following, followers, source="import")
+            imported += 1
+
+        if not pending:
+            with self._connect() as conn, conn:
+                conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)",
+                             (signature_key, signature))
+        return imported
+
+
+def folders_signature(data_dir: str) -> str:
+    """
+    data_dir 中結果資料夾的簽章：名稱與 mtime 排序後的雜湊。
+
+    新增、刪除、改名資料夾或在資料夾中新增檔案時改變；資料庫檔案的寫入不影響。
+    """
+    entries = []
+    with os.scandir(data_dir) as it:
+        for entry in it:
+            if _RESULT_FOLDER_RE.match(entry.name) and entry.is_dir():
+                entries.append(f"{entry.name}\t{entry.stat().st_mtime_ns}")
+    entries.sort()
+    return hashlib.sha1("\n".join(entries).encode("utf-8")).hexdigest()
+
+
+def open_store(data_dir: str) -> SnapshotStore:
+    """開啟 data_dir 中的快照資料庫。"""
+    os.makedirs(data_dir, exist_ok=True)
+    return SnapshotStore(os.path.join(data_dir, STORE_FILENAME))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared helpers for stored result snapshots (IGID_YYYYMMDDHHMMSS folders).
+
+快照資料庫（snapshot_store.py）透過這裡掃描與解析舊的結果資料夾以便匯入；
+增量模式的停止條件也放在這裡，供 Web 版與 CLI 共用。
+"""
+from __future__ import annotations
+import os
+import csv
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from records import UserRecord
+
+# 增量模式：連續遇到多少位「上一份快照已有」的使用者就停止抓取（約兩頁半）
+INCREMENTAL_KNOWN_STREAK = 30
+
+# 快照內 CSV 的檔名前綴
+SNAPSHOT_FILES = {
+    "following": "following_users",
+    "followers": "followers_users",
+    "non_followers": "non_followers",
+    "fans_you_dont_follow": "fans_you_dont_follow",
+}
+
+# 新的結果資料夾只保存兩份基本名單與摘要；兩份差集名單載入時推導，
+# 需要 CSV 時由 /download（Web）或 export 指令（CLI）產生。舊資料夾的四份 CSV 仍可匯入。
+BASE_SNAPSHOT_FILES = ("following", "followers")
+SUMMARY_PREFIX = "summary"
+
+
+def parse_result_folder(data_dir: str, item: str) -> Optional[Dict[str, str]]:
+    """
+    驗證單一結果資料夾（格式：IGID_YYYYMMDDHHMMSS）並確認包含完整的 CSV 檔案。
+    名稱不符合格式回傳 None；名稱符合但檔案不完整時回傳的資訊含 "complete": False。
+    """
+    item_path = os.path.join(data_dir, item)
+    if '_' not in item:
+        return None
+    # 最後一個部分應該是日期時間，其餘部分組成 IGID
+    parts = item.split('_')
+    datetime_str = parts[-1]
+    igid = '_'.join(parts[:-1])
+
+    # 驗證日期時間格式（14位數字）
+    if len(datetime_str) != 14 or not datetime_str.isdigit():
+        return None
+    try:
+        date_obj = datetime.strptime(datetime_str, '%Y%m%d%H%M%S')
+    except ValueError:
+        return None
+    if not os.path.isdir(item_path):
+        return None
+
+    # 檢查資料夾內是否包含兩份基本名單的 CSV 檔案
+    all_files_exist = True
+    for key in BASE_SNAPSHOT_FILES:
+        file_path = os.path.join(item_path, f"{SNAPSHOT_FILES[key]}_{datetime_str}.csv")
+        if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+            all_files_exist = False
+            break
+
+    return {
+        "folder": item,
+        "igid": igid,
+        "date": datetime_str,
+        "date_formatted": date_obj.strftime('%Y年%m月%d日 %H:%M:%S'),
+        "sort_date": datetime_str,
+        "complete": all_files_exist,
+    }
+
+
+def read_snapshot_users(data_dir: str, folder_info: Dict[str, str],
+                        file_key: str) -> List[UserRecord]:
+    """讀取快照中的某一份 CSV，回傳 UserRecord 清單（依原檔順序）。"""
+    filename = f"{SNAPSHOT_FILES[file_key]}_{folder_info['date']}.csv"
+    path = os.path.join(data_dir, folder_info["folder"], filename)
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return [UserRecord(row.get("username") or "", row.get("full_name") or "")
+                for row in csv.DictReader(f)]
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Append-only spill files for fetched user lists.
+
+過去抓取名單時，每位使用者同時存在 users_pairs 與 users_objs 兩份清單，
+之後分類、寫 CSV、寫入資料庫又各自複製、走訪一次；50 萬人的帳號會佔用數 GB 記憶體。
+UserSpill 把每位抓到的使用者直接附加到磁碟上的 JSONL 檔，記憶體中只保留 username 集合
+與依序排列的 user id 陣列（int64），差集計算與 CSV / 資料庫輸出都從檔案串流讀回。
+
+抓取有 checkpoint 時，spill 檔就是 checkpoint 的 <account>-<label>.jsonl；
+否則（增量模式）使用 DATA_DIR/spill/ 下的暫存檔，用完由 remove() 刪除。
+大帳號模式（key_window）只記住最近的使用者，分類改由 external_merge 串流處理。
+"""
+from __future__ import annotations
+import os
+import json
+import shutil
+import time
+import tempfile
+from array import array
+from collections import deque
+from typing import Iterable, Iterator, Optional, Set, Tuple
+
+from records import UserRecord
+
+SPILL_DIRNAME = "spill"
+
+# 超過此時間（秒）的暫存 spill 檔視為異常中斷的殘留
+SPILL_MAX_AGE = 24 * 3600
+
+# spill 檔寫入緩衝區大小（bytes）
+SPILL_BUFFER = 256 * 1024
+
+
+class UserSpill:
+    """
+    Append-only JSONL file of users with an in-memory set of their usernames.
+
+    Users are deduplicated by username on :meth:`append`; :attr:`ids` holds
+    their numeric user ids in the same order (0 when unknown). With
+    ``key_window`` only the most recent usernames are remembered and
+    :attr:`ids` is None, so memory does not grow with the list. Iterating flushes
+    pending writes and streams the users back, as UserRecord, in insertion order.
+
+    Args:
+        path: JSONL file to append to.
+        resume: Number of users already in the file to keep (e.g. the count
+            recorded by a checkpoint); anything after them is truncated.
+            0 starts a new, empty file.
+        temporary: Whether :meth:`remove` is expected once the list is consumed.
+        key_window: Large-account mode; number of recent usernames kept for
+            deduplication (a resumed checkpoint replays at most one page).
+    """
+
+    def __init__(self, path: str, resume: int = 0, temporary: bool = False,
+                 key_window: Optional[int] = None):
+        self.path = path
+        self.temporary = temporary
+        self.key_window = key_window
+        self.keys: Set[str] = set()
+        self.ids: Optional[array] = array("q") if key_window is None else None
+        self._recent: deque = deque()
+        self._count = 0
+        if resume > 0 and os.path.isfile(path):
+            self._restore(resume)
+        else:
+            open(path, "wb").close()
+        self._file = open(path, "a", encoding="utf-8", buffering=SPILL_BUFFER)
+
+    def _restore(self, count: int) -> None:
+        """讀回前 count 筆的 username 與 id，並截掉上次中斷時多寫的尾巴。"""
+        offset = 0
+        with open(self.path, "rb") as f:
+            while self._count < count:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    data = json.loads(line)
+                    username = data["username"]
+                    user_id = int(data.get("id") or 0)
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    break
+                offset += len(line)
+                self._remember(username, user_id)
+                self._count += 1
+        with open(self.path, "r+b") as f:
+            f.truncate(offset)
+
+    def _remember(self, username: str, user_id: int) -> None:
+        self.keys.add(username)
+        if self.ids is not None:
+            self.ids.append(user_id)
+        else:
+            self._recent.append(username)
+            if len(self._recent) > self.key_window:
+                self.keys.discard(self._recent.popleft())
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, username: str) -> bool:
+        return username in self.keys
+
+    def append(self, user: UserRecord) -> bool:
+        """附加一位使用者；username 已存在時略過並回傳 False。"""
+        username = user.username
+        if username in self.keys:
+            return False
+        self._remember(username, user.user_id)
+        self._file.write(json.dumps(user.to_dict(), ensure_ascii=False) + "\n")
+        self._count += 1
+        return True
+
+    def extend(self, users: Iterable[UserRecord]) -> int:
+        """依序附加多位使用者（略過已存在者），回傳實際新增的筆數。"""
+        return sum(1 for user in users if self.append(user))
+
+    def flush(self) -> None:
+        """把緩衝區寫到檔案（checkpoint 記錄筆數前呼叫）。"""
+        self._file.flush()
+
+    def __iter__(self) -> Iterator[UserRecord]:
+        self.flush()
+        remaining = self._count
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if remaining <= 0:
+                    break
+                remaining -= 1
+                yield UserRecord.from_dict(json.loads(line))
+
+    def pairs(self) -> Iterator[Tuple[str, str]]:
+        """串流 (username, full_name)。"""
+        for user in self:
+            yield user.username, user.full_name
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def remove(self) -> None:
+        """關閉並刪除 spill 檔。"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def release(self) -> None:
+        """用完後釋放：暫存檔刪除，其他（checkpoint 的檔案）只關閉。可重複呼叫。"""
+        if self.temporary:
+            self.remove()
+        else:
+            self.close()
+
+
+def spill_dir(data_dir: str) -> str:
+    """回傳（並建立）DATA_DIR/spill/。"""
+    directory = os.path.join(data_dir, SPILL_DIRNAME)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def open_spill(data_dir: str, label: Optional[str] = None) -> UserSpill:
+    """在 DATA_DIR/spill/ 建立暫存的 spill 檔（用完呼叫 remove()）。"""
+    directory = spill_dir(data_dir)
+    fd, path = tempfile.mkstemp(prefix=f"{label or 'users'}-", suffix=".jsonl", dir=directory)
+    os.close(fd)
+    return UserSpill(path, temporary=True)
+
+
+def clean_spill_dir(data_dir: str, max_age: float = SPILL_MAX_AGE) -> int:
+    """刪除 DATA_DIR/spill/ 中超過 max_age 秒未更新的暫存檔（與暫存資料夾），回傳刪除數量。"""
+    directory = os.path.join(data_dir, SPILL_DIRNAME)
+    if not os.path.isdir(directory):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    for entry in os.scandir(directory):
+        try:
+            if entry.stat().st_mtime >= cutoff:
+                continue
+            if entry.is_dir():
+                # 大帳號模式外部排序的暫存資料夾
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""SnapshotStore.import_folders 的掃描閘門。"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import snapshot_store  # noqa: E402
+from run_writer import RunWriter  # noqa: E402
+from snapshots import SNAPSHOT_FILES  # noqa: E402
+
+
+def _write_run(data_dir, igid, taken_at):
+    with RunWriter(data_dir, igid, taken_at) as writer:
+        writer.write_users(SNAPSHOT_FILES["following"], [("alice", "Alice"), ("bob", "Bob")])
+        writer.write_users(SNAPSHOT_FILES["followers"], [("alice", "Alice")])
+        return writer.commit()
+
+
+def _count_parses(monkeypatch):
+    calls = []
+    original = snapshot_store.parse_result_folder
+
+    def counting(data_dir, item):
+        calls.append(item)
+        return original(data_dir, item)
+
+    monkeypatch.setattr(snapshot_store, "parse_result_folder", counting)
+    return calls
+
+
+def test_import_folders_skips_scan_after_store_writes(tmp_path, monkeypatch):
+    data_dir = str(tmp_path)
+    _write_run(data_dir, "me", "20240101120000")
+    store = snapshot_store.open_store(data_dir)
+    assert store.import_folders(data_dir) == 1
+
+    # 資料庫的讀寫會在 DATA_DIR 中建立或更新 -wal / -shm 檔，不應觸發重新掃描
+    assert [run["folder"] for run in store.list_runs()] == ["me_20240101120000"]
+    store.save_run("other", "20240102120000", [], [], source="test")
+
+    calls = _count_parses(monkeypatch)
+    assert store.import_folders(data_dir) == 0
+    assert calls == []
+
+
+def test_import_folders_rescans_when_folders_change(tmp_path, monkeypatch):
+    data_dir = str(tmp_path)
+    _write_run(data_dir, "me", "20240101120000")
+    store = snapshot_store.open_store(data_dir)
+    assert store.import_folders(data_dir) == 1
+
+    folder = _write_run(data_dir, "me", "20240103120000")
+    calls = _count_parses(monkeypatch)
+    assert store.import_folders(data_dir) == 1
+    assert folder in calls
+    assert [run["folder"] for run in store.list_runs("me")] == [
+        "me_20240103120000", "me_20240101120000"]
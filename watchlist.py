@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Watchlist mode: check how a few specific accounts relate to the logged-in viewer.
+
+只想知道幾百個特定帳號有沒有回追時，下載兩份完整名單（數十萬人的帳號需要數千次分頁請求）
+並不划算。這裡改為逐一查詢每個帳號的個人檔案（web_profile_info，一個帳號一次請求），
+由 follows_viewer / followed_by_viewer 得知「對方是否追蹤你」與「你是否追蹤對方」。
+
+- 查詢結果以 (viewer, username) 為鍵快取在 DATA_DIR/watchlist.db，TTL 內重複檢查不需任何請求
+- 帳號分批查詢，每批查完即寫入快取：中斷（429、容器重啟）後重跑會從下一批繼續
+- 結果輸出為 DATA_DIR/watchlists/watchlist_<viewer>_<YYYYMMDDHHMMSS>.csv，
+  欄位沿用 username, full_name, profile_url，並加上關係欄位
+
+Instagram 沒有批次查詢關係的公開端點，「分批」指的是快取寫入與進度回報的單位；
+請求間隔仍由共用的速率控制器與請求紀錄決定。
+"""
+from __future__ import annotations
+import csv
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from instaloader import Profile, exceptions
+
+from rate_control import is_rate_limited
+
+WATCHLIST_FILENAME = "watchlist.db"
+REPORT_DIRNAME = "watchlists"
+
+# 查詢結果的有效時間（小時）與每批帳號數，可用環境變數調整
+WATCHLIST_TTL_HOURS = float(os.environ.get("WATCHLIST_TTL_HOURS", "24"))
+WATCHLIST_BATCH = int(os.environ.get("WATCHLIST_BATCH", "25"))
+# 一次最多檢查的帳號數（更多時完整抓取名單通常更省請求）
+WATCHLIST_MAX = 2000
+# 同一帳號遇到 429 時最多重試次數
+_RATE_LIMIT_RETRIES = 3
+
+# 查詢狀態
+STATUS_OK = "ok"
+STATUS_NOT_FOUND = "not_found"
+STATUS_ERROR = "error"
+
+REPORT_COLUMNS = ["username", "full_name", "profile_url", "follows_you", "you_follow",
+                  "status", "checked_at"]
+
+_USERNAME_RE = re.compile(r"^[\w.]{1,30}$")
+_PROFILE_URL_RE = re.compile(r"instagram\.com/(?:_u/)?([\w.]+)")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS relationships (
+    viewer              TEXT NOT NULL,
+    username            TEXT NOT NULL,
+    user_id             INTEGER NOT NULL DEFAULT 0,
+    full_name           TEXT NOT NULL DEFAULT '',
+    follows_viewer      INTEGER,
+    followed_by_viewer  INTEGER,
+    status              TEXT NOT NULL,
+    checked_at          REAL NOT NULL,
+    PRIMARY KEY (viewer, username)
+) WITHOUT ROWID;
+"""
+
+_ROW_FIELDS = ("username", "user_id", "full_name", "follows_viewer",
+               "followed_by_viewer", "status", "checked_at")
+
+
+def parse_watchlist(text: str) -> Tuple[List[str], List[str]]:
+    """
+    解析使用者輸入的帳號清單（換行、逗號或空白分隔，可含 @ 或個人檔案網址）。
+
+    Returns:
+        (valid usernames in order without duplicates, rejected entries)
+    """
+    names: List[str] = []
+    rejected: List[str] = []
+    seen = set()
+    for token in re.split(r"[\s,;]+", text or ""):
+        if not token:
+            continue
+        m = _PROFILE_URL_RE.search(token)
+        name = (m.group(1) if m else token).lstrip("@").strip("/").lower()
+        if not _USERNAME_RE.match(name):
+            rejected.append(token)
+            continue
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names, rejected
+
+
+def read_watchlist_file(path: str) -> Tuple[List[str], List[str]]:
+    """讀取帳號清單檔（純文字，或第一欄為 username 的 CSV）。"""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        text = f.read()
+    if path.lower().endswith(".csv"):
+        rows = list(csv.reader(text.splitlines()))
+        if rows and rows[0] and rows[0][0].strip().lower() == "username":
+            rows = rows[1:]
+        text = "\n".join(row[0] for row in rows if row)
+    return parse_watchlist(text)
+
+
+class RelationshipCache:
+    """
+    SQLite-backed TTL cache of per-account relationship lookups.
+
+    Args:
+        path: Path of the SQLite database file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            if not self._initialized:
+                with self._init_lock:
+                    if not self._initialized:
+                        conn.execute("PRAGMA journal_mode = WAL")
+                        conn.executescript(_SCHEMA)
+                        self._initialized = True
+            yield conn
+        finally:
+            conn.close()
+
+    def fresh(self, viewer: str, usernames: Iterable[str],
+              ttl_hours: float) -> Dict[str, Dict]:
+        """回傳 TTL 內已查詢過的帳號（查詢失敗的紀錄不會被快取）。"""
+        usernames = list(usernames)
+        cutoff = time.time() - ttl_hours * 3600
+        found: Dict[str, Dict] = {}
+        with self._connect() as conn:
+            for i in range(0, len(usernames), 500):
+                batch = usernames[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                for row in conn.execute(
+                        f"SELECT {', '.join(_ROW_FIELDS)} FROM relationships"
+                        f" WHERE viewer = ? AND checked_at >= ? AND username IN ({placeholders})",
+                        (viewer, cutoff, *batch)):
+                    found[row["username"]] = dict(row)
+        return found
+
+    def count_following(self, viewer: str, ttl_hours: float) -> int:
+        """TTL 內已查詢過、且登入者有追蹤的帳號數（抓取規劃估算 per_user 的請求數用）。"""
+        if ttl_hours <= 0:
+            return 0
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM relationships"
+                " WHERE viewer = ? AND checked_at >= ? AND followed_by_viewer = 1",
+                (viewer, time.time() - ttl_hours * 3600)).fetchone()[0]
+
+    def put(self, viewer: str, rows: Iterable[Dict]) -> None:
+        """以一個 transaction 寫入一批查詢結果。"""
+        with self._connect() as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO relationships(viewer, username, user_id, full_name,"
+                " follows_viewer, followed_by_viewer, status, checked_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ((viewer, *(row[k] for k in _ROW_FIELDS)) for row in rows
+                 if row["status"] != STATUS_ERROR))
+
+
+def open_relationship_cache(data_dir: str) -> RelationshipCache:
+    """開啟 data_dir 中的關係查詢快取。"""
+    os.makedirs(data_dir, exist_ok=True)
+    return RelationshipCache(os.path.join(data_dir, WATCHLIST_FILENAME))
+
+
+def lookup_relationship(context, username: str,
+                        cooldown: Optional[Callable[[], float]] = None) -> Dict:
+    """
+    查詢單一帳號與登入者的關係（一次 web_profile_info 請求）。
+
+    Args:
+        context: Logged-in InstaloaderContext.
+        username: Account to check.
+        cooldown: Returns the seconds to wait after a rate limit (the rate
+            controller's ``cooldown``); without it a rate limit is raised.
+    """
+    row = {"username": username, "user_id": 0, "full_name": "", "follows_viewer": None,
+           "followed_by_viewer": None, "status": STATUS_OK, "checked_at": time.time()}
+    for attempt in range(_RATE_LIMIT_RETRIES + 1):
+        try:
+            profile = Profile.from_username(context, username)
+            row.update(user_id=int(profile.userid), full_name=profile.full_name or "",
+                       follows_viewer=bool(profile.follows_viewer),
+                       followed_by_viewer=bool(profile.followed_by_viewer))
+            return row
+        except exceptions.ProfileNotExistsException:
+            row["status"] = STATUS_NOT_FOUND
+            return row
+        except exceptions.ConnectionException as e:
+            if is_rate_limited(e) and cooldown and attempt < _RATE_LIMIT_RETRIES:
+                time.sleep(cooldown())
+                continue
+            if is_rate_limited(e):
+                raise
+            print(f"[WARN] 無法查詢 {username}：{e}", flush=True)
+            row["status"] = STATUS_ERROR
+            return row
+    return row
+
+
+def resolve_watchlist(context, viewer: str, usernames: List[str], cache: RelationshipCache,
+                      ttl_hours: float = WATCHLIST_TTL_HOURS, batch: int = WATCHLIST_BATCH,
+                      cooldown: Optional[Callable[[], float]] = None
+                      ) -> Iterator[Tuple[List[Dict], bool]]:
+    """
+    查詢清單中每個帳號的關係，依序產生 (該批結果, 是否來自快取)。
+
+    先產生 TTL 內快取的結果（不發出請求），其餘帳號每 ``batch`` 個查詢一批，
+    每批查完即寫入快取後產生。
+
+    Args:
+        context: Logged-in InstaloaderContext.
+        viewer: Logged-in account (cache key).
+        usernames: Accounts to check.
+        cache: Relationship cache.
+        ttl_hours: Age below which cached results are reused.
+        batch: Number of lookups per batch.
+        cooldown: See :func:`lookup_relationship`.
+    """
+    cached = cache.fresh(viewer, usernames, ttl_hours) if ttl_hours > 0 else {}
+    if cached:
+        yield [cached[name] for name in usernames if name in cached], True
+    pending = [name for name in usernames if name not in cached]
+    batch = max(1, batch)
+    for i in range(0, len(pending), batch):
+        rows = [lookup_relationship(context, name, cooldown) for name in pending[i:i + batch]]
+        cache.put(viewer, rows)
+        yield rows, False
+
+
+def summarize(rows: List[Dict]) -> Dict[str, int]:
+    """報告的統計：總數、對方有追蹤你、你追蹤但對方沒回追、你沒追蹤但對方追蹤你、查無帳號。"""
+    ok = [r for r in rows if r["status"] == STATUS_OK]
+    return {
+        "total": len(rows),
+        "follows_you": sum(1 for r in ok if r["follows_viewer"]),
+        "not_following_back": sum(1 for r in ok if r["followed_by_viewer"] and not r["follows_viewer"]),
+        "fans_only": sum(1 for r in ok if r["follows_viewer"] and not r["followed_by_viewer"]),
+        "not_found": sum(1 for r in rows if r["status"] == STATUS_NOT_FOUND),
+        "errors": sum(1 for r in rows if r["status"] == STATUS_ERROR),
+    }
+
+
+def write_report(data_dir: str, viewer: str, rows: List[Dict]) -> str:
+    """輸出 watchlist 報告 CSV，回傳相對於 data_dir 的路徑（可直接用於 /download/）。"""
+    directory = os.path.join(data_dir, REPORT_DIRNAME)
+    os.makedirs(directory, exist_ok=True)
+    name = f"watchlist_{viewer}_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
+
+    def yes_no(value) -> str:
+        return "" if value is None else ("yes" if value else "no")
+
+    # Excel 用 utf-8-sig 避免中文亂碼
+    tmp = os.path.join(directory, f".{name}.tmp")
+    with open(tmp, "w", newline="", encoding="utf-8-sig", errors="replace") as f:
+        w = csv.writer(f)
+        w.writerow(REPORT_COLUMNS)
+        for r in rows:
+            w.writerow([
+                r["username"], r["full_name"], f"https://instagram.com/{r['username']}",
+                yes_no(r["follows_viewer"]), yes_no(r["followed_by_viewer"]), r["status"],
+                datetime.fromtimestamp(r["checked_at"]).strftime("%Y-%m-%d %H:%M:%S"),
+            ])
+    os.replace(tmp, os.path.join(directory, name))
+    return f"{REPORT_DIRNAME}/{name}"